@@ -1,18 +1,58 @@
 import argparse
+import json
 import os
 import sys
 import shutil
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
 from src.acquire.faers_client import fetch_faers
-from src.common.config import PATHS, ensure_directories
-from src.common.logging_utils import new_run_id, write_run_metadata
+from src.analyze.signals import compute_signals
+from src.common import metrics
+from src.common.cassette import Cassette
+from src.common.config import OPENFDA, PATHS, RXNORM, ensure_directories
+from src.common.logging_utils import new_run_id, read_run_metadata, summarize_request_log, write_run_metadata
+from src.common.rawstore import read_manifest
+from src.common.stage_cache import StageCache
+from src.mock.server import FaultConfig, MockServer, RxNavData, load_faers, load_recorded_rxnorm, synthetic_faers
+from src.normalize.rxnorm_index import build_index
 from src.process.curate import curate_tables
+from src.query.store import GROUPINGS, SERIOUS_FLAGS, QueryStore, ReportFilter, store_path
+from src.synth.generator import SynthConfig, write_synthetic
+from src.synth.vocabulary import write_rrf
 
 
 def cmd_acquire(args: argparse.Namespace) -> None:
     ensure_directories()
+    if args.record and args.replay:
+        sys.exit("--record and --replay are mutually exclusive")
+    if args.replay and args.run_id == args.replay:
+        sys.exit("--replay writes a new run; pass a different --run-id or none")
+    if args.resume or args.replay:
+        if args.resume and not args.run_id:
+            sys.exit("--resume requires --run-id")
+        previous = read_run_metadata(args.run_id if args.resume else args.replay)
+        if args.replay and not previous:
+            sys.exit(f"No run metadata for {args.replay} in {PATHS.logs_dir}")
+        if args.replay and previous.get("incremental"):
+            sys.exit("Incremental runs depend on the local raw store at the time and cannot be replayed")
+        if previous:
+            window = previous.get("window", {})
+            args.from_date = window.get("from", args.from_date)
+            args.to_date = window.get("to", args.to_date)
+            args.country = window.get("country", args.country)
+            args.drugs = ",".join(previous.get("drugs", []))
+            args.brands = ",".join(previous.get("brands", []))
+            args.out = previous.get("out", args.out)
+            args.workers = previous.get("workers", args.workers)
+            args.shard_days = previous.get("shard_days", args.shard_days)
+            args.split_terms = previous.get("split_terms", args.split_terms)
+            args.incremental = previous.get("incremental", args.incremental)
+            args.compression = previous.get("compression", args.compression)
+            args.segment_records = previous.get("segment_records", args.segment_records)
+            args.record = args.record or (args.resume and previous.get("record", False))
+    if not args.from_date or not args.to_date:
+        sys.exit("--from and --to are required")
     run_id = args.run_id or new_run_id()
     drugs = [s.strip() for s in (args.drugs or "").split(",") if s.strip()]
     brands = [s.strip() for s in (args.brands or "").split(",") if s.strip()]
@@ -23,27 +63,96 @@ def cmd_acquire(args: argparse.Namespace) -> None:
         "drugs": drugs,
         "brands": brands,
         "out": args.out,
+        "workers": args.workers,
+        "shard_days": args.shard_days,
+        "split_terms": args.split_terms,
+        "incremental": args.incremental,
+        "compression": args.compression,
+        "segment_records": args.segment_records,
+        "record": args.record,
     }
-    write_run_metadata(run_id, meta)
-    stats = fetch_faers(
-        run_id=run_id,
-        drugs=drugs,
-        brands=brands,
-        start_date=args.from_date,
-        end_date=args.to_date,
-        country=args.country,
-        out_dir=args.out,
-    )
-    print(f"Run {run_id}: fetched {stats['records']} records -> {stats['out_file']}")
-    if "manifest" in stats:
-        print(f"Manifest: {stats['manifest']}")
+    if args.replay:
+        meta["replay_of"] = args.replay
+    if not args.resume:
+        write_run_metadata(run_id, meta)
+    cassette = None
+    if args.record or args.replay:
+        cassette = Cassette(args.replay or run_id, "replay" if args.replay else "record")
+    with metrics.instrumented(run_id, "acquire", args.profile), metrics.stage("acquire") as stage:
+        stats = fetch_faers(
+            run_id=run_id,
+            drugs=drugs,
+            brands=brands,
+            start_date=args.from_date,
+            end_date=args.to_date,
+            country=args.country,
+            out_dir=args.out,
+            workers=args.workers,
+            shard_days=args.shard_days,
+            split_terms=args.split_terms,
+            resume=args.resume,
+            incremental=args.incremental,
+            compression=args.compression,
+            segment_records=args.segment_records,
+            cassette=cassette,
+        )
+        stage.records = stats["records"]
+    if stats.get("resumed"):
+        print(f"Resumed run {run_id} from its checkpoint journal")
+    if cassette is not None:
+        action = f"Replayed run {args.replay} from" if args.replay else "Recorded responses to"
+        print(f"{action} cassette {cassette.path} ({len(cassette)} requests)")
+    if args.replay:
+        original = read_manifest(os.path.join(args.out, f"manifest_{args.replay}.json"))
+        replayed = read_manifest(stats["manifest"])
+        if original is not None and replayed is not None:
+            same = [seg["sha256"] for seg in original["segments"]] == [seg["sha256"] for seg in replayed["segments"]]
+            print(f"Raw segments are {'identical to' if same else 'different from'} run {args.replay}'s")
+    print(f"Run {run_id}: fetched {stats['records']} records into {stats['segments']} segment(s) -> {stats['out_file']}")
+    if stats.get("incremental"):
+        inc = stats["incremental"]
+        print(
+            f"Incremental since {inc['since']} on top of run {inc['base_run_id']}: "
+            f"{inc['new_reports']} new, {inc['updated_reports']} updated, {inc['carried_over']} carried over"
+        )
+    if stats.get("duplicates"):
+        print(f"Dropped {stats['duplicates']} records duplicated across shards")
+    if stats.get("truncated"):
+        print("Warning: some single-day windows exceed the openFDA skip ceiling and were truncated")
+
+
+def _process_run_id(args: argparse.Namespace) -> str:
+    # Curating a raw manifest reuses its acquisition run id, so both commands report into the
+    # same metrics_<run_id>.json.
+    if args.run_id:
+        return args.run_id
+    if args.raw_file.endswith(".json"):
+        manifest = read_manifest(args.raw_file)
+        if manifest and manifest.get("run_id"):
+            return manifest["run_id"]
+    return new_run_id()
 
 
 def cmd_process(args: argparse.Namespace) -> None:
     ensure_directories()
     raw_path = args.raw_file
     out_dir = args.out_dir
-    result = curate_tables(raw_path, out_dir)
+    with metrics.instrumented(_process_run_id(args), "process", args.profile):
+        result = curate_tables(
+            raw_path,
+            out_dir,
+            streaming=args.streaming,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            dedup_memory=args.dedup_memory,
+            columnar=args.columnar,
+            rxnorm_index=args.rxnorm_index,
+            product_dictionary=args.product_dictionary,
+            list_encoding=args.list_encoding,
+            query_store=not args.no_query_store,
+            cube=not args.no_cube,
+            stage_cache=args.stage_cache,
+        )
     print("Wrote:")
     for k, v in result.items():
         print(f"- {k}: {v}")
@@ -56,25 +165,272 @@ def cmd_process(args: argparse.Namespace) -> None:
 
 
 
+def cmd_query(args: argparse.Namespace) -> None:
+    store = QueryStore(args.store)
+    flt = ReportFilter(
+        date_from=args.from_date,
+        date_to=args.to_date,
+        role=args.role,
+        ingredient=args.ingredient,
+        reaction=args.reaction,
+        country=args.country,
+        sex=args.sex,
+        serious=args.serious,
+        target=args.target,
+    )
+    try:
+        if args.sql:
+            columns, rows = store.sql(args.sql)
+        elif args.count == "reports":
+            columns, rows = ["reports"], [(store.count_reports(flt),)]
+        elif args.count:
+            columns, rows = [args.count, "reports"], store.counts(flt, args.count, args.limit)
+        else:
+            columns, rows = store.reports(flt, args.limit)
+    finally:
+        store.close()
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+def cmd_signals(args: argparse.Namespace) -> None:
+    signals = compute_signals(args.curated_dir, roles=args.role, min_count=args.min_count, all_drugs=args.all_drugs)
+    out = args.out or os.path.join(args.curated_dir, "signals.csv")
+    signals.to_csv(out, index=False)
+    prior = ", ".join(f"{v:.4g}" for v in signals.attrs.get("prior", ()))
+    print(f"Scored {len(signals)} drug-reaction pairs over {signals.attrs.get('reports', 0)} reports (GPS prior: {prior})")
+    print(f"Wrote: {out}")
+    if len(signals):
+        print(signals.head(args.top)[["drug", "reaction_term_text", "a", "prr", "ror", "ic025", "eb05"]].to_string(index=False))
+
+
+def cmd_request_log(args: argparse.Namespace) -> None:
+    summary = summarize_request_log(args.run_id)
+    if not summary["files"]:
+        sys.exit(f"No request log for run {args.run_id} in {PATHS.logs_dir}")
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    latency = summary["latency"]
+    print(f"Requests: {summary['requests']} ({summary['first']} .. {summary['last']}), records returned: {summary['results']}")
+    print("Status codes: " + ", ".join(f"{code}={n}" for code, n in summary["status_codes"].items()))
+    print("Latency ms: " + ", ".join(f"{k[:-3]}={v}" for k, v in latency.items()))
+    print(f"Files: {len(summary['files'])}")
+
+
+def cmd_stage_cache(args: argparse.Namespace) -> None:
+    cache = StageCache()
+    if args.clear:
+        print(f"Removed {cache.clear()} cached stage outputs from {cache.root}")
+        return
+    entries = cache.entries()
+    by_stage: Dict[str, Tuple[int, int]] = {}
+    for entry in entries:
+        count, size = by_stage.get(entry["stage"], (0, 0))
+        by_stage[entry["stage"]] = (count + 1, size + entry["bytes"])
+    total = sum(e["bytes"] for e in entries)
+    print(f"{cache.root}: {len(entries)} entries, {total / 2**20:.1f} MB of {cache.max_bytes / 2**20:.0f} MB")
+    for stage, (count, size) in sorted(by_stage.items()):
+        print(f"- {stage}: {count} entries, {size / 2**20:.1f} MB")
+
+
+def cmd_synth(args: argparse.Namespace) -> None:
+    config = SynthConfig(
+        records=args.records,
+        seed=args.seed,
+        duplicate_rate=args.duplicate_rate,
+        invalid_rate=args.invalid_rate,
+        start_date=args.from_date,
+        end_date=args.to_date,
+    )
+    manifest = write_synthetic(
+        args.out,
+        config,
+        run_id=args.run_id,
+        compression=args.compression,
+        segment_records=args.segment_records,
+        workers=args.workers,
+    )
+    print(f"Wrote {config.records} synthetic records: {manifest}")
+    if args.rrf:
+        index = build_index(write_rrf(args.rrf), os.path.join(args.rrf, "index"), release="2000-01-01")
+        print(f"Wrote RxNorm RRF files for the synthetic drugs to {args.rrf} and an offline index: {index}")
+
+
+def cmd_mock_server(args: argparse.Namespace) -> None:
+    if args.data:
+        faers = load_faers(args.data)
+    else:
+        faers = synthetic_faers(SynthConfig(records=args.synth_records, seed=args.seed))
+    rxnav = load_recorded_rxnorm(args.rxnorm_cache) if args.rxnorm_cache else RxNavData()
+    faults = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=None if args.retry_after < 0 else args.retry_after,
+        requests_per_minute=args.rpm,
+        skip_ceiling=args.skip_ceiling,
+        seed=args.fault_seed,
+    )
+    server = MockServer(faers, rxnav, faults, host=args.host, port=args.port, verbose=args.verbose)
+    print(f"Serving {len(faers.records)} FAERS records on {server.base_url} (stats: {server.base_url}/_stats)")
+    print(f"export OPENFDA_BASE_URL={server.openfda_url} RXNORM_BASE_URL={server.rxnorm_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_rxnorm_index(args: argparse.Namespace) -> None:
+    path = build_index(args.rrf_dir, args.out, release=args.release)
+    print(f"Wrote RxNorm index: {path}")
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="GLP-1 FAERS curation pipeline")
     sub = parser.add_subparsers(dest="command", required=True)
 
-    p_acq = sub.add_parser("acquire", help="Fetch FAERS raw JSON")
-    p_acq.add_argument("--from", dest="from_date", required=True, help="Start date YYYY-MM-DD")
-    p_acq.add_argument("--to", dest="to_date", required=True, help="End date YYYY-MM-DD")
+    p_acq = sub.add_parser("acquire", help="Fetch FAERS raw NDJSON segments")
+    p_acq.add_argument("--from", dest="from_date", help="Start date YYYY-MM-DD")
+    p_acq.add_argument("--to", dest="to_date", help="End date YYYY-MM-DD")
     p_acq.add_argument("--country", default="US")
     p_acq.add_argument("--drugs", default="semaglutide,tirzepatide")
     p_acq.add_argument("--brands", default="Ozempic,Mounjaro")
     p_acq.add_argument("--out", dest="out", default=PATHS.raw_faers_dir)
     p_acq.add_argument("--run-id", dest="run_id")
+    p_acq.add_argument("--workers", type=int, default=1, help="Concurrent shard fetchers sharing one rate budget")
+    p_acq.add_argument("--shard-days", type=int, default=0, help="Split the receivedate window into shards of N days (0 = no date sharding)")
+    p_acq.add_argument("--split-terms", action="store_true", help="Fetch each drug/brand term as its own shard")
+    p_acq.add_argument("--resume", action="store_true", help="Continue --run-id from its last committed checkpoint")
+    p_acq.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none", help="Compression for raw NDJSON segments")
+    p_acq.add_argument("--segment-records", type=int, default=50000, help="Records per raw NDJSON segment")
+    p_acq.add_argument("--incremental", action="store_true", help="Fetch only reports newer than or changed since the latest local raw file and fold them into it")
+    p_acq.add_argument("--profile", choices=metrics.PROFILE_MODES, default=None, help="Profile the run with cProfile or the sampling profiler (written to logs/)")
+    p_acq.add_argument("--record", action="store_true", help="Store every response body in a cassette under artifacts/cassettes/ for --replay")
+    p_acq.add_argument("--replay", metavar="RUN_ID", default=None, help="Re-run a recorded run from its cassette, without network access, as a new run")
     p_acq.set_defaults(func=cmd_acquire)
 
-    p_proc = sub.add_parser("process", help="Process raw JSON into curated CSVs")
-    p_proc.add_argument("--raw-file", required=True, help="Path to raw JSON array file")
+    p_proc = sub.add_parser("process", help="Process raw FAERS records into curated CSVs")
+    p_proc.add_argument("--raw-file", required=True, help="Path to a raw manifest_<run_id>.json, an NDJSON segment, or a legacy JSON array file")
     p_proc.add_argument("--out-dir", required=False, default=PATHS.deliverables_dir, help="Output directory for deliverables (default: deliverables/)")
+    p_proc.add_argument("--streaming", action="store_true", help="Constant-memory two-pass curation that writes tables in chunks")
+    p_proc.add_argument("--chunk-size", type=int, default=10000, help="Reports per output chunk in --streaming mode")
+    p_proc.add_argument("--workers", type=int, default=1, help="Curate hash-partitioned shards of reports on N processes")
+    p_proc.add_argument(
+        "--dedup-memory",
+        type=int,
+        default=2_000_000,
+        help="Report keys held in memory by the --streaming dedup index before spilling sorted runs to disk",
+    )
+    p_proc.add_argument(
+        "--columnar",
+        choices=["parquet", "arrow"],
+        default=None,
+        help="Also write typed, zstd-compressed tables partitioned by received month (requires pyarrow)",
+    )
+    p_proc.add_argument(
+        "--rxnorm-index",
+        default=None,
+        help="Resolve drug names offline from a prebuilt RxNorm index (file or directory; newest release wins)",
+    )
+    p_proc.add_argument(
+        "--product-dictionary",
+        default=None,
+        help="JSON file mapping canonical ingredients to product terms (default: built-in GLP-1 dictionary)",
+    )
+    p_proc.add_argument(
+        "--list-encoding",
+        choices=["json", "delimited"],
+        default="json",
+        help="Encoding of the per-report drug and reaction lists in Safety_surveillance.csv",
+    )
+    p_proc.add_argument("--no-query-store", action="store_true", help="Skip building the indexed SQLite query store")
+    p_proc.add_argument("--no-cube", action="store_true", help="Skip the precomputed aggregate cube (cube.csv)")
+    p_proc.add_argument(
+        "--stage-cache",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Reuse and store cached stage outputs under STAGE_CACHE_DIR (default: on only if STAGE_CACHE=1)",
+    )
+    p_proc.add_argument("--run-id", dest="run_id", default=None, help="Run id for logs/metrics_<run_id>.json (default: the raw manifest's run id)")
+    p_proc.add_argument("--profile", choices=metrics.PROFILE_MODES, default=None, help="Profile the run with cProfile or the sampling profiler (written to logs/)")
     p_proc.set_defaults(func=cmd_process)
 
+    p_query = sub.add_parser("query", help="Filter and count curated reports from the indexed query store")
+    p_query.add_argument("--store", default=store_path(PATHS.deliverables_dir), help="Query store file or the process --out-dir holding it")
+    p_query.add_argument("--from", dest="from_date", help="Earliest received date YYYY-MM-DD")
+    p_query.add_argument("--to", dest="to_date", help="Latest received date YYYY-MM-DD")
+    p_query.add_argument("--role", choices=["PRIMARY", "SECONDARY", "ASSOCIATED"], help="Require a drug with this role")
+    p_query.add_argument("--ingredient", help="Require a drug with this ingredient name or ingredient RxCUI")
+    p_query.add_argument("--target", action="store_true", help="Require a drug matched to the product dictionary")
+    p_query.add_argument("--reaction", help="Require this MedDRA preferred term (case-insensitive)")
+    p_query.add_argument("--country")
+    p_query.add_argument("--sex", choices=["F", "M", "U"])
+    p_query.add_argument("--serious", choices=SERIOUS_FLAGS, help="Require this seriousness flag")
+    p_query.add_argument("--count", choices=["reports"] + sorted(GROUPINGS), help="Count matching reports, optionally per value")
+    p_query.add_argument("--limit", type=int, default=20, help="Maximum rows to print (0 = all)")
+    p_query.add_argument("--sql", help="Run a read-only SQL statement against the store instead")
+    p_query.set_defaults(func=cmd_query)
+
+    p_sig = sub.add_parser("signals", help="Score drug-reaction pairs with PRR, ROR, IC and EBGM")
+    p_sig.add_argument("--curated-dir", default=PATHS.deliverables_dir, help="Directory holding Drugs.csv and Reactions.csv")
+    p_sig.add_argument("--out", default=None, help="Output CSV (default: <curated-dir>/signals.csv)")
+    p_sig.add_argument("--role", action="append", choices=["PRIMARY", "SECONDARY", "ASSOCIATED"], help="Only count drugs with this role (repeatable; default: all)")
+    p_sig.add_argument("--min-count", type=int, default=3, help="Minimum co-reported cases for a pair to be written")
+    p_sig.add_argument("--all-drugs", action="store_true", help="Also write pairs for products not mapped to an RxNorm ingredient")
+    p_sig.add_argument("--top", type=int, default=10, help="Pairs to print, ranked by EB05")
+    p_sig.set_defaults(func=cmd_signals)
+
+    p_log = sub.add_parser("request-log", help="Summarize a run's openFDA request log, including rotated files")
+    p_log.add_argument("--run-id", dest="run_id", required=True)
+    p_log.add_argument("--json", action="store_true", help="Print the full summary as JSON")
+    p_log.set_defaults(func=cmd_request_log)
+
+    p_cache = sub.add_parser("stage-cache", help="Show or clear the cache of curation stage outputs")
+    p_cache.add_argument("--clear", action="store_true", help="Remove every cached stage output")
+    p_cache.set_defaults(func=cmd_stage_cache)
+
+    p_syn = sub.add_parser("synth", help="Generate seeded synthetic openFDA-shaped FAERS records")
+    p_syn.add_argument("--records", type=int, default=25_100)
+    p_syn.add_argument("--seed", type=int, default=0)
+    p_syn.add_argument("--duplicate-rate", type=float, default=0.05, help="Share of records that re-version an earlier report")
+    p_syn.add_argument("--invalid-rate", type=float, default=0.01, help="Share of records validation rejects")
+    p_syn.add_argument("--from", dest="from_date", default="2024-01-01", help="First received date YYYY-MM-DD")
+    p_syn.add_argument("--to", dest="to_date", default="2024-12-31", help="Last received date YYYY-MM-DD")
+    p_syn.add_argument("--out", default=os.path.join(PATHS.project_root, "artifacts", "synthetic"))
+    p_syn.add_argument("--run-id", dest="run_id", default=None)
+    p_syn.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none")
+    p_syn.add_argument("--segment-records", type=int, default=50000, help="Records per segment (one generator block each)")
+    p_syn.add_argument("--workers", type=int, default=1, help="Processes generating segments in parallel")
+    p_syn.add_argument("--rrf", default=None, help="Also write RxNorm RRF files and an offline index for the synthetic drugs here")
+    p_syn.set_defaults(func=cmd_synth)
+
+    p_mock = sub.add_parser("mock-server", help="Serve openFDA drug/event.json and RxNav lookups locally, with injected faults")
+    p_mock.add_argument("--host", default="127.0.0.1")
+    p_mock.add_argument("--port", type=int, default=8765)
+    p_mock.add_argument("--data", default=None, help="Raw manifest, NDJSON segment or JSON array to serve (default: generate synthetic records)")
+    p_mock.add_argument("--synth-records", type=int, default=25_100, help="Synthetic records to generate when --data is not given")
+    p_mock.add_argument("--seed", type=int, default=0, help="Synthetic data seed")
+    p_mock.add_argument("--rxnorm-cache", default=None, help="RxNorm cache database whose recorded lookups RxNav answers replay")
+    p_mock.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    p_mock.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random latency on top of --latency-ms")
+    p_mock.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    p_mock.add_argument("--rate-5xx", type=float, default=0.0, help="Share of requests answered with 500/502/503")
+    p_mock.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s (negative = no header)")
+    p_mock.add_argument("--rpm", type=int, default=0, help="Requests per minute per API before answering 429 (0 = unlimited)")
+    p_mock.add_argument("--skip-ceiling", type=int, default=OPENFDA.skip_ceiling, help="Largest skip openFDA accepts")
+    p_mock.add_argument("--fault-seed", type=int, default=0, help="Seed for injected latency and errors")
+    p_mock.add_argument("--verbose", action="store_true", help="Log every request")
+    p_mock.set_defaults(func=cmd_mock_server)
+
+    p_idx = sub.add_parser("rxnorm-index", help="Build an offline RxNorm index from RRF release files")
+    p_idx.add_argument("--rrf-dir", required=True, help="Directory containing RXNCONSO.RRF and RXNREL.RRF (or an rrf/ subfolder)")
+    p_idx.add_argument("--release", default=None, help="Release date YYYY-MM-DD (default: parsed from the directory name)")
+    p_idx.add_argument("--out", default=RXNORM.index_dir, help="Directory for rxnorm_index_<release>.sqlite")
+    p_idx.set_defaults(func=cmd_rxnorm_index)
+
     args = parser.parse_args()
     args.func(args)
 
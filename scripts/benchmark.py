@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from src.acquire.faers_client import fetch_faers
+from src.common import metrics
+from src.common.config import OPENFDA, PATHS, RXNORM
+from src.common.http import HttpTransport
+from src.common.logging_utils import summarize_request_log
+from src.common.rawstore import iter_raw_records
+from src.common.utils import parse_faers_date
+from src.mock.server import FaultConfig, MockServer, load_faers
+from src.normalize.matcher import ProductMatcher, load_product_dictionary
+from src.normalize.rxnorm_cache import RxNormCache
+from src.normalize.rxnorm_client import RxNormClient
+from src.normalize.rxnorm_index import build_index
+from src.process.curate import (
+    DRUG_COLUMNS,
+    REACTION_COLUMNS,
+    _ChunkedCsvWriter,
+    _drug_rows,
+    _reaction_rows,
+    _resolve_products,
+    _surveillance_builder,
+    _target_product_names,
+    _validate_record,
+    curate_tables,
+)
+from src.process.fields import _report_row
+from src.process.vectorized import report_frame
+from src.synth.generator import SynthConfig, write_synthetic
+from src.synth.vocabulary import write_rrf
+
+BENCH_DIR = os.path.join(PATHS.project_root, "artifacts", "benchmarks")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.jsonl")
+CURATE_MODES = {
+    "legacy": {},
+    "streaming": {"streaming": True, "chunk_size": 10000},
+    "workers": {"workers": 4},
+}
+MICRO_SAMPLE = 20000
+ACQUIRE_DRUGS = (["semaglutide", "tirzepatide"], ["Ozempic", "Mounjaro"])
+
+
+def _git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=PATHS.project_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_dataset(config: SynthConfig, workers: int) -> Tuple[str, str]:
+    # Generated data and the matching offline RxNorm index are cached, so repeated runs and
+    # runs on other commits time the pipeline on identical input.
+    key = f"synth_{config.records}_{config.seed}_{config.duplicate_rate:g}"
+    data_dir = os.path.join(BENCH_DIR, "data", key)
+    manifest = os.path.join(data_dir, f"manifest_{key}.json")
+    if not os.path.exists(manifest):
+        print(f"Generating {config.records} synthetic records into {data_dir}...")
+        shutil.rmtree(data_dir, ignore_errors=True)
+        write_synthetic(data_dir, config, run_id=key, workers=workers)
+    index_dir = os.path.join(BENCH_DIR, "rxnorm_index")
+    if not os.path.isdir(index_dir):
+        with tempfile.TemporaryDirectory() as rrf:
+            build_index(write_rrf(rrf), index_dir, release="2000-01-01")
+    return (manifest, index_dir)
+
+
+def _curate_case(manifest: str, index_dir: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # Runs in a fresh process, so peak RSS belongs to this case alone.
+    out_dir = tempfile.mkdtemp(prefix="bench_curate_", dir=BENCH_DIR)
+    recorder = metrics.Metrics("benchmark", "process")
+    metrics.activate(recorder)
+    try:
+        curate_tables(manifest, out_dir, rxnorm_index=index_dir, stage_cache=False, **kwargs)
+    finally:
+        metrics.activate(None)
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return recorder.to_dict()
+
+
+def bench_curate(manifest: str, index_dir: str, modes: List[str], repeat: int) -> List[Dict[str, Any]]:
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for mode in modes:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                runs.append(pool.submit(_curate_case, manifest, index_dir, CURATE_MODES[mode]).result())
+        best = min(runs, key=lambda r: r["wall_s"])
+        reports = next((s["records"] for s in best["stages"] if s["stage"] in ("load", "validate_dedup", "partition")), 0)
+        results.append(
+            {
+                "case": f"curate/{mode}",
+                "records": reports,
+                "wall_s": best["wall_s"],
+                "cpu_s": best["cpu_s"],
+                "peak_rss_mb": max(r["peak_rss_mb"] or 0 for r in runs),
+                "records_per_s": round(reports / best["wall_s"], 1) if best["wall_s"] else None,
+                "stages": best["stages"],
+            }
+        )
+        print(f"curate/{mode}: {best['wall_s']:.2f}s, peak RSS {results[-1]['peak_rss_mb']} MB")
+    return results
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Tuple[float, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    # A separate traced run: tracemalloc slows the code down too much to time it.
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return (best, peak / (1024 * 1024))
+
+
+def bench_micro(manifest: str, index_dir: str, repeat: int) -> List[Dict[str, Any]]:
+    records: List[Any] = []
+    for rec in iter_raw_records(manifest):
+        records.append(rec)
+        if len(records) >= MICRO_SAMPLE:
+            break
+    valid = [rec for rec in records if _validate_record(rec)[0]]
+    # One version per report, as after dedup.
+    items = list({rec["safetyreportid"]: rec for rec in valid}.items())
+    matcher = ProductMatcher(load_product_dictionary())
+    rx = _resolve_products({name for rec in valid for name in _target_product_names(rec, matcher)}, index_dir)
+    names = [d.get("medicinalproduct") or "" for rec in valid for d in rec["patient"]["drug"] if isinstance(d, dict)]
+    dates = [rec.get("receiptdate") for rec in valid]
+    df_reports = report_frame(items)
+    drugs_rows = [row for rep_id, rec in items for row in _drug_rows(rep_id, rec, rx, matcher)]
+    reactions_rows = [row for rep_id, rec in items for row in _reaction_rows(rep_id, rec)]
+    df_drugs = pd.DataFrame(drugs_rows, columns=DRUG_COLUMNS)
+    df_reactions = pd.DataFrame(reactions_rows, columns=REACTION_COLUMNS)
+    tmp = tempfile.mkdtemp(prefix="bench_micro_", dir=BENCH_DIR)
+
+    def chunked_csv() -> None:
+        writer = _ChunkedCsvWriter(os.path.join(tmp, "chunked.csv"))
+        for start in range(0, len(df_drugs), 10000):
+            writer.write(df_drugs.iloc[start : start + 10000])
+        writer.close()
+
+    def surveillance() -> None:
+        builder = _surveillance_builder("json", None)
+        by_report: Dict[Any, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {rep_id: ([], []) for rep_id, _ in items}
+        for row in drugs_rows:
+            by_report[row["safetyreportid"]][0].append(row)
+        for row in reactions_rows:
+            by_report[row["safetyreportid"]][1].append(row)
+        for drugs, reactions in by_report.values():
+            builder.add(drugs, reactions)
+        builder.frames(df_reports)
+
+    cases: List[Tuple[str, int, Callable[[], Any]]] = [
+        ("validate_record", len(records), lambda: [_validate_record(rec) for rec in records]),
+        ("parse_faers_date", len(dates), lambda: [parse_faers_date(d) for d in dates]),
+        ("report_row", len(items), lambda: [_report_row(rep_id, rec) for rep_id, rec in items]),
+        ("report_frame", len(items), lambda: report_frame(items)),
+        ("product_match", len(names), lambda: [matcher.match(n) for n in names if n]),
+        ("drug_rows", len(drugs_rows), lambda: [_drug_rows(rep_id, rec, rx, matcher) for rep_id, rec in items]),
+        ("reaction_rows", len(reactions_rows), lambda: [_reaction_rows(rep_id, rec) for rep_id, rec in items]),
+        ("surveillance", len(items), surveillance),
+        ("to_csv/Reports", len(df_reports), lambda: df_reports.to_csv(os.path.join(tmp, "reports.csv"), index=False)),
+        ("to_csv/Drugs", len(df_drugs), lambda: df_drugs.to_csv(os.path.join(tmp, "drugs.csv"), index=False)),
+        ("chunked_csv/Drugs", len(df_drugs), chunked_csv),
+    ]
+    results = []
+    try:
+        for name, n, fn in cases:
+            wall, alloc = _time(fn, repeat)
+            results.append(
+                {
+                    "case": f"micro/{name}",
+                    "records": n,
+                    "wall_s": round(wall, 4),
+                    "records_per_s": round(n / wall, 1) if wall else None,
+                    "alloc_peak_mb": round(alloc, 1),
+                }
+            )
+            print(f"micro/{name}: {n / wall:,.0f} records/s, {alloc:.1f} MB allocated at peak")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def _serve_mock(conn: Any, manifest: str, faults: FaultConfig) -> None:
+    # The stand-in server gets its own process, so it does not compete with the client for the GIL.
+    server = MockServer(load_faers(manifest), faults=faults)
+    conn.send(server.base_url)
+    server.serve_forever()
+
+
+def _mock_stats(base_url: str, transport: HttpTransport) -> Dict[str, Any]:
+    return transport.session.get(f"{base_url}/_stats", timeout=30).json()
+
+
+def bench_acquire(
+    manifest: str, config: SynthConfig, workers: List[int], faults: FaultConfig, repeat: int
+) -> List[Dict[str, Any]]:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    server = ctx.Process(target=_serve_mock, args=(child, manifest, faults), daemon=True)
+    server.start()
+    base_url = parent.recv()
+    saved = (OPENFDA.base_url, OPENFDA.requests_per_minute, RXNORM.base_url, PATHS.logs_dir)
+    OPENFDA.base_url, RXNORM.base_url = f"{base_url}/drug/event.json", f"{base_url}/REST"
+    # Throughput is bounded by the server's latency and faults, not by the public API budget.
+    OPENFDA.requests_per_minute = 1_000_000
+    tmp = tempfile.mkdtemp(prefix="bench_acquire_", dir=BENCH_DIR)
+    PATHS.logs_dir = tmp
+    stats_transport = HttpTransport(1_000_000)
+    results = []
+    try:
+        for n in workers:
+            runs = []
+            for i in range(repeat):
+                run_id = f"bench_w{n}_{i}"
+                before = _mock_stats(base_url, stats_transport)["status_codes"].get("openfda", {})
+                t0 = time.perf_counter()
+                fetched = fetch_faers(
+                    run_id,
+                    *ACQUIRE_DRUGS,
+                    config.start_date,
+                    config.end_date,
+                    config.country,
+                    os.path.join(tmp, run_id),
+                    workers=n,
+                    shard_days=30,
+                )
+                wall = time.perf_counter() - t0
+                after = _mock_stats(base_url, stats_transport)["status_codes"].get("openfda", {})
+                log = summarize_request_log(run_id)
+                statuses = {code: n - before.get(code, 0) for code, n in after.items() if n != before.get(code, 0)}
+                runs.append((wall, fetched["records"], statuses, log["latency"]))
+            wall, records, statuses, latency = min(runs, key=lambda r: r[0])
+            results.append(
+                {
+                    "case": f"acquire/workers{n}",
+                    "records": records,
+                    "wall_s": round(wall, 4),
+                    "records_per_s": round(records / wall, 1) if wall else None,
+                    "requests_per_s": round(sum(statuses.values()) / wall, 1) if wall else None,
+                    "status_codes": statuses,
+                    "latency_p50_ms": latency["p50_ms"],
+                    "latency_p95_ms": latency["p95_ms"],
+                }
+            )
+            print(f"acquire/workers{n}: {results[-1]['records_per_s']:,.0f} records/s, {results[-1]['requests_per_s']} requests/s")
+        results.append(bench_rxnorm(manifest, tmp, repeat))
+    finally:
+        OPENFDA.base_url, OPENFDA.requests_per_minute, RXNORM.base_url, PATHS.logs_dir = saved
+        stats_transport.close()
+        server.terminate()
+        server.join()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def bench_rxnorm(manifest: str, tmp: str, repeat: int) -> Dict[str, Any]:
+    names = set()
+    for i, rec in enumerate(iter_raw_records(manifest)):
+        if i >= MICRO_SAMPLE:
+            break
+        if _validate_record(rec)[0]:
+            names.update(d.get("medicinalproduct") or "" for d in rec["patient"]["drug"] if isinstance(d, dict))
+    names.discard("")
+    best = float("inf")
+    for i in range(repeat):
+        # A fresh cache per run, so every distinct name costs a lookup.
+        cache = RxNormCache(os.path.join(tmp, f"rxnorm_{i}.sqlite"), legacy_json=os.path.join(tmp, "none.json"))
+        client = RxNormClient(transport=HttpTransport(RXNORM.requests_per_minute, timeout=20), cache=cache)
+        t0 = time.perf_counter()
+        client.resolve_many(sorted(names))
+        best = min(best, time.perf_counter() - t0)
+        client.close()
+    print(f"rxnorm/resolve_many: {len(names) / best:,.0f} names/s")
+    return {
+        "case": "rxnorm/resolve_many",
+        "records": len(names),
+        "wall_s": round(best, 4),
+        "records_per_s": round(len(names) / best, 1) if best else None,
+    }
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results: List[Dict[str, Any]], history: List[Dict[str, Any]], threshold: float) -> List[str]:
+    # Each case is compared with its latest result from a different revision on the same
+    # dataset; a case is a regression when it is slower by more than threshold percent.
+    regressions = []
+    for res in results:
+        previous = [
+            h
+            for h in history
+            if h["case"] == res["case"]
+            and h["dataset"] == res["dataset"]
+            and h.get("mock") == res.get("mock")
+            and h["revision"] != res["revision"]
+        ]
+        if not previous:
+            continue
+        base = previous[-1]
+        delta = (res["wall_s"] - base["wall_s"]) / base["wall_s"] * 100.0 if base["wall_s"] else 0.0
+        flag = "REGRESSION" if delta > threshold else ""
+        print(f"{res['case']:<24} {base['wall_s']:>9.3f}s -> {res['wall_s']:>9.3f}s {delta:+7.1f}% vs {base['revision']} {flag}")
+        if flag:
+            regressions.append(res["case"])
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time and memory-profile curation and acquisition on synthetic FAERS data")
+    parser.add_argument("--records", type=int, default=100_000, help="Synthetic records to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--modes", default="legacy,streaming,workers", help=f"Curation modes to time: {','.join(CURATE_MODES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept")
+    parser.add_argument("--skip-curate", action="store_true", help="Skip the end-to-end curation benchmarks")
+    parser.add_argument("--skip-micro", action="store_true", help="Skip the micro benchmarks")
+    parser.add_argument("--skip-acquire", action="store_true", help="Skip the acquisition and RxNorm throughput benchmarks")
+    parser.add_argument("--acquire-workers", default="1,4,8", help="fetch_faers worker counts to time against the mock server")
+    parser.add_argument("--mock-latency-ms", type=float, default=20.0, help="Latency the mock server adds per request")
+    parser.add_argument("--mock-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--mock-rate-429", type=float, default=0.0, help="Share of mock requests answered with 429")
+    parser.add_argument("--mock-rate-5xx", type=float, default=0.0, help="Share of mock requests answered with a 5xx")
+    parser.add_argument("--gen-workers", type=int, default=os.cpu_count() or 1, help="Processes generating synthetic data")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSONL file results are appended to")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Slowdown in percent reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero when a case regressed")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in CURATE_MODES]
+    if unknown:
+        parser.error(f"unknown modes: {unknown}")
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    config = SynthConfig(records=args.records, seed=args.seed, duplicate_rate=args.duplicate_rate)
+    manifest, index_dir = prepare_dataset(config, args.gen_workers)
+
+    results: List[Dict[str, Any]] = []
+    if not args.skip_curate:
+        results.extend(bench_curate(manifest, index_dir, modes, args.repeat))
+    if not args.skip_micro:
+        results.extend(bench_micro(manifest, index_dir, args.repeat))
+    if not args.skip_acquire:
+        faults = FaultConfig(
+            latency_ms=args.mock_latency_ms,
+            jitter_ms=args.mock_jitter_ms,
+            rate_429=args.mock_rate_429,
+            rate_5xx=args.mock_rate_5xx,
+            retry_after=0,
+        )
+        workers = [int(n) for n in args.acquire_workers.split(",") if n.strip()]
+        acquired = bench_acquire(manifest, config, workers, faults, args.repeat)
+        mock = {k: v for k, v in asdict(faults).items() if k in ("latency_ms", "jitter_ms", "rate_429", "rate_5xx")}
+        results.extend(dict(res, mock=mock) for res in acquired)
+
+    context = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": f"{platform.system()}-{platform.machine()}-{os.cpu_count()}cpu",
+        "dataset": os.path.basename(os.path.dirname(manifest)),
+    }
+    results = [dict(context, **res) for res in results]
+    history = load_results(args.results)
+    regressions = compare(results, history, args.threshold)
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        for res in results:
+            f.write(json.dumps(res) + "\n")
+    print(f"Appended {len(results)} results to {args.results}")
+    if regressions and args.fail_on_regression:
+        sys.exit(f"Regressions over {args.threshold:g}%: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
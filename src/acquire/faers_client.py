@@ -1,14 +1,257 @@
+import hashlib
 import json
 import os
+import threading
 import time
-from typing import Dict, Iterable, List, Optional
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 import requests
 from tqdm import tqdm
 
+from src.common.cassette import Cassette
 from src.common.config import OPENFDA, PATHS, ensure_directories
-from src.common.logging_utils import RequestLog, append_request_log
-from src.common.utils import sha256_file, write_json
+from src.common.logging_utils import RequestLog, append_request_log, close_request_log, redact_params
+from src.common.http import RETRY_STATUSES, HttpTransport
+from src.common.rawstore import SegmentWriter, combined_sha256, iter_ndjson, iter_raw_records, segment_name, verify_segments
+from src.common.utils import write_json
+
+
+@dataclass
+class Shard:
+    start_date: str
+    end_date: str
+    drugs: List[str] = field(default_factory=list)
+    brands: List[str] = field(default_factory=list)
+    terms: str = "all"
+
+    @property
+    def key(self) -> str:
+        return f"{self.start_date}_{self.end_date}_{self.terms}"
+
+
+class _RawWriter:
+    # Pages reach the segments in shard-plan order, whatever order the workers finish in, so a
+    # run's raw output depends only on the responses. Each shard has a plan path (its index in the
+    # plan, then 0/1 per bisection); only the unfinished shard with the smallest path writes
+    # directly, and the others hold their pages in memory until it is their turn. Journal entries
+    # are written with the pages, so a resume never sees a page that is not on disk.
+    def __init__(
+        self,
+        out_dir: str,
+        run_id: str,
+        journal_path: str,
+        compression: str = "none",
+        segment_records: int = 50000,
+        segments: Optional[List[Dict[str, Any]]] = None,
+        hasher: Optional["hashlib._Hash"] = None,
+        records: int = 0,
+        duplicates: int = 0,
+        seen: Optional[Set[Tuple[str, str]]] = None,
+        new_ids: Optional[Set[str]] = None,
+    ) -> None:
+        self.records = records
+        self.duplicates = duplicates
+        self.new_ids: Set[str] = new_ids if new_ids is not None else set()
+        self._seen: Set[Tuple[str, str]] = seen if seen is not None else set()
+        self._lock = threading.Lock()
+        self._segments = SegmentWriter(out_dir, run_id, compression, segment_records, segments, hasher)
+        self._journal = open(journal_path, "a" if segments else "w", encoding="utf-8")
+        self.position = (len(segments) - 1, segments[-1]["bytes"]) if segments else (0, 0)
+        self._committed = [dict(seg) for seg in segments or []]
+        self._paths: Dict[str, Tuple[int, ...]] = {}
+        self._held: Dict[str, List[Tuple[str, Any]]] = defaultdict(list)
+        self.shard_stats: List[Dict[str, Any]] = []
+
+    def _log(self, entry: Dict[str, Any]) -> None:
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+
+    def register(self, shard: "Shard", path: Tuple[int, ...]) -> None:
+        with self._lock:
+            self._paths[shard.key] = path
+
+    def _is_head(self, key: str) -> bool:
+        return min(self._paths, key=self._paths.__getitem__) == key
+
+    def write_page(self, shard: "Shard", results: List[Dict[str, Any]], stats: Dict[str, Any], skip: int) -> None:
+        with self._lock:
+            op = ("page", (results, dict(stats, shard=shard.key, skip=skip), stats))
+            if self._is_head(shard.key):
+                self._apply(op)
+            else:
+                self._held[shard.key].append(op)
+
+    def done(self, shard: "Shard", stats: Dict[str, Any]) -> None:
+        with self._lock:
+            self._held[shard.key].append(("done", stats))
+            if self._is_head(shard.key):
+                self._advance()
+
+    def split(self, shard: "Shard", children: List["Shard"]) -> None:
+        with self._lock:
+            path = self._paths[shard.key]
+            for i, child in enumerate(children):
+                self._paths[child.key] = path + (i,)
+            self._log({"event": "split", "shard": shard.key, "segment": self.position[0], "bytes": self.position[1]})
+            del self._paths[shard.key]
+            self._held.pop(shard.key, None)
+            self._advance()
+
+    def _advance(self) -> None:
+        # Flush the head shard's held pages; when it has finished, move on to the next one.
+        while self._paths:
+            key = min(self._paths, key=self._paths.__getitem__)
+            held = self._held.pop(key, [])
+            for op in held:
+                self._apply(op)
+            if not held or held[-1][0] != "done":
+                return
+            del self._paths[key]
+
+    def _apply(self, op: Tuple[str, Any]) -> None:
+        kind, payload = op
+        if kind == "done":
+            self.shard_stats.append(payload)
+            self._log(
+                {
+                    "event": "done",
+                    "shard": payload["key"],
+                    "stats": payload,
+                    "segment": self.position[0],
+                    "bytes": self.position[1],
+                }
+            )
+            return
+        results, checkpoint, stats = payload
+        page = []
+        for record in results:
+            key = (str(record.get("safetyreportid")), str(record.get("safetyreportversion")))
+            if key in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(key)
+            self.new_ids.add(key[0])
+            page.append(record)
+        seg = self._segments.append(page)
+        self.records += len(page)
+        stats["written"] += len(page)
+        self.position = (seg["segment"], seg["bytes"])
+        self._committed = [dict(s) for s in self._segments.segments]
+        self._log(
+            dict(
+                checkpoint,
+                written=stats["written"],
+                event="page",
+                records=self.records,
+                duplicates=self.duplicates,
+                segment=seg["segment"],
+                file=seg["file"],
+                segment_records=seg["records"],
+                bytes=seg["bytes"],
+                sha256=seg["sha256"],
+            )
+        )
+
+    def fold(self, records: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        # Every base record is carried over, including older versions of refetched reports, as a
+        # full fetch would return them; refetched (id, version) pairs were already skipped as
+        # duplicates, so curation's dedup sees the same candidates either way.
+        carried = 0
+        with self._lock:
+            batch: List[Dict[str, Any]] = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    self._segments.append(batch, sync=False)
+                    carried += len(batch)
+                    batch = []
+            if batch:
+                self._segments.append(batch, sync=False)
+                carried += len(batch)
+            self.records += carried
+        return carried
+
+    def committed_segments(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._committed
+
+    def close(self) -> List[Dict[str, Any]]:
+        if not self._segments.segments:
+            self._segments.append([])
+        self._journal.close()
+        return self._segments.close()
+
+
+def _load_journal(path: str) -> List[Dict[str, Any]]:
+    entries: List[Dict[str, Any]] = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return entries
+
+
+def _validate_prefix(
+    path: str,
+    checkpoints: List[Tuple[int, str]],
+) -> Tuple[int, "hashlib._Hash"]:
+    h = hashlib.sha256()
+    committed = 0
+    committed_hasher = hashlib.sha256()
+    if not os.path.exists(path):
+        return (0, committed_hasher)
+    with open(path, "rb") as f:
+        for size, expected in sorted(set(checkpoints)):
+            chunk = f.read(size - committed)
+            if len(chunk) != size - committed:
+                break
+            h.update(chunk)
+            if h.hexdigest() != expected:
+                break
+            committed = size
+            committed_hasher = h.copy()
+    return (committed, committed_hasher)
+
+
+def _load_local_store(out_dir: str, exclude_run_id: str) -> Optional[Dict[str, Any]]:
+    candidates = []
+    for name in os.listdir(out_dir):
+        if not (name.startswith("manifest_") and name.endswith(".json")):
+            continue
+        path = os.path.join(out_dir, name)
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("run_id") == exclude_run_id or manifest.get("status", "complete") != "complete":
+            continue
+        if "segments" in manifest or os.path.exists(manifest.get("raw_file", "")):
+            candidates.append((os.path.getmtime(path), path, manifest))
+    if not candidates:
+        return None
+    _, manifest_path, manifest = max(candidates)
+
+    newest = ""
+    keys: Set[Tuple[str, str]] = set()
+    for record in iter_raw_records(manifest_path):
+        if not isinstance(record, dict):
+            continue
+        keys.add((str(record.get("safetyreportid")), str(record.get("safetyreportversion"))))
+        received = str(record.get("receivedate") or "")
+        if len(received) == 8 and received > newest:
+            newest = received
+    return {
+        "run_id": manifest.get("run_id"),
+        "manifest": manifest_path,
+        "since": f"{newest[:4]}-{newest[4:6]}-{newest[6:]}" if newest else None,
+        "keys": keys,
+    }
 
 
 def _build_search_query(
@@ -27,6 +270,260 @@ def _build_search_query(
     return f"{drug_clause} AND {date_clause} AND {country_clause}"
 
 
+def _split_date_range(start_date: str, end_date: str, shard_days: int) -> List[Tuple[str, str]]:
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    if shard_days <= 0:
+        return [(start.isoformat(), end.isoformat())]
+    windows = []
+    cur = start
+    while cur <= end:
+        stop = min(cur + timedelta(days=shard_days - 1), end)
+        windows.append((cur.isoformat(), stop.isoformat()))
+        cur = stop + timedelta(days=1)
+    return windows
+
+
+def plan_shards(
+    drugs: List[str],
+    brands: List[str],
+    start_date: str,
+    end_date: str,
+    shard_days: int = 0,
+    split_terms: bool = False,
+) -> List[Shard]:
+    if split_terms:
+        term_groups = [([d], []) for d in drugs] + [([], [b]) for b in brands]
+    else:
+        term_groups = [(drugs, brands)]
+
+    shards = []
+    for win_start, win_end in _split_date_range(start_date, end_date, shard_days):
+        for group_drugs, group_brands in term_groups:
+            terms = "+".join(group_drugs + group_brands) if split_terms else "all"
+            shards.append(Shard(win_start, win_end, list(group_drugs), list(group_brands), terms))
+    return shards
+
+
+def _request_page(
+    run_id: str,
+    search: str,
+    skip: int,
+    limit: int,
+    transport: HttpTransport,
+) -> Tuple[int, Dict[str, Any]]:
+    params = {
+        "search": search,
+        "limit": limit,
+        "skip": skip,
+    }
+    if OPENFDA.api_key:
+        params["api_key"] = OPENFDA.api_key
+
+    url = OPENFDA.base_url
+
+    attempts: List[Tuple[str, int, int]] = []
+
+    def record_attempt(resp: requests.Response, elapsed_ms: int) -> None:
+        attempts.append((time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), resp.status_code, elapsed_ms))
+
+    resp = transport.get(url, params=params, on_response=record_attempt)
+    data: Dict[str, Any] = resp.json() if resp.status_code == 200 else {}
+    logged_params = redact_params(params)
+    for timestamp, status_code, elapsed_ms in attempts:
+        append_request_log(
+            RequestLog(
+                run_id=run_id,
+                timestamp=timestamp,
+                url=url,
+                params=logged_params,
+                status_code=status_code,
+                result_count=len(data.get("results", [])) if status_code == 200 else 0,
+                elapsed_ms=elapsed_ms,
+            )
+        )
+    if resp.status_code in RETRY_STATUSES:
+        raise RuntimeError(f"openFDA request failed with status {resp.status_code} after {transport.max_retries} retries")
+    return resp.status_code, data
+
+
+def _bisect(shard: Shard) -> List[Shard]:
+    start = date.fromisoformat(shard.start_date)
+    end = date.fromisoformat(shard.end_date)
+    mid = start + (end - start) // 2
+    halves = [(start, mid), (mid + timedelta(days=1), end)]
+    return [Shard(a.isoformat(), b.isoformat(), shard.drugs, shard.brands, shard.terms) for a, b in halves]
+
+
+_STAT_KEYS = ("key", "from", "to", "terms", "total", "fetched", "written", "requests", "truncated", "status")
+
+
+def _fetch_window(
+    run_id: str,
+    shard: Shard,
+    country: str,
+    transport: HttpTransport,
+    writer: _RawWriter,
+    pbar: tqdm,
+    stop: threading.Event,
+    checkpoint: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[Dict[str, Any]], List[Shard]]:
+    search = _build_search_query(shard.drugs, shard.brands, shard.start_date, shard.end_date, country)
+    limit = OPENFDA.max_limit
+    reachable = OPENFDA.skip_ceiling + limit
+    if stop.is_set():
+        return (None, [])
+
+    if checkpoint is None:
+        # The probe doubles as the first page, so a window that fits costs no extra request.
+        status, data = _request_page(run_id, search, 0, limit, transport)
+        stats: Dict[str, Any] = {
+            "key": shard.key,
+            "from": shard.start_date,
+            "to": shard.end_date,
+            "terms": shard.drugs + shard.brands,
+            "total": 0,
+            "fetched": 0,
+            "written": 0,
+            "requests": 1,
+            "truncated": False,
+            "status": status,
+        }
+        if status == 404:
+            # openFDA answers a search without matches with 404.
+            writer.done(shard, stats)
+            return (stats, [])
+        if status != 200:
+            raise RuntimeError(f"openFDA returned status {status} for window {shard.key}; resume the run to retry it")
+
+        total = data.get("meta", {}).get("results", {}).get("total", 0)
+        stats["total"] = total
+        if total > reachable and shard.start_date < shard.end_date:
+            children = _bisect(shard)
+            writer.split(shard, children)
+            return (None, children)
+        if total > reachable:
+            tqdm.write(f"Window {shard.key} has {total} records on a single day; only {reachable} are reachable")
+            stats["truncated"] = True
+        skip = 0
+        results = data.get("results", [])
+    else:
+        stats = {k: checkpoint[k] for k in _STAT_KEYS}
+        total = stats["total"]
+        skip = checkpoint["skip"] + limit
+        results = []
+
+    target = min(total, reachable)
+    pbar.total = (pbar.total or 0) + target - stats["fetched"]
+    pbar.refresh()
+
+    while skip < target:
+        if stop.is_set():
+            return (None, [])
+        if not results:
+            status, data = _request_page(run_id, search, skip, limit, transport)
+            stats["requests"] += 1
+            stats["status"] = status
+            results = data.get("results", [])
+            # An error or a short page before the end leaves records behind; the window stays
+            # unfinished, so the run is written as partial and --resume retries from this page.
+            if status != 200 or (len(results) < limit and skip + len(results) < target):
+                raise RuntimeError(
+                    f"openFDA returned status {status} with {len(results)} records at skip {skip} of window "
+                    f"{shard.key} ({stats['fetched']} of {target} fetched); resume the run to retry it"
+                )
+        stats["fetched"] += len(results)
+        writer.write_page(shard, results, stats, skip)
+        pbar.update(len(results))
+        skip += limit
+        results = []
+
+    writer.done(shard, stats)
+    return (stats, [])
+
+
+def _resume_state(
+    out_dir: str,
+    run_id: str,
+    compression: str,
+    journal_path: str,
+    manifest_path: str,
+) -> Optional[Dict[str, Any]]:
+    manifest: Dict[str, Any] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    if manifest.get("status") == "complete" and not verify_segments(manifest_path, manifest):
+        return {"complete": True, "manifest": manifest}
+
+    entries = _load_journal(journal_path)
+    pages = [e for e in entries if e.get("event") == "page"]
+    checkpoints: Dict[int, List[Tuple[int, str]]] = defaultdict(list)
+    segment_records: Dict[Tuple[int, int], int] = {}
+    for e in pages:
+        checkpoints[e["segment"]].append((e["bytes"], e["sha256"]))
+        segment_records[(e["segment"], e["bytes"])] = e["segment_records"]
+    if manifest.get("status") == "partial":
+        for i, seg in enumerate(manifest.get("segments", [])):
+            checkpoints[i].append((seg["bytes"], seg["sha256"]))
+            segment_records[(i, seg["bytes"])] = seg["records"]
+    if not checkpoints:
+        return None
+
+    empty = hashlib.sha256().hexdigest()
+    segments: List[Dict[str, Any]] = []
+    hasher = hashlib.sha256()
+    for i in range(max(checkpoints) + 1):
+        name = segment_name(run_id, i, compression)
+        known = checkpoints.get(i, [])
+        committed, hasher = _validate_prefix(os.path.join(out_dir, name), known + [(0, empty)])
+        segments.append(
+            {
+                "file": name,
+                "records": segment_records.get((i, committed), 0),
+                "bytes": committed,
+                "sha256": hasher.hexdigest(),
+            }
+        )
+        if committed < max((size for size, _ in known), default=0):
+            break
+    if segments[-1]["bytes"] == 0 and len(segments) == 1:
+        return None
+
+    last = len(segments) - 1
+    os.truncate(os.path.join(out_dir, segments[-1]["file"]), segments[-1]["bytes"])
+    extra = last + 1
+    while os.path.exists(os.path.join(out_dir, segment_name(run_id, extra, compression))):
+        os.remove(os.path.join(out_dir, segment_name(run_id, extra, compression)))
+        extra += 1
+
+    position = (last, segments[-1]["bytes"])
+    pages = [e for e in pages if (e["segment"], e["bytes"]) <= position]
+    windows: Dict[str, Dict[str, Any]] = {}
+    for e in pages:
+        windows[e["shard"]] = e
+    done = {
+        e["shard"]: e["stats"]
+        for e in entries
+        if e.get("event") == "done" and (e["segment"], e["bytes"]) <= position
+    }
+    seen: Set[Tuple[str, str]] = set()
+    for seg in segments:
+        for record in iter_ndjson(os.path.join(out_dir, seg["file"])):
+            seen.add((str(record.get("safetyreportid")), str(record.get("safetyreportversion"))))
+    return {
+        "complete": False,
+        "segments": segments,
+        "hasher": hasher,
+        "records": sum(seg["records"] for seg in segments),
+        "duplicates": pages[-1]["duplicates"] if pages else 0,
+        "seen": seen,
+        "windows": windows,
+        "done": done,
+        "splits": {e["shard"] for e in entries if e.get("event") == "split"},
+    }
+
+
 def fetch_faers(
     run_id: str,
     drugs: List[str],
@@ -35,87 +532,153 @@ def fetch_faers(
     end_date: str,
     country: str,
     out_dir: str,
-) -> Dict[str, int]:
+    workers: int = 1,
+    shard_days: int = 0,
+    split_terms: bool = False,
+    resume: bool = False,
+    incremental: bool = False,
+    compression: str = "none",
+    segment_records: int = 50000,
+    cassette: Optional[Cassette] = None,
+) -> Dict[str, Any]:
     ensure_directories()
     os.makedirs(out_dir, exist_ok=True)
 
-    search = _build_search_query(drugs, brands, start_date, end_date, country)
-    limit = OPENFDA.max_limit
-    skip = 0
-    total_written = 0
-
-    out_path = os.path.join(out_dir, f"faers_{run_id}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("[")
-
-        pbar = None
-        first = True
-        try:
-            while True:
-                params = {
-                    "search": search,
-                    "limit": limit,
-                    "skip": skip,
-                }
-                if OPENFDA.api_key:
-                    params["api_key"] = OPENFDA.api_key
-
-                url = OPENFDA.base_url
-                t0 = time.time()
-                resp = requests.get(url, params=params, timeout=30)
-                elapsed_ms = int((time.time() - t0) * 1000)
-
-                result_count = 0
-                if resp.status_code == 200:
-                    data = resp.json()
-                    results = data.get("results", [])
-                    result_count = len(results)
-                    if pbar is None:
-                        meta_total = data.get("meta", {}).get("results", {}).get("total", 0)
-                        pbar = tqdm(total=meta_total, desc="FAERS records", unit="rec")
-                    if result_count == 0:
-                        break
-                    for record in results:
-                        if not first:
-                            f.write(",\n")
-                        json.dump(record, f, ensure_ascii=False)
-                        first = False
-                        total_written += 1
-                    pbar.update(result_count)
-                    skip += limit
-                else:
-                    time.sleep(2)
-                    if resp.status_code in (400, 401, 403, 404):
-                        break
-
-                append_request_log(
-                    RequestLog(
-                        run_id=run_id,
-                        timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                        url=url,
-                        params=params,
-                        status_code=resp.status_code,
-                        result_count=result_count,
-                        elapsed_ms=elapsed_ms,
-                    )
-                )
-
-                time.sleep(60.0 / max(1, OPENFDA.requests_per_minute))
+    journal_path = os.path.join(out_dir, f"checkpoint_{run_id}.jsonl")
+    manifest_path = os.path.join(out_dir, f"manifest_{run_id}.json")
 
-        finally:
-            if pbar is not None:
-                pbar.close()
-            f.write("]\n")
+    state = _resume_state(out_dir, run_id, compression, journal_path, manifest_path) if resume else None
+    if state is not None and state["complete"]:
+        manifest = state["manifest"]
+        return {
+            "records": manifest["records"],
+            "duplicates": manifest.get("duplicates_dropped", 0),
+            "truncated": manifest.get("truncated", False),
+            "segments": len(manifest["segments"]),
+            "out_file": manifest_path,
+            "manifest": manifest_path,
+            "resumed": True,
+        }
 
-    manifest = {
-        "run_id": run_id,
-        "raw_file": out_path,
-        "records": total_written,
-        "sha256": sha256_file(out_path),
-    }
-    manifest_path = os.path.join(out_dir, f"manifest_{run_id}.json")
-    write_json(manifest_path, manifest)
+    base = _load_local_store(out_dir, run_id) if incremental else None
+    base_keys: Set[Tuple[str, str]] = set()
+    if base is not None:
+        base_keys = base["keys"]
+        if base["since"] and base["since"] > start_date:
+            start_date = base["since"]
 
-    return {"records": total_written, "out_file": out_path, "manifest": manifest_path}
+    shards = plan_shards(drugs, brands, start_date, end_date, shard_days, split_terms)
+    shard_stats: List[Dict[str, Any]] = []
+    checkpoints: Dict[str, Dict[str, Any]] = {}
+    # Probe requests of windows that were split; their stats are not kept, so they are counted here.
+    split_probes = len(state["splits"]) if state is not None else 0
+    if state is None:
+        writer = _RawWriter(out_dir, run_id, journal_path, compression, segment_records, seen=set(base_keys))
+    else:
+        writer = _RawWriter(
+            out_dir,
+            run_id,
+            journal_path,
+            compression,
+            segment_records,
+            segments=state["segments"],
+            hasher=state["hasher"],
+            records=state["records"],
+            duplicates=state["duplicates"],
+            seen=state["seen"] | base_keys,
+            new_ids={key[0] for key in state["seen"]},
+        )
+        leaves: List[Tuple[Tuple[int, ...], Shard]] = []
+        queue = [((i,), shard) for i, shard in enumerate(shards)]
+        while queue:
+            path, shard = queue.pop(0)
+            if shard.key in state["splits"]:
+                queue.extend((path + (i,), child) for i, child in enumerate(_bisect(shard)))
+            elif shard.key in state["done"]:
+                shard_stats.append(state["done"][shard.key])
+            else:
+                leaves.append((path, shard))
+        plan = leaves
+        checkpoints = state["windows"]
+    if state is None:
+        plan = [((i,), shard) for i, shard in enumerate(shards)]
+    # Every shard is registered before any is fetched, so none can write ahead of an earlier one.
+    for path, shard in plan:
+        writer.register(shard, path)
+    shards = [shard for _, shard in plan]
 
+    transport = HttpTransport(OPENFDA.requests_per_minute, timeout=30, cassette=cassette)
+    restored = sum(st["fetched"] for st in shard_stats) + sum(
+        checkpoints[s.key]["fetched"] for s in shards if s.key in checkpoints
+    )
+    pbar = tqdm(total=restored, initial=restored, desc="FAERS records", unit="rec")
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    complete = False
+    try:
+        pending = {
+            pool.submit(_fetch_window, run_id, s, country, transport, writer, pbar, stop, checkpoints.get(s.key))
+            for s in shards
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stats, children = fut.result()
+                if stats is None and children:
+                    split_probes += 1
+                for child in children:
+                    pending.add(pool.submit(_fetch_window, run_id, child, country, transport, writer, pbar, stop))
+        if base is not None:
+            delta_records = writer.records
+            base_ids = {key[0] for key in base_keys}
+            carried = writer.fold(iter_raw_records(base["manifest"]))
+            base["stats"] = {
+                "base_run_id": base["run_id"],
+                "base_manifest": base["manifest"],
+                "since": start_date,
+                "new_reports": len(writer.new_ids - base_ids),
+                "updated_reports": len(writer.new_ids & base_ids),
+                "delta_records": delta_records,
+                "carried_over": carried,
+            }
+        complete = True
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        transport.close()
+        if cassette is not None:
+            cassette.close()
+        close_request_log(run_id)
+        pbar.close()
+        segments = writer.close()
+        if not complete:
+            segments = writer.committed_segments()
+        shard_stats.extend(writer.shard_stats)
+        shard_stats.sort(key=lambda st: st["key"])
+        manifest = {
+            "run_id": run_id,
+            "format": "ndjson",
+            "compression": compression,
+            "status": "complete" if complete else "partial",
+            "records": sum(seg["records"] for seg in segments),
+            "duplicates_dropped": writer.duplicates,
+            "sha256": combined_sha256(segments),
+            "segments": segments,
+            "requests": sum(st["requests"] for st in shard_stats) + split_probes,
+            "truncated": any(st["truncated"] for st in shard_stats),
+            "shards": shard_stats,
+        }
+        if base is not None and "stats" in base:
+            manifest["incremental"] = base["stats"]
+        write_json(manifest_path, manifest)
 
+    return {
+        "records": manifest["records"],
+        "duplicates": writer.duplicates,
+        "truncated": manifest["truncated"],
+        "segments": len(segments),
+        "out_file": manifest_path,
+        "manifest": manifest_path,
+        "resumed": state is not None,
+        "incremental": manifest.get("incremental"),
+    }
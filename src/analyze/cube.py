@@ -0,0 +1,142 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+CUBE_FILENAME = "cube.csv"
+# Marks a cell rolled up over a multi-valued dimension (a report can list several drugs and
+# reactions), so totals over those dimensions stay distinct-report counts.
+ALL = "*"
+OTHER_DRUG = "(other)"
+DIMENSIONS = ["month", "ingredient", "drug_role", "reaction_term_text", "patient_sex", "age_bucket"]
+MULTI_VALUED = ["ingredient", "drug_role", "reaction_term_text"]
+OUTCOMES = [
+    "death",
+    "hospitalization",
+    "life_threatening",
+    "disability",
+    "congenital_anomaly",
+    "intervention",
+    "other",
+]
+MEASURES = ["reports"] + OUTCOMES
+AGE_EDGES = [0, 18, 30, 40, 50, 60, 70, 80, np.inf]
+AGE_LABELS = ["<18", "18-29", "30-39", "40-49", "50-59", "60-69", "70-79", "80+"]
+# (drug dimensions, include reaction) for each grouping set that is materialized.
+GROUPING_SETS = [
+    (drug_dims, with_reaction)
+    for drug_dims in (["ingredient", "drug_role"], ["ingredient"], ["drug_role"], [])
+    for with_reaction in (True, False)
+]
+
+CubeFrames = Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+
+
+def cube_path(out_dir: str) -> str:
+    return os.path.join(out_dir, CUBE_FILENAME)
+
+
+def _report_facts(reports: pd.DataFrame) -> pd.DataFrame:
+    received = reports["received_date"].astype("string")
+    age = pd.to_numeric(reports["patient_age_years"], errors="coerce")
+    buckets = pd.cut(age, AGE_EDGES, right=False, labels=AGE_LABELS)
+    facts = pd.DataFrame(
+        {
+            "safetyreportid": reports["safetyreportid"].astype(str).to_numpy(),
+            "month": received.str.slice(0, 7).where(received.str.len() >= 7, "unknown").fillna("unknown").to_numpy(),
+            "patient_sex": reports["patient_sex"].fillna("U").astype(str).to_numpy(),
+            "age_bucket": buckets.cat.add_categories("unknown").fillna("unknown").astype(str).to_numpy(),
+        }
+    )
+    for name in OUTCOMES:
+        facts[name] = reports[name].fillna(False).astype(bool).to_numpy()
+    return facts
+
+
+def build_cube(reports: pd.DataFrame, drugs: pd.DataFrame, reactions: pd.DataFrame) -> pd.DataFrame:
+    # Every cell counts distinct reports. Report-level dimensions (month, sex, age bucket) are
+    # always at full detail and roll up by summing; the multi-valued ones are materialized at
+    # each grouping level, with ALL where they are rolled up.
+    facts = _report_facts(reports)
+    drugs = drugs.reindex(columns=["safetyreportid", "drug_role", "ingredient_name"])
+    drug_keys = pd.DataFrame(
+        {
+            "safetyreportid": drugs["safetyreportid"].astype(str).to_numpy(),
+            "ingredient": drugs["ingredient_name"].str.lower().fillna(OTHER_DRUG).to_numpy(),
+            "drug_role": drugs["drug_role"].fillna("").astype(str).to_numpy(),
+        }
+    )
+    reactions = reactions.reindex(columns=["safetyreportid", "reaction_term_text"]).dropna()
+    reaction_keys = reactions.astype({"safetyreportid": str}).drop_duplicates()
+
+    parts: List[pd.DataFrame] = []
+    for drug_dims, with_reaction in GROUPING_SETS:
+        rows = facts
+        if drug_dims:
+            rows = rows.merge(drug_keys[["safetyreportid"] + drug_dims].drop_duplicates(), on="safetyreportid")
+        if with_reaction:
+            rows = rows.merge(reaction_keys, on="safetyreportid")
+        detailed = drug_dims + (["reaction_term_text"] if with_reaction else [])
+        rows = rows.assign(reports=1, **{dim: ALL for dim in MULTI_VALUED if dim not in detailed})
+        parts.append(rows.groupby(DIMENSIONS, sort=False)[MEASURES].sum().reset_index())
+    return _normalize(pd.concat(parts, ignore_index=True))
+
+
+def _normalize(cube: pd.DataFrame) -> pd.DataFrame:
+    cube = cube.groupby(DIMENSIONS, sort=True)[MEASURES].sum().reset_index()
+    cube[MEASURES] = cube[MEASURES].astype(np.int64)
+    return cube[cube["reports"] != 0].reset_index(drop=True)
+
+
+def combine_cubes(cubes: Sequence[pd.DataFrame], signs: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    # Cells are additive across disjoint sets of reports, so cubes built per chunk (or for new
+    # and superseded report versions, with sign -1) merge by summing.
+    signs = signs or [1] * len(cubes)
+    scaled = [cube.assign(**{m: cube[m] * sign for m in MEASURES}) for cube, sign in zip(cubes, signs)]
+    if not scaled:
+        return pd.DataFrame(columns=DIMENSIONS + MEASURES)
+    return _normalize(pd.concat(scaled, ignore_index=True))
+
+
+def update_cube(cube: pd.DataFrame, added: CubeFrames, removed: Optional[CubeFrames] = None) -> pd.DataFrame:
+    # `removed` holds the previous versions of reports that `added` supersedes.
+    cubes = [cube, build_cube(*added)]
+    signs = [1, 1]
+    if removed is not None:
+        cubes.append(build_cube(*removed))
+        signs.append(-1)
+    return combine_cubes(cubes, signs)
+
+
+def rollup(cube: pd.DataFrame, by: Sequence[str] = (), **filters: Any) -> pd.DataFrame:
+    # Distinct-report measures grouped by `by`; keyword filters take a value or a list of values
+    # for any dimension, e.g. rollup(cube, ["month"], drug_role="PRIMARY").
+    by = list(by)
+    unknown = [dim for dim in by + list(filters) if dim not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown cube dimensions: {unknown}")
+    mask = np.ones(len(cube), dtype=bool)
+    for dim in MULTI_VALUED:
+        detailed = dim in by or dim in filters
+        mask &= (cube[dim] != ALL).to_numpy() if detailed else (cube[dim] == ALL).to_numpy()
+    for dim, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= cube[dim].isin([str(v) for v in values]).to_numpy()
+    selected = cube[mask]
+    if not by:
+        return selected[MEASURES].sum().to_frame().T
+    return selected.groupby(by, sort=True)[MEASURES].sum()
+
+
+def write_cube(cube: pd.DataFrame, path: str) -> str:
+    cube.to_csv(path, index=False)
+    return path
+
+
+def load_cube(path: str) -> pd.DataFrame:
+    if os.path.isdir(path):
+        path = cube_path(path)
+    dtypes: Dict[str, Any] = {dim: str for dim in DIMENSIONS}
+    dtypes.update({m: np.int64 for m in MEASURES})
+    return pd.read_csv(path, dtype=dtypes, keep_default_na=False)
@@ -0,0 +1,372 @@
+import math
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+SIGNAL_COLUMNS = [
+    "drug",
+    "ingredient_rxcui",
+    "reaction_term_text",
+    "a",
+    "b",
+    "c",
+    "d",
+    "expected",
+    "prr",
+    "prr_lower",
+    "prr_upper",
+    "ror",
+    "ror_lower",
+    "ror_upper",
+    "ic",
+    "ic025",
+    "ic975",
+    "ebgm",
+    "eb05",
+    "eb95",
+]
+Z_95 = 1.959963984540054
+# DuMouchel's (1999) starting values for the two-gamma GPS prior: alpha1, beta1, alpha2, beta2, P.
+DEFAULT_PRIOR = (0.2, 0.1, 2.0, 4.0, 1.0 / 3.0)
+# alpha and beta are fitted within [1 / PRIOR_BOUND, PRIOR_BOUND] and P's odds within the same
+# range. A fit that ends on a bound is degenerate (e.g. a point mass at lambda = 1), and
+# DEFAULT_PRIOR is used instead.
+PRIOR_BOUND = 1e3
+# Triples (report, drug, reaction) expanded per block when building co-occurrence counts.
+COOCCURRENCE_BLOCK = 5_000_000
+# Iteration cap and relative tolerance for the incomplete gamma series and continued fraction.
+GAMMA_CDF_ITERS = 1000
+GAMMA_CDF_EPS = 1e-12
+
+_LANCZOS = np.array(
+    [
+        0.99999999999980993,
+        676.5203681218851,
+        -1259.1392167224028,
+        771.32342877765313,
+        -176.61502916214059,
+        12.507343278686905,
+        -0.13857109526572012,
+        9.9843695780195716e-6,
+        1.5056327351493116e-7,
+    ]
+)
+
+
+def _gammaln(x: np.ndarray) -> np.ndarray:
+    # Lanczos approximation (g=7) for x > 0; values below 0.5 are shifted up by one.
+    x = np.asarray(x, dtype=float)
+    shift = x < 0.5
+    z = np.where(shift, x + 1.0, x) - 1.0
+    series = _LANCZOS[0] + sum(_LANCZOS[i] / (z + i) for i in range(1, len(_LANCZOS)))
+    t = z + 7.5
+    out = 0.5 * math.log(2.0 * math.pi) + (z + 0.5) * np.log(t) - t + np.log(series)
+    return np.where(shift, out - np.log(np.where(shift, x, 1.0)), out)
+
+
+def _digamma(x: np.ndarray) -> np.ndarray:
+    x = np.array(x, dtype=float)
+    out = np.zeros_like(x)
+    small = x < 6.0
+    while small.any():
+        out[small] -= 1.0 / x[small]
+        x[small] += 1.0
+        small = x < 6.0
+    f = 1.0 / (x * x)
+    return out + np.log(x) - 0.5 / x - f * (1.0 / 12 - f * (1.0 / 120 - f * (1.0 / 252 - f * (1.0 / 240 - f / 132))))
+
+
+def _gamma_cdf(x: np.ndarray, shape: np.ndarray, rate: np.ndarray) -> np.ndarray:
+    # Regularized lower incomplete gamma P(shape, rate * x): the series below shape + 1 and
+    # Lentz's continued fraction for the upper tail above it (Numerical Recipes gser/gcf).
+    z, a = np.broadcast_arrays(np.asarray(x * rate, dtype=float), np.asarray(shape, dtype=float))
+    out = np.zeros(z.shape)
+    pos = z > 0
+    log_front = np.where(pos, a * np.log(np.where(pos, z, 1.0)) - z - _gammaln(a), -np.inf)
+    series = pos & (z < a + 1.0)
+    upper = pos & ~series
+
+    zs, ap = z[series], a[series].copy()
+    term = 1.0 / ap
+    total = term.copy()
+    for _ in range(GAMMA_CDF_ITERS):
+        ap += 1.0
+        term *= zs / ap
+        total += term
+        if (np.abs(term) < np.abs(total) * GAMMA_CDF_EPS).all():
+            break
+    out[series] = total * np.exp(log_front[series])
+
+    zu, au = z[upper], a[upper]
+    tiny = 1e-300
+    b = zu + 1.0 - au
+    c = np.full_like(zu, 1.0 / tiny)
+    d = 1.0 / b
+    h = d.copy()
+    for i in range(1, GAMMA_CDF_ITERS + 1):
+        an = -i * (i - au)
+        b += 2.0
+        d = an * d + b
+        d[np.abs(d) < tiny] = tiny
+        c = b + an / c
+        c[np.abs(c) < tiny] = tiny
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if (np.abs(delta - 1.0) < GAMMA_CDF_EPS).all():
+            break
+    out[upper] = 1.0 - np.exp(log_front[upper]) * h
+    return np.clip(out, 0.0, 1.0)
+
+
+def _nelder_mead(f: Callable[[np.ndarray], float], x0: np.ndarray, iters: int = 400, tol: float = 1e-8) -> np.ndarray:
+    n = len(x0)
+    simplex = [x0] + [x0 + np.eye(n)[i] * 0.5 for i in range(n)]
+    values = [f(x) for x in simplex]
+    for _ in range(iters):
+        order = np.argsort(values)
+        simplex = [simplex[i] for i in order]
+        values = [values[i] for i in order]
+        if abs(values[-1] - values[0]) <= tol * (abs(values[0]) + tol):
+            break
+        centroid = np.mean(simplex[:-1], axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        fr = f(reflected)
+        if fr < values[0]:
+            expanded = centroid + 2.0 * (centroid - simplex[-1])
+            fe = f(expanded)
+            simplex[-1], values[-1] = (expanded, fe) if fe < fr else (reflected, fr)
+        elif fr < values[-2]:
+            simplex[-1], values[-1] = reflected, fr
+        else:
+            contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            fc = f(contracted)
+            if fc < values[-1]:
+                simplex[-1], values[-1] = contracted, fc
+            else:
+                simplex = [simplex[0] + 0.5 * (x - simplex[0]) for x in simplex]
+                values = [values[0]] + [f(x) for x in simplex[1:]]
+    return simplex[int(np.argmin(values))]
+
+
+def _nb_logpmf(counts: np.ndarray, inverse: np.ndarray, alpha: float, beta: float, expected: np.ndarray) -> np.ndarray:
+    # n = counts[inverse]; report counts take few distinct values, so the log-gamma terms are
+    # evaluated once per distinct count.
+    n = counts[inverse]
+    log_coef = _gammaln(alpha + counts) - math.lgamma(alpha) - _gammaln(counts + 1.0)
+    return log_coef[inverse] + alpha * np.log(beta / (beta + expected)) + n * np.log(expected / (beta + expected))
+
+
+def fit_gps_prior(a: np.ndarray, expected: np.ndarray) -> Tuple[float, float, float, float, float]:
+    # Maximum marginal likelihood of the two-gamma mixture over the observed (a >= 1) pairs,
+    # using the zero-truncated negative binomial as in DuMouchel's GPS. Pairs are squashed
+    # into weighted (count, expected) cells first (expected binned at 1% on the log scale),
+    # so the optimizer's cost no longer grows with the number of pairs.
+    log_bins = np.round(np.log(expected) * 100.0).astype(np.int64)
+    cells, cell_of, weights = np.unique(
+        np.stack([a.astype(np.int64), log_bins - log_bins.min()]), axis=1, return_inverse=True, return_counts=True
+    )
+    expected = np.bincount(cell_of.ravel(), weights=expected) / weights
+    counts, inverse = np.unique(cells[0].astype(float), return_inverse=True)
+
+    log_bound = math.log(PRIOR_BOUND)
+
+    def neg_loglik(theta: np.ndarray) -> float:
+        if np.abs(theta).max() > log_bound:
+            return float("inf")
+        a1, b1, a2, b2 = np.exp(theta[:4])
+        p = 1.0 / (1.0 + math.exp(-theta[4]))
+        l1 = _nb_logpmf(counts, inverse, a1, b1, expected)
+        l2 = _nb_logpmf(counts, inverse, a2, b2, expected)
+        zero = p * (b1 / (b1 + expected)) ** a1 + (1.0 - p) * (b2 / (b2 + expected)) ** a2
+        ll = np.logaddexp(math.log(p) + l1, math.log(1.0 - p) + l2) - np.log1p(-np.minimum(zero, 1.0 - 1e-12))
+        value = -float((weights * ll).sum())
+        return value if math.isfinite(value) else float("inf")
+
+    a1, b1, a2, b2, p = DEFAULT_PRIOR
+    x0 = np.array([math.log(a1), math.log(b1), math.log(a2), math.log(b2), math.log(p / (1.0 - p))])
+    if len(a) < 5:
+        return DEFAULT_PRIOR
+    theta = _nelder_mead(neg_loglik, x0)
+    if not neg_loglik(theta) < neg_loglik(x0) or np.abs(theta).max() > log_bound - 0.1:
+        return DEFAULT_PRIOR
+    a1, b1, a2, b2 = (float(v) for v in np.exp(theta[:4]))
+    return (a1, b1, a2, b2, float(1.0 / (1.0 + math.exp(-theta[4]))))
+
+
+def ebgm(
+    a: np.ndarray, expected: np.ndarray, prior: Sequence[float]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    a1, b1, a2, b2, p = prior
+    counts, inverse = np.unique(a.astype(float), return_inverse=True)
+    n = counts[inverse]
+    l1 = math.log(p) + _nb_logpmf(counts, inverse, a1, b1, expected)
+    l2 = math.log(1.0 - p) + _nb_logpmf(counts, inverse, a2, b2, expected)
+    q = np.exp(l1 - np.logaddexp(l1, l2))
+    s1, r1 = a1 + n, b1 + expected
+    s2, r2 = a2 + n, b2 + expected
+    mean_log = q * (_digamma(s1) - np.log(r1)) + (1.0 - q) * (_digamma(s2) - np.log(r2))
+
+    def quantile(level: float) -> np.ndarray:
+        # Bisection on log(lambda) for all pairs at once.
+        lo = np.full_like(n, -30.0)
+        hi = np.full_like(n, 30.0)
+        for _ in range(60):
+            mid = 0.5 * (lo + hi)
+            lam = np.exp(mid)
+            below = q * _gamma_cdf(lam, s1, r1) + (1.0 - q) * _gamma_cdf(lam, s2, r2) < level
+            lo = np.where(below, mid, lo)
+            hi = np.where(below, hi, mid)
+        return np.exp(0.5 * (lo + hi))
+
+    return (np.exp(mean_log), quantile(0.05), quantile(0.95))
+
+
+def _cooccurrence(
+    drug_reports: np.ndarray,
+    drug_codes: np.ndarray,
+    reaction_reports: np.ndarray,
+    reaction_codes: np.ndarray,
+    n_reports: int,
+    n_terms: int,
+    block: int = COOCCURRENCE_BLOCK,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Sparse product of the report x drug and report x reaction incidence matrices: every
+    # (report, drug) entry is expanded against that report's reactions, the resulting pair
+    # codes are counted per block and the block counts summed.
+    order = np.argsort(reaction_reports, kind="stable")
+    reaction_codes = reaction_codes[order]
+    per_report = np.bincount(reaction_reports, minlength=n_reports)
+    starts = np.concatenate(([0], np.cumsum(per_report)[:-1]))
+    reps = per_report[drug_reports]
+    bounds = np.searchsorted(np.cumsum(reps), np.arange(block, int(reps.sum()), block))
+    parts: List[Tuple[np.ndarray, np.ndarray]] = []
+    for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(reps)]))):
+        r = reps[lo:hi]
+        total = int(r.sum())
+        if total == 0:
+            continue
+        offsets = np.arange(total) - np.repeat(np.cumsum(r) - r, r)
+        terms = reaction_codes[np.repeat(starts[drug_reports[lo:hi]], r) + offsets]
+        pair = np.repeat(drug_codes[lo:hi].astype(np.int64), r) * n_terms + terms
+        parts.append(np.unique(pair, return_counts=True))
+    if not parts:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    codes, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([p[1] for p in parts])).astype(np.int64)
+    return (codes, counts)
+
+
+def disproportionality(a: np.ndarray, n_drug: np.ndarray, n_reaction: np.ndarray, n: int) -> Dict[str, np.ndarray]:
+    a = a.astype(float)
+    b = n_drug - a
+    c = n_reaction - a
+    d = n - a - b - c
+    expected = n_drug * n_reaction / float(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prr = (a / (a + b)) / (c / (c + d))
+        prr_se = np.sqrt(1.0 / a - 1.0 / (a + b) + 1.0 / c - 1.0 / (c + d))
+        ror = (a * d) / (b * c)
+        ror_se = np.sqrt(1.0 / a + 1.0 / b + 1.0 / c + 1.0 / d)
+        # BCPNN information component with the Norén et al. (2013) credibility-interval approximation.
+        ic = np.log2((a + 0.5) / (expected + 0.5))
+        shrunk = a + 0.5
+        return {
+            "a": a.astype(np.int64),
+            "b": b.astype(np.int64),
+            "c": c.astype(np.int64),
+            "d": d.astype(np.int64),
+            "expected": expected,
+            "prr": prr,
+            "prr_lower": prr * np.exp(-Z_95 * prr_se),
+            "prr_upper": prr * np.exp(Z_95 * prr_se),
+            "ror": ror,
+            "ror_lower": ror * np.exp(-Z_95 * ror_se),
+            "ror_upper": ror * np.exp(Z_95 * ror_se),
+            "ic": ic,
+            "ic025": ic - 3.3 * shrunk**-0.5 - 2.0 * shrunk**-1.5,
+            "ic975": ic + 2.4 * shrunk**-0.5 - 0.5 * shrunk**-1.5,
+        }
+
+
+def compute_signals(
+    curated_dir: str,
+    roles: Optional[Sequence[str]] = None,
+    min_count: int = 3,
+    all_drugs: bool = False,
+) -> pd.DataFrame:
+    drugs = pd.read_csv(
+        os.path.join(curated_dir, "Drugs.csv"),
+        usecols=["safetyreportid", "drug_role", "drug_name_original", "ingredient_rxcui", "ingredient_name"],
+        dtype=str,
+    )
+    reactions = pd.read_csv(
+        os.path.join(curated_dir, "Reactions.csv"), usecols=["safetyreportid", "reaction_term_text"], dtype=str
+    )
+    if roles:
+        drugs = drugs[drugs["drug_role"].isin([r.upper() for r in roles])]
+    reactions = reactions.dropna(subset=["reaction_term_text"])
+
+    # Drugs mapped to an RxNorm ingredient are counted under it; every other product under its
+    # normalized name, so unmapped co-medications still form the comparator background.
+    named = drugs["drug_name_original"].fillna("").str.strip().str.upper()
+    drugs = drugs.assign(
+        drug=drugs["ingredient_name"].str.lower().where(drugs["ingredient_name"].notna(), named),
+    )
+    drugs = drugs[drugs["drug"] != ""]
+
+    report_codes, report_ids = pd.factorize(pd.concat([drugs["safetyreportid"], reactions["safetyreportid"]]))
+    drug_reports = report_codes[: len(drugs)]
+    reaction_reports = report_codes[len(drugs) :]
+    drug_codes, drug_labels = pd.factorize(drugs["drug"])
+    term_codes, term_labels = pd.factorize(reactions["reaction_term_text"])
+
+    # Only reports with at least one in-scope drug and one reaction enter the 2x2 tables.
+    has_both = (np.bincount(drug_reports, minlength=len(report_ids)) > 0) & (
+        np.bincount(reaction_reports, minlength=len(report_ids)) > 0
+    )
+    n = int(has_both.sum())
+    if n == 0:
+        return pd.DataFrame(columns=SIGNAL_COLUMNS)
+
+    def incidence(reports: np.ndarray, codes: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        keep = has_both[reports]
+        unique = np.unique(reports[keep].astype(np.int64) * width + codes[keep])
+        return ((unique // width).astype(np.intp), (unique % width).astype(np.intp))
+
+    drug_reports, drug_codes = incidence(drug_reports, drug_codes, len(drug_labels))
+    reaction_reports, term_codes = incidence(reaction_reports, term_codes, len(term_labels))
+    n_drug = np.bincount(drug_codes, minlength=len(drug_labels))
+    n_reaction = np.bincount(term_codes, minlength=len(term_labels))
+
+    pair_codes, a = _cooccurrence(
+        drug_reports, drug_codes, reaction_reports, term_codes, len(report_ids), len(term_labels)
+    )
+    pair_drug = pair_codes // len(term_labels)
+    pair_term = pair_codes % len(term_labels)
+    stats = disproportionality(a, n_drug[pair_drug], n_reaction[pair_term], n)
+    prior = fit_gps_prior(a, stats["expected"])
+    stats["ebgm"], stats["eb05"], stats["eb95"] = ebgm(a, stats["expected"], prior)
+
+    ingredient_rxcui = (
+        drugs.dropna(subset=["ingredient_name"]).drop_duplicates("drug").set_index("drug")["ingredient_rxcui"]
+    )
+    labels = np.asarray(drug_labels, dtype=object)[pair_drug]
+    out = pd.DataFrame(
+        {
+            "drug": labels,
+            "ingredient_rxcui": pd.Series(labels).map(ingredient_rxcui).to_numpy(),
+            "reaction_term_text": np.asarray(term_labels, dtype=object)[pair_term],
+            **stats,
+        },
+        columns=SIGNAL_COLUMNS,
+    )
+    keep = out["a"] >= min_count
+    if not all_drugs:
+        keep &= out["ingredient_rxcui"].notna()
+    out = out[keep].sort_values(["eb05", "a"], ascending=False, kind="stable").reset_index(drop=True)
+    out.attrs["prior"] = prior
+    out.attrs["reports"] = n
+    return out
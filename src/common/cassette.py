@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import metrics
+from .config import PATHS
+from .logging_utils import SECRET_PARAMS, redact_params
+
+CASSETTE_MODES = ("record", "replay")
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def request_key(url: str, params: Optional[Dict[str, Any]]) -> str:
+    # Secrets are left out of the key, so a run recorded with an API key replays without one,
+    # and so is the host, so a run recorded against the mock server replays under the real URL.
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+    return hashlib.sha256(json.dumps([urlsplit(url).path, items]).encode("utf-8")).hexdigest()
+
+
+def cassette_path(name: str, root: Optional[str] = None) -> str:
+    return os.path.join(root or PATHS.cassettes_dir, f"cassette_{name}.jsonl")
+
+
+class Cassette:
+    # Response bodies are stored once per content hash under objects/, gzip-compressed, and
+    # shared by every cassette in the directory; cassette_<name>.jsonl maps each request key to
+    # its status, content type and body hash.
+    def __init__(self, name: str, mode: str, root: Optional[str] = None) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {CASSETTE_MODES}")
+        self.name = name
+        self.mode = mode
+        self.root = root or PATHS.cassettes_dir
+        self.path = cassette_path(name, self.root)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if mode == "replay" and not os.path.exists(self.path):
+            raise FileNotFoundError(f"No cassette recorded for run {name}: {self.path}")
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+        self._index = None
+        if mode == "record":
+            os.makedirs(self.objects_dir, exist_ok=True)
+            self._index = open(self.path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.gz")
+
+    def record(self, url: str, params: Optional[Dict[str, Any]], resp: requests.Response) -> None:
+        body = resp.content
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(gzip.compress(body, mtime=0))
+            os.replace(tmp, path)
+        entry = {
+            "key": request_key(url, params),
+            "url": url,
+            "params": redact_params(params or {}),
+            "status": resp.status_code,
+            "content_type": resp.headers.get("Content-Type"),
+            "body": digest,
+            "bytes": len(body),
+        }
+        # The body is in place before its index line, so a crash never leaves a dangling entry.
+        with self._lock:
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index.flush()
+            self._entries[entry["key"]] = entry
+        metrics.count("cassette.recorded")
+
+    def replay(self, url: str, params: Optional[Dict[str, Any]]) -> requests.Response:
+        entry = self._entries.get(request_key(url, params))
+        if entry is None:
+            raise CassetteMiss(f"Cassette {self.name} has no response for {url} {redact_params(params or {})}")
+        with open(self._object_path(entry["body"]), "rb") as f:
+            body = gzip.decompress(f.read())
+        if hashlib.sha256(body).hexdigest() != entry["body"]:
+            raise RuntimeError(f"Cassette object {entry['body']} does not match its hash")
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp._content = body
+        resp.headers = CaseInsensitiveDict({"Content-Type": entry["content_type"] or "application/json"})
+        resp.encoding = "utf-8"
+        resp.url = url
+        metrics.count("cassette.replayed")
+        return resp
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.flush()
+            os.fsync(self._index.fileno())
+            self._index.close()
+            self._index = None
@@ -4,31 +4,89 @@ from dataclasses import dataclass
 
 @dataclass
 class OpenFDAConfig:
-    base_url: str = "https://api.fda.gov/drug/event.json"
+    # Point OPENFDA_BASE_URL at 'cli.py mock-server' to run acquisition offline.
+    base_url: str = os.environ.get("OPENFDA_BASE_URL", "https://api.fda.gov/drug/event.json")
     api_key: str | None = os.environ.get("OPENFDA_API_KEY")
     max_limit: int = 100
-    requests_per_minute: int = 60 if api_key is None else 240
+    skip_ceiling: int = int(os.environ.get("OPENFDA_SKIP_CEILING", "25000"))
+    requests_per_minute: int = int(os.environ.get("OPENFDA_REQUESTS_PER_MINUTE", "0")) or (60 if api_key is None else 240)
+
+
+@dataclass
+class HttpConfig:
+    pool_size: int = 16
+    max_concurrency: int = 8
+    max_retries: int = 5
+    backoff_base: float = 1.0
+    backoff_cap: float = 60.0
+
+
+@dataclass
+class RequestLogConfig:
+    # Lines are handed to a background writer and appended in batches of up to batch_size, or
+    # after flush_interval seconds, with an fsync at most every fsync_interval seconds.
+    batch_size: int = 512
+    flush_interval: float = 0.5
+    fsync_interval: float = 5.0
+    # Roll requests_<run_id>.jsonl over to a numbered file past this size (0 = never).
+    rotate_bytes: int = int(float(os.environ.get("REQUEST_LOG_ROTATE_MB", "0")) * 1024 * 1024)
+    compress_rotated: bool = True
 
 
 @dataclass
 class RxNormConfig:
-    base_url: str = "https://rxnav.nlm.nih.gov/REST"
+    base_url: str = os.environ.get("RXNORM_BASE_URL", "https://rxnav.nlm.nih.gov/REST")
     cache_dir: str = os.environ.get("RXNORM_CACHE_DIR", "artifacts/cache")
     cache_file: str = os.path.join(cache_dir, "rxnorm_cache.json")
+    cache_db: str = os.path.join(cache_dir, "rxnorm_cache.sqlite")
+    cache_ttl_days: float = float(os.environ.get("RXNORM_CACHE_TTL_DAYS", "90"))
+    # Bump when the lookup logic changes so entries written by older code are refetched.
+    cache_version: str = "1"
+    cache_flush_every: int = 500
+    cache_flush_interval: float = 5.0
+    # Path to a prebuilt offline index (file or directory of rxnorm_index_<release>.sqlite);
+    # when set, lookups never go to RxNav.
+    offline_index: str = os.environ.get("RXNORM_OFFLINE_INDEX", "")
+    index_dir: str = os.path.join(cache_dir, "rxnorm_index")
     requests_per_minute: int = 60000
 
 
+@dataclass
+class StageCacheConfig:
+    # Curation stage outputs keyed by input hash, stage source and config; least recently used
+    # entries are evicted once the cache is larger than max_bytes. Off unless STAGE_CACHE=1 or
+    # 'process --stage-cache'.
+    enabled: bool = os.environ.get("STAGE_CACHE", "0") == "1"
+    cache_dir: str = os.environ.get("STAGE_CACHE_DIR", os.path.join("artifacts", "cache", "stages"))
+    max_bytes: int = int(float(os.environ.get("STAGE_CACHE_MB", "4096")) * 1024 * 1024)
+    # Bump when the entry layout changes.
+    version: str = "1"
+
+
+@dataclass
+class ProductConfig:
+    # JSON object of canonical ingredient -> list of ingredient/brand terms; empty uses the
+    # built-in GLP-1 dictionary.
+    dictionary_file: str = os.environ.get("PRODUCT_DICTIONARY", "")
+    min_confidence: float = 0.65
+
+
 @dataclass
 class Paths:
     project_root: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
     logs_dir: str = os.path.join(project_root, "logs")
     raw_faers_dir: str = os.path.join(project_root, "artifacts", "raw_faers")
     curated_tables_dir: str = os.path.join(project_root, "artifacts", "curated_tables")
+    cassettes_dir: str = os.path.join(project_root, "artifacts", "cassettes")
     deliverables_dir: str = os.path.join(project_root, "deliverables")
 
 
 OPENFDA = OpenFDAConfig()
+HTTP = HttpConfig()
+REQUEST_LOG = RequestLogConfig()
 RXNORM = RxNormConfig()
+STAGE_CACHE = StageCacheConfig()
+PRODUCTS = ProductConfig()
 PATHS = Paths()
 
 
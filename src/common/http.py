@@ -0,0 +1,129 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .cassette import Cassette
+from .config import HTTP
+from .rate_limit import RateLimiter
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+ResponseHook = Callable[[requests.Response, int], None]
+
+
+def _retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpTransport:
+    def __init__(
+        self,
+        requests_per_minute: int,
+        timeout: float = 30,
+        pool_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        cassette: Optional[Cassette] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.cassette = cassette
+        self.max_concurrency = max(1, max_concurrency or HTTP.max_concurrency)
+        self.max_retries = HTTP.max_retries if max_retries is None else max_retries
+        self.limiter = RateLimiter(requests_per_minute)
+        self.session = requests.Session()
+        pool_size = pool_size or HTTP.pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        if resp is not None:
+            retry_after = _retry_after_seconds(resp)
+            if retry_after is not None:
+                return min(retry_after, HTTP.backoff_cap)
+        return random.uniform(0, min(HTTP.backoff_cap, HTTP.backoff_base * (2 ** attempt)))
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        on_response: Optional[ResponseHook] = None,
+    ) -> requests.Response:
+        if self.cassette is not None and self.cassette.mode == "replay":
+            # Replays skip the rate limiter and the network entirely.
+            resp = self.cassette.replay(url, params)
+            if on_response is not None:
+                on_response(resp, 0)
+            return resp
+        attempt = 0
+        # Latency histograms are kept per host, so openFDA and RxNav calls stay separate.
+        histogram = f"http:{urlsplit(url).netloc}"
+        while True:
+            self.limiter.acquire()
+            t0 = time.time()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                metrics.observe(histogram, (time.time() - t0) * 1000, type(exc).__name__)
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt, None))
+                attempt += 1
+                continue
+            metrics.observe(histogram, (time.time() - t0) * 1000, resp.status_code)
+            if on_response is not None:
+                on_response(resp, int((time.time() - t0) * 1000))
+            if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                if self.cassette is not None:
+                    self.cassette.record(url, params, resp)
+                return resp
+            time.sleep(self._backoff(attempt, resp))
+            attempt += 1
+
+    async def aget(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        on_response: Optional[ResponseHook] = None,
+    ) -> requests.Response:
+        return await asyncio.to_thread(self.get, url, params, on_response)
+
+    async def aget_many(
+        self,
+        calls: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+        on_response: Optional[ResponseHook] = None,
+    ) -> List[Any]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(url: str, params: Optional[Dict[str, Any]]) -> Any:
+            async with semaphore:
+                return await self.aget(url, params, on_response)
+
+        return await asyncio.gather(*(bounded(url, params) for url, params in calls), return_exceptions=True)
+
+    def get_many(
+        self,
+        calls: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+        on_response: Optional[ResponseHook] = None,
+    ) -> List[Any]:
+        return asyncio.run(self.aget_many(calls, on_response))
+
+    def close(self) -> None:
+        self.session.close()
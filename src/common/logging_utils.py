@@ -1,11 +1,30 @@
+import atexit
+import glob
+import gzip
 import json
 import os
+import queue
+import re
+import shutil
+import threading
 import time
 import uuid
+from collections import Counter
+from contextlib import contextmanager
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-from .config import PATHS, ensure_directories
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not serialized across processes
+    fcntl = None
+
+from .config import PATHS, REQUEST_LOG, ensure_directories
+
+SECRET_PARAMS = ("api_key",)
+REDACTED = "REDACTED"
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+_STOP = object()
 
 
 @dataclass
@@ -23,15 +42,274 @@ def new_run_id() -> str:
     return time.strftime("%Y%m%dT%H%M%S") + f"_{uuid.uuid4().hex[:8]}"
 
 
+def redact_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (REDACTED if k in SECRET_PARAMS and v else v) for k, v in params.items()}
+
+
 def _log_file(run_id: str) -> str:
     ensure_directories()
     return os.path.join(PATHS.logs_dir, f"requests_{run_id}.jsonl")
 
 
+def _rotated_files(path: str) -> List[Tuple[int, str]]:
+    # requests_<run_id>.<nnnn>.jsonl[.gz], oldest first; a plain file wins over its .gz while
+    # compression of that file is still in progress.
+    stem = path[: -len(".jsonl")]
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.(\d{4})\.jsonl(\.gz)?$")
+    found: Dict[int, str] = {}
+    for name in sorted(glob.glob(f"{glob.escape(stem)}.*.jsonl*"), reverse=True):
+        match = pattern.match(os.path.basename(name))
+        if match:
+            found[int(match.group(1))] = name
+    return sorted(found.items())
+
+
+def _compress(plain: str) -> None:
+    tmp = f"{plain}.gz.tmp"
+    with open(plain, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, f"{plain}.gz")
+    os.remove(plain)
+
+
+class RequestLogWriter:
+    # Callers only serialize and enqueue; a background thread appends batches with one write
+    # each and fsyncs periodically. Appends and rotation happen under an flock on a sidecar lock
+    # file, so several processes can log the same run, and a writer whose file was rotated away
+    # by another process reopens the current one before appending.
+    def __init__(
+        self,
+        path: str,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        fsync_interval: Optional[float] = None,
+        rotate_bytes: Optional[int] = None,
+        compress_rotated: Optional[bool] = None,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size or REQUEST_LOG.batch_size
+        self.flush_interval = REQUEST_LOG.flush_interval if flush_interval is None else flush_interval
+        self.fsync_interval = REQUEST_LOG.fsync_interval if fsync_interval is None else fsync_interval
+        self.rotate_bytes = REQUEST_LOG.rotate_bytes if rotate_bytes is None else rotate_bytes
+        self.compress_rotated = REQUEST_LOG.compress_rotated if compress_rotated is None else compress_rotated
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._fd: Optional[int] = None
+        self._lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._closed = False
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="request-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, entry: RequestLog) -> None:
+        if self._closed:
+            raise RuntimeError(f"Request log {self.path} is closed")
+        self._queue.put(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        # Blocks until everything queued so far is written and fsynced.
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(1.0):
+            if not self._thread.is_alive():
+                break
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        os.close(self._lock_fd)
+
+    def _next_batch(self) -> Tuple[List[str], Any]:
+        lines: List[str] = []
+        deadline: Optional[float] = None
+        while len(lines) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if not isinstance(item, str):
+                return (lines, item)
+            lines.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return (lines, None)
+
+    def _run(self) -> None:
+        last_sync = time.monotonic()
+        unsynced = False
+        while True:
+            lines, control = self._next_batch()
+            try:
+                if lines:
+                    self._append("".join(lines).encode("utf-8"))
+                    unsynced = True
+                if unsynced and (control is not None or time.monotonic() - last_sync >= self.fsync_interval):
+                    os.fsync(self._fd)
+                    unsynced = False
+                    last_sync = time.monotonic()
+            except OSError as exc:
+                # Logging must never take acquisition down; the failure is kept for the caller.
+                self.error = exc
+            if isinstance(control, threading.Event):
+                control.set()
+            elif control is _STOP:
+                break
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self) -> None:
+        if self._fd is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _append(self, data: bytes) -> None:
+        rotated = None
+        with self._locked():
+            self._reopen_if_rotated()
+            size = os.fstat(self._fd).st_size
+            if self.rotate_bytes and size and size + len(data) > self.rotate_bytes:
+                rotated = self._rotate()
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view) :]
+        # Compress outside the lock so other writers are not held up.
+        if rotated and self.compress_rotated:
+            _compress(rotated)
+
+    def _rotate(self) -> str:
+        existing = _rotated_files(self.path)
+        index = existing[-1][0] + 1 if existing else 1
+        rotated = f"{self.path[: -len('.jsonl')]}.{index:04d}.jsonl"
+        os.fsync(self._fd)
+        os.close(self._fd)
+        os.rename(self.path, rotated)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return rotated
+
+
+_writers: Dict[str, RequestLogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def _forget_writers() -> None:
+    # A forked child does not inherit the writer threads, so it starts its own writers.
+    _writers.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_writers)
+
+
 def append_request_log(entry: RequestLog) -> None:
-    path = _log_file(entry.run_id)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+    with _writers_lock:
+        writer = _writers.get(entry.run_id)
+        if writer is None:
+            writer = _writers[entry.run_id] = RequestLogWriter(_log_file(entry.run_id))
+    writer.write(entry)
+
+
+def close_request_log(run_id: Optional[str] = None) -> None:
+    with _writers_lock:
+        run_ids = [run_id] if run_id is not None else list(_writers)
+        writers = [_writers.pop(r) for r in run_ids if r in _writers]
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_request_log)
+
+
+def request_log_files(run_id_or_path: str) -> List[str]:
+    path = run_id_or_path if run_id_or_path.endswith(".jsonl") else _log_file(run_id_or_path)
+    files = [name for _, name in _rotated_files(path)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def iter_request_log(run_id_or_path: str) -> Iterator[Dict[str, Any]]:
+    for name in request_log_files(run_id_or_path):
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(name, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a writer that was killed mid-append.
+                    continue
+
+
+def _percentile(histogram: Counter, total: int, q: float) -> Optional[int]:
+    if not total:
+        return None
+    rank = max(1, -(-total * q // 100))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+def summarize_request_log(run_id_or_path: str) -> Dict[str, Any]:
+    # Streams the log once; latencies are counted per millisecond value, so memory stays
+    # bounded by the number of distinct latencies rather than the number of requests.
+    statuses: Counter = Counter()
+    latencies: Counter = Counter()
+    urls: Counter = Counter()
+    results = 0
+    first: Optional[str] = None
+    last: Optional[str] = None
+    for entry in iter_request_log(run_id_or_path):
+        statuses[str(entry.get("status_code"))] += 1
+        latencies[int(entry.get("elapsed_ms") or 0)] += 1
+        urls[entry.get("url")] += 1
+        results += int(entry.get("result_count") or 0)
+        timestamp = entry.get("timestamp")
+        if timestamp:
+            first = timestamp if first is None or timestamp < first else first
+            last = timestamp if last is None or timestamp > last else last
+    total = sum(statuses.values())
+    latency: Dict[str, Union[int, float, None]] = {
+        f"p{q}_ms": _percentile(latencies, total, q) for q in LATENCY_PERCENTILES
+    }
+    latency["max_ms"] = max(latencies) if latencies else None
+    latency["mean_ms"] = round(sum(ms * n for ms, n in latencies.items()) / total, 1) if total else None
+    return {
+        "requests": total,
+        "results": results,
+        "first": first,
+        "last": last,
+        "status_codes": dict(sorted(statuses.items())),
+        "error_rate": round(1 - statuses.get("200", 0) / total, 4) if total else None,
+        "latency": latency,
+        "urls": dict(urls.most_common()),
+        "files": request_log_files(run_id_or_path),
+    }
 
 
 def write_run_metadata(run_id: str, metadata: Dict[str, Any]) -> str:
@@ -42,3 +320,9 @@ def write_run_metadata(run_id: str, metadata: Dict[str, Any]) -> str:
     return path
 
 
+def read_run_metadata(run_id: str) -> Dict[str, Any]:
+    path = os.path.join(PATHS.logs_dir, f"run_{run_id}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
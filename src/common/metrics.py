@@ -0,0 +1,256 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from .config import PATHS, ensure_directories
+
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005
+
+
+def _rusage(who: int) -> Any:
+    return resource.getrusage(who) if resource is not None else None
+
+
+def _peak_rss_mb(usage: Any) -> Optional[float]:
+    if usage is None:
+        return None
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS.
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return round(usage.ru_maxrss / scale, 1)
+
+
+def _cpu_seconds(usage: Any) -> float:
+    return usage.ru_utime + usage.ru_stime if usage is not None else 0.0
+
+
+class Stage:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.records: Optional[int] = None
+
+
+class _Latency:
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.statuses: Counter = Counter()
+
+    def add(self, elapsed_ms: float, status: Any) -> None:
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.statuses[str(status)] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "max_ms": round(self.max_ms, 1),
+            "histogram": dict(zip(labels, self.buckets)),
+            "status_codes": dict(sorted(self.statuses.items())),
+        }
+
+
+class Metrics:
+    def __init__(self, run_id: str, command: str) -> None:
+        self.run_id = run_id
+        self.command = command
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._lock = threading.Lock()
+        self.stages: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.latency: Dict[str, _Latency] = defaultdict(_Latency)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        handle = Stage(name)
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        children0 = _cpu_seconds(_rusage(resource.RUSAGE_CHILDREN)) if resource is not None else 0.0
+        try:
+            yield handle
+        finally:
+            wall = time.perf_counter() - wall0
+            entry: Dict[str, Any] = {
+                "stage": name,
+                "wall_s": round(wall, 3),
+                "cpu_s": round(time.process_time() - cpu0, 3),
+                "peak_rss_mb": _peak_rss_mb(_rusage(resource.RUSAGE_SELF)) if resource is not None else None,
+            }
+            if resource is not None:
+                children = _cpu_seconds(_rusage(resource.RUSAGE_CHILDREN)) - children0
+                if children > 0:
+                    entry["children_cpu_s"] = round(children, 3)
+            if handle.records is not None:
+                entry["records"] = handle.records
+                entry["records_per_s"] = round(handle.records / wall, 1) if wall > 0 else None
+            with self._lock:
+                self.stages.append(entry)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name: str, elapsed_ms: float, status: Any = None) -> None:
+        with self._lock:
+            self.latency[name].add(elapsed_ms, status)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(sorted(self.counters.items()))
+            hit_rates = {}
+            for name in counters:
+                prefix, _, outcome = name.rpartition(".")
+                if outcome in ("hit", "miss") and prefix not in hit_rates:
+                    hits = counters.get(f"{prefix}.hit", 0)
+                    hit_rates[prefix] = round(hits / (hits + counters.get(f"{prefix}.miss", 0)), 4)
+            return {
+                "started_at": self.started_at,
+                "wall_s": round(time.perf_counter() - self._t0, 3),
+                "cpu_s": round(time.process_time() - self._cpu0, 3),
+                "peak_rss_mb": _peak_rss_mb(_rusage(resource.RUSAGE_SELF)) if resource is not None else None,
+                "stages": list(self.stages),
+                "counters": counters,
+                "cache_hit_rates": hit_rates,
+                "http_latency": {name: lat.to_dict() for name, lat in sorted(self.latency.items())},
+            }
+
+    def write(self) -> str:
+        # One file per run; acquire and process each fill their own section.
+        ensure_directories()
+        path = os.path.join(PATHS.logs_dir, f"metrics_{self.run_id}.json")
+        data: Dict[str, Any] = {"run_id": self.run_id, "commands": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        data.setdefault("commands", {})[self.command] = self.to_dict()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+
+_active: Optional[Metrics] = None
+
+
+def activate(metrics: Optional[Metrics]) -> None:
+    global _active
+    _active = metrics
+
+
+def active() -> Optional[Metrics]:
+    return _active
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Stage]:
+    if _active is None:
+        yield Stage(name)
+        return
+    with _active.stage(name) as handle:
+        yield handle
+
+
+def count(name: str, n: int = 1) -> None:
+    if _active is not None:
+        _active.count(name, n)
+
+
+def observe(name: str, elapsed_ms: float, status: Any = None) -> None:
+    if _active is not None:
+        _active.observe(name, elapsed_ms, status)
+
+
+class _Sampler(threading.Thread):
+    # Wall-clock sampling profiler: snapshots every other thread's stack at a fixed interval
+    # and counts identical stacks, written in the folded format flame-graph tools read.
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profiled(mode: Optional[str], run_id: str, command: str) -> Iterator[None]:
+    if not mode:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    ensure_directories()
+    prefix = os.path.join(PATHS.logs_dir, f"profile_{run_id}_{command}")
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{prefix}.pstats")
+            print(f"Wrote profile: {prefix}.pstats")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        return
+    sampler = _Sampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        with open(f"{prefix}.folded", "w", encoding="utf-8") as f:
+            for stack, hits in sampler.stacks.most_common():
+                f.write(f"{stack} {hits}\n")
+        print(f"Wrote {sum(sampler.stacks.values())} stack samples: {prefix}.folded")
+
+
+@contextmanager
+def instrumented(run_id: str, command: str, profile: Optional[str] = None) -> Iterator[Metrics]:
+    recorder = Metrics(run_id, command)
+    activate(recorder)
+    try:
+        with profiled(profile, run_id, command):
+            yield recorder
+    finally:
+        activate(None)
+        print(f"Wrote metrics: {recorder.write()}")
@@ -0,0 +1,18 @@
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: int) -> None:
+        self.interval = 60.0 / max(1, requests_per_minute)
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
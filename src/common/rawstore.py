@@ -0,0 +1,243 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .utils import sha256_file
+
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("zstd compression requires the 'zstandard' package") from exc
+    return zstandard
+
+
+def _compression_for(path: str) -> str:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+
+def _encode_frame(data: bytes, compression: str) -> bytes:
+    # Each page is an independent gzip member / zstd frame, so a segment can be
+    # truncated at any committed page boundary and appended to again.
+    if compression == "gzip":
+        return gzip.compress(data, mtime=0)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor().compress(data)
+    return data
+
+
+def segment_name(run_id: str, index: int, compression: str) -> str:
+    return f"faers_{run_id}_{index:04d}.ndjson{COMPRESSION_SUFFIXES[compression]}"
+
+
+class SegmentWriter:
+    def __init__(
+        self,
+        out_dir: str,
+        run_id: str,
+        compression: str = "none",
+        segment_records: int = 50000,
+        segments: Optional[List[Dict[str, Any]]] = None,
+        hasher: Optional["hashlib._Hash"] = None,
+        start_index: int = 0,
+    ) -> None:
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd":
+            _zstd()
+        self.out_dir = out_dir
+        self.run_id = run_id
+        self.compression = compression
+        self.segment_records = segment_records
+        # Lets independent writers fill disjoint, numbered segments of one run.
+        self.start_index = start_index
+        self.segments: List[Dict[str, Any]] = segments or []
+        self._f: Optional[BinaryIO] = None
+        self._hasher = hasher
+        if self.segments:
+            current = self.segments[-1]
+            self._f = open(os.path.join(out_dir, current["file"]), "r+b")
+            self._f.truncate(current["bytes"])
+            self._f.seek(current["bytes"])
+            if self._hasher is None:
+                self._hasher = hashlib.sha256()
+
+    @property
+    def current(self) -> Dict[str, Any]:
+        return self.segments[-1]
+
+    def _open_next(self) -> None:
+        name = segment_name(self.run_id, self.start_index + len(self.segments), self.compression)
+        self._f = open(os.path.join(self.out_dir, name), "wb")
+        self._hasher = hashlib.sha256()
+        self.segments.append({"file": name, "records": 0, "bytes": 0, "sha256": self._hasher.hexdigest()})
+
+    def append(self, records: List[Dict[str, Any]], sync: bool = True) -> Dict[str, Any]:
+        if self._f is None or self.current["records"] >= self.segment_records:
+            self._close_current()
+            self._open_next()
+        if records:
+            payload = b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in records)
+            frame = _encode_frame(payload, self.compression)
+            self._f.write(frame)
+            self._hasher.update(frame)
+            self.current["records"] += len(records)
+            self.current["bytes"] += len(frame)
+            self.current["sha256"] = self._hasher.hexdigest()
+        if sync:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        return dict(self.current, segment=len(self.segments) - 1)
+
+    def _close_current(self) -> None:
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+            self._f = None
+
+    def close(self) -> List[Dict[str, Any]]:
+        self._close_current()
+        return self.segments
+
+
+def combined_sha256(segments: List[Dict[str, Any]]) -> str:
+    h = hashlib.sha256()
+    for seg in segments:
+        h.update(f"{seg['sha256']}  {seg['file']}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _open_decompressed(path: str) -> BinaryIO:
+    compression = _compression_for(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        raw = open(path, "rb")
+        return io.BufferedReader(_zstd().ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True))
+    return open(path, "rb")
+
+
+def _iter_raw_lines(path: str) -> Iterator[bytes]:
+    with _open_decompressed(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def iter_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    for line in _iter_raw_lines(path):
+        yield json.loads(line)
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        eof = len(buf) < chunk_size
+        pos = 0
+
+        def skip_ws(p: int) -> int:
+            while p < len(buf) and buf[p] in " \t\r\n":
+                p += 1
+            return p
+
+        pos = skip_ws(pos)
+        if pos >= len(buf) or buf[pos] != "[":
+            return
+        pos += 1
+        while True:
+            pos = skip_ws(pos)
+            if pos < len(buf) and buf[pos] in ",]":
+                if buf[pos] == "]":
+                    return
+                pos = skip_ws(pos + 1)
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("need more data", buf, pos)
+                value, end = decoder.raw_decode(buf, pos)
+                if end >= len(buf) and not eof:
+                    raise json.JSONDecodeError("need more data", buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = len(more) < chunk_size
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield value
+            pos = end
+
+
+def read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        head = f.read(64).lstrip()
+    if not head.startswith(b"{"):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if "segments" not in manifest and "raw_file" not in manifest:
+        return None
+    return manifest
+
+
+def segment_paths(manifest_path: str, manifest: Dict[str, Any]) -> List[str]:
+    base = os.path.dirname(manifest_path)
+    return [os.path.join(base, seg["file"]) for seg in manifest.get("segments", [])]
+
+
+def iter_raw_records(path: str) -> Iterator[Any]:
+    if ".ndjson" in os.path.basename(path) or ".jsonl" in os.path.basename(path):
+        yield from iter_ndjson(path)
+        return
+    manifest = read_manifest(path)
+    if manifest is None:
+        yield from iter_json_array(path)
+    elif "segments" in manifest:
+        for seg_path in segment_paths(path, manifest):
+            yield from iter_ndjson(seg_path)
+    else:
+        yield from iter_json_array(manifest["raw_file"])
+
+
+def _iter_record_lines(path: str) -> Optional[Iterator[bytes]]:
+    if ".ndjson" in os.path.basename(path) or ".jsonl" in os.path.basename(path):
+        return _iter_raw_lines(path)
+    manifest = read_manifest(path)
+    if manifest is not None and "segments" in manifest:
+        return (line for seg_path in segment_paths(path, manifest) for line in _iter_raw_lines(seg_path))
+    return None
+
+
+def iter_selected_records(path: str, ordinals: Iterator[int]) -> Iterator[Tuple[int, Any]]:
+    # ordinals must be ascending. NDJSON lines that are not selected are skipped without
+    # being parsed; legacy JSON arrays have no line framing and are decoded in full.
+    lines = _iter_record_lines(path)
+    source = enumerate(lines) if lines is not None else enumerate(iter_raw_records(path))
+    wanted = next(ordinals, None)
+    for ordinal, item in source:
+        if wanted is None:
+            return
+        if ordinal == wanted:
+            yield (ordinal, json.loads(item) if lines is not None else item)
+            wanted = next(ordinals, None)
+
+
+def verify_segments(manifest_path: str, manifest: Dict[str, Any]) -> List[str]:
+    bad = []
+    for seg, seg_path in zip(manifest.get("segments", []), segment_paths(manifest_path, manifest)):
+        if not os.path.exists(seg_path) or sha256_file(seg_path) != seg["sha256"]:
+            bad.append(seg["file"])
+    return bad
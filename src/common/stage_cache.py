@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import metrics
+from .config import PATHS, STAGE_CACHE
+
+META_FILE = "meta.json"
+OBJECT_FILE = "object.pkl"
+FILES_DIR = "files"
+
+
+def source_fingerprint(paths: Iterable[str]) -> str:
+    # Stage code version: any edit to a module a stage runs invalidates that stage's entries.
+    h = hashlib.sha256()
+    for rel in sorted(paths):
+        h.update(rel.encode("utf-8") + b"\0")
+        with open(os.path.join(PATHS.project_root, rel), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def stage_key(stage: str, parent: str, code: str, config: Dict[str, Any]) -> str:
+    payload = json.dumps([STAGE_CACHE.version, stage, parent, code, config], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _tree_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, name)) for d, _, names in os.walk(path) for name in names)
+
+
+class StageCache:
+    # One directory per key holding meta.json plus a pickled object and/or output files. Entries
+    # are written to a temporary directory and renamed into place, so readers never see a partial
+    # one; meta.json's mtime is the last use, and the least recently used entries are removed
+    # once the cache grows past max_bytes.
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        self.root = root or STAGE_CACHE.cache_dir
+        self.max_bytes = STAGE_CACHE.max_bytes if max_bytes is None else max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self._entry_dir(key), META_FILE))
+
+    def _hit(self, stage: str, key: str) -> Optional[Dict[str, Any]]:
+        meta_path = os.path.join(self._entry_dir(key), META_FILE)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+        except FileNotFoundError:
+            metrics.count(f"stage_cache.{stage}.miss")
+            return None
+        metrics.count(f"stage_cache.{stage}.hit")
+        return meta
+
+    def load(self, stage: str, key: str) -> Any:
+        if self._hit(stage, key) is None:
+            return None
+        try:
+            with open(os.path.join(self._entry_dir(key), OBJECT_FILE), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            # Evicted by another process between the two reads.
+            return None
+
+    def restore(self, stage: str, key: str, out_dir: str) -> Optional[Dict[str, Any]]:
+        meta = self._hit(stage, key)
+        if meta is None:
+            return None
+        files_dir = os.path.join(self._entry_dir(key), FILES_DIR)
+        try:
+            for rel in meta["files"]:
+                dest = os.path.join(out_dir, rel)
+                os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+                shutil.copyfile(os.path.join(files_dir, rel), dest)
+        except FileNotFoundError:
+            return None
+        return meta["meta"]
+
+    def put(
+        self,
+        stage: str,
+        key: str,
+        obj: Any = None,
+        files: Optional[Dict[str, str]] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        final = self._entry_dir(key)
+        if os.path.exists(final):
+            return
+        tmp = os.path.join(self.root, "tmp", f"{key}.{os.getpid()}.{threading.get_ident()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            if obj is not None:
+                with open(os.path.join(tmp, OBJECT_FILE), "wb") as f:
+                    pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for rel, src in (files or {}).items():
+                dest = os.path.join(tmp, FILES_DIR, rel)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.copyfile(src, dest)
+            size = _tree_bytes(tmp)
+            if size > self.max_bytes:
+                return
+            entry = {
+                "stage": stage,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "bytes": size,
+                "files": sorted(files or {}),
+                "meta": meta or {},
+            }
+            with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            try:
+                os.rename(tmp, final)
+            except OSError:
+                # Another process stored the same key first.
+                return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> List[Dict[str, Any]]:
+        out = []
+        for prefix in os.listdir(self.root):
+            if len(prefix) != 2:
+                continue
+            for key in os.listdir(os.path.join(self.root, prefix)):
+                meta_path = os.path.join(self.root, prefix, key, META_FILE)
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        entry = json.load(f)
+                    entry["last_used"] = os.path.getmtime(meta_path)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                entry["key"] = key
+                out.append(entry)
+        return sorted(out, key=lambda e: e["last_used"])
+
+    def evict(self) -> List[str]:
+        entries = self.entries()
+        total = sum(e["bytes"] for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(entry["key"]), ignore_errors=True)
+            total -= entry["bytes"]
+            removed.append(entry["key"])
+        return removed
+
+    def clear(self) -> int:
+        entries = self.entries()
+        for entry in entries:
+            shutil.rmtree(self._entry_dir(entry["key"]), ignore_errors=True)
+        return len(entries)
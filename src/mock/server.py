@@ -0,0 +1,499 @@
+import bisect
+import json
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.common.config import OPENFDA
+from src.common.rawstore import iter_raw_records
+from src.normalize.rxnorm_client import _name_key
+from src.synth.generator import SynthConfig, generate_records
+from src.synth.vocabulary import Vocabulary
+
+OPENFDA_PATH = "/drug/event.json"
+RXNAV_PREFIX = "/REST"
+MAX_LIMIT = 1000
+ERROR_STATUSES = (500, 502, 503)
+_RELATED = re.compile(r"^/rxcui/([^/]+)/related\.json$")
+_TOKEN = re.compile(r'\s*("(?:[^"\\]|\\.)*"|[()\[\]]|[^\s()\[\]"]+)')
+_WORD = re.compile(r"\w+")
+
+Predicate = Callable[[Dict[str, Any]], bool]
+Response = Tuple[int, Dict[str, Any], Dict[str, str]]
+
+
+class QueryError(ValueError):
+    pass
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0
+    # Uniform extra latency on top of latency_ms.
+    jitter_ms: float = 0.0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    # Retry-After seconds sent with 429s (None = no header, as openFDA does).
+    retry_after: Optional[float] = 1.0
+    # Server-side budget per API over a sliding minute (0 = unlimited); excess requests get 429.
+    requests_per_minute: int = 0
+    skip_ceiling: int = OPENFDA.skip_ceiling
+    seed: int = 0
+
+
+# openFDA search syntax: field:term, field:"phrase", field:[lo TO hi], _exists_:field, AND/OR/NOT,
+# parentheses, and space (or '+') between clauses meaning OR. Matching is case-insensitive on
+# words, like openFDA's analyzed fields; a '.exact' suffix compares whole values instead.
+
+
+def _tokenize(search: str) -> List[str]:
+    tokens = []
+    pos = 0
+    search = search.strip()
+    while pos < len(search):
+        match = _TOKEN.match(search, pos)
+        if match is None:
+            raise QueryError(f"Cannot parse search near {search[pos:]!r}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, search: str) -> None:
+        self.tokens = _tokenize(search)
+        self.pos = 0
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise QueryError("Unexpected end of search")
+        self.pos += 1
+        return token
+
+    def _expect(self, token: str) -> None:
+        found = self._next()
+        if found != token:
+            raise QueryError(f"Expected {token!r}, found {found!r}")
+
+    def parse(self) -> Tuple[Any, ...]:
+        node = self._or()
+        if self._peek() is not None:
+            raise QueryError(f"Unexpected {self._peek()!r}")
+        return node
+
+    def _or(self) -> Tuple[Any, ...]:
+        nodes = [self._and()]
+        while self._peek() not in (None, ")"):
+            if self._peek() == "OR":
+                self.pos += 1
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and(self) -> Tuple[Any, ...]:
+        nodes = [self._atom()]
+        while self._peek() == "AND":
+            self.pos += 1
+            nodes.append(self._atom())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _atom(self) -> Tuple[Any, ...]:
+        token = self._next()
+        if token == "(":
+            node = self._or()
+            self._expect(")")
+            return node
+        if token == "NOT":
+            return ("not", self._atom())
+        field, sep, rest = token.partition(":")
+        if not sep or not field:
+            raise QueryError(f"Expected field:value, found {token!r}")
+        value = rest or self._next()
+        if value == "[":
+            lo = self._next()
+            self._expect("TO")
+            hi = self._next()
+            self._expect("]")
+            return ("range", field, lo, hi)
+        if value.startswith('"'):
+            value = value[1:-1].replace('\\"', '"')
+        if field == "_exists_":
+            return ("exists", value)
+        return ("term", field, value)
+
+
+def parse_search(search: str) -> Tuple[Any, ...]:
+    return _Parser(search).parse()
+
+
+def _values(node: Any, parts: List[str]) -> List[Any]:
+    for i, part in enumerate(parts):
+        if isinstance(node, list):
+            return [v for item in node for v in _values(item, parts[i:])]
+        if not isinstance(node, dict):
+            return []
+        node = node.get(part)
+        if node is None:
+            return []
+    return node if isinstance(node, list) else [node]
+
+
+def _words(value: Any) -> List[str]:
+    return _WORD.findall(str(value).lower())
+
+
+def _contains(haystack: List[str], needle: List[str]) -> bool:
+    n = len(needle)
+    return any(haystack[i : i + n] == needle for i in range(len(haystack) - n + 1))
+
+
+def _bound(value: str) -> Any:
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _in_range(value: Any, lo: Any, hi: Any) -> bool:
+    value = _bound(str(value))
+    try:
+        return (lo == "*" or lo <= value) and (hi == "*" or value <= hi)
+    except TypeError:
+        return False
+
+
+def _compile(node: Tuple[Any, ...]) -> Predicate:
+    kind = node[0]
+    if kind in ("and", "or"):
+        children = [_compile(child) for child in node[1]]
+        combine = all if kind == "and" else any
+        return lambda rec: combine(child(rec) for child in children)
+    if kind == "not":
+        child = _compile(node[1])
+        return lambda rec: not child(rec)
+    if kind == "exists":
+        parts = node[1].split(".")
+        return lambda rec: any(v not in ("", None) for v in _values(rec, parts))
+    if kind == "range":
+        parts = node[1].split(".")
+        lo, hi = _bound(node[2]), _bound(node[3])
+        return lambda rec: any(_in_range(v, lo, hi) for v in _values(rec, parts))
+    field, value = node[1], node[2]
+    if field.endswith(".exact"):
+        parts = field[: -len(".exact")].split(".")
+        return lambda rec: any(str(v) == value for v in _values(rec, parts))
+    parts = field.split(".")
+    needle = _words(value)
+    return lambda rec: any(_contains(_words(v), needle) for v in _values(rec, parts))
+
+
+def _date_bounds(node: Tuple[Any, ...]) -> Tuple[str, str]:
+    # A receivedate range that every match must satisfy narrows the scan to a slice of the
+    # date-sorted records.
+    if node[0] == "range" and node[1] == "receivedate":
+        return (node[2] if node[2] != "*" else "", node[3] if node[3] != "*" else "\uffff")
+    if node[0] == "and":
+        bounds = [_date_bounds(child) for child in node[1]]
+        return (max(lo for lo, _ in bounds), min(hi for _, hi in bounds))
+    return ("", "\uffff")
+
+
+class FaersData:
+    def __init__(self, records: Iterable[Any], cache_size: int = 256) -> None:
+        items = [rec for rec in records if isinstance(rec, dict)]
+        items.sort(key=lambda rec: str(rec.get("receivedate") or ""))
+        self.records = items
+        self.dates = [str(rec.get("receivedate") or "") for rec in items]
+        latest = self.dates[-1] if self.dates else ""
+        self.last_updated = f"{latest[:4]}-{latest[4:6]}-{latest[6:8]}" if len(latest) >= 8 else ""
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, search: str) -> List[int]:
+        # Paging re-sends the same search for every page, so matches are kept per search string.
+        with self._lock:
+            if search in self._cache:
+                self._cache.move_to_end(search)
+                return self._cache[search]
+        if search:
+            node = parse_search(search)
+            predicate = _compile(node)
+            lo, hi = _date_bounds(node)
+            start = bisect.bisect_left(self.dates, lo)
+            stop = bisect.bisect_right(self.dates, hi)
+            matches = [i for i in range(start, stop) if predicate(self.records[i])]
+        else:
+            matches = list(range(len(self.records)))
+        with self._lock:
+            self._cache[search] = matches
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return matches
+
+
+def load_faers(path: str) -> FaersData:
+    return FaersData(iter_raw_records(path))
+
+
+def synthetic_faers(config: SynthConfig) -> FaersData:
+    return FaersData(generate_records(config))
+
+
+class RxNavData:
+    # Recorded RxNav answers (from an RxNorm cache database) take precedence over the synthetic
+    # vocabulary, so a replayed production run sees the RxCUIs it saw against RxNav.
+    def __init__(
+        self,
+        vocabulary: Optional[Vocabulary] = None,
+        names: Optional[Dict[str, str]] = None,
+        ingredients: Optional[Dict[str, Tuple[str, str]]] = None,
+    ) -> None:
+        self.vocabulary = vocabulary or Vocabulary()
+        self.names = names or {}
+        self.ingredients = ingredients or {}
+
+    def rxcui(self, name: str) -> Optional[str]:
+        key = _name_key(name)
+        if key in self.names:
+            return self.names[key] or None
+        return self.vocabulary.rxcui(name)
+
+    def ingredient(self, rxcui: str) -> Optional[Tuple[str, str]]:
+        if rxcui in self.ingredients:
+            return self.ingredients[rxcui] if self.ingredients[rxcui][0] else None
+        concept = self.vocabulary.ingredient(rxcui)
+        return (concept.rxcui, concept.name) if concept else None
+
+
+def load_recorded_rxnorm(cache_db: str, vocabulary: Optional[Vocabulary] = None) -> RxNavData:
+    names: Dict[str, str] = {}
+    ingredients: Dict[str, Tuple[str, str]] = {}
+    conn = sqlite3.connect(f"file:{cache_db}?mode=ro", uri=True)
+    try:
+        for key, value in conn.execute("SELECT key, value FROM entries"):
+            entry = json.loads(value)
+            if key.startswith("_ing_"):
+                ingredients[key[len("_ing_") :]] = (entry.get("ingredient_rxcui", ""), entry.get("ingredient_name", ""))
+            elif "rxcui" in entry:
+                names[key] = entry["rxcui"]
+    finally:
+        conn.close()
+    return RxNavData(vocabulary, names, ingredients)
+
+
+def _error(status: int, code: str, message: str) -> Response:
+    return (status, {"error": {"code": code, "message": message}}, {})
+
+
+class MockServer:
+    # openFDA drug/event.json and the two RxNav endpoints RxNormClient calls, on one port, with
+    # injected latency, 429s, 5xx errors and the openFDA skip ceiling. GET /_stats reports what
+    # was served.
+    def __init__(
+        self,
+        faers: Optional[FaersData] = None,
+        rxnav: Optional[RxNavData] = None,
+        faults: Optional[FaultConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        verbose: bool = False,
+    ) -> None:
+        self.faers = faers or FaersData([])
+        self.rxnav = rxnav or RxNavData()
+        self.faults = faults or FaultConfig()
+        self.verbose = verbose
+        self._rng = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Deque[float]] = {"openfda": deque(), "rxnav": deque()}
+        self._statuses: Counter = Counter()
+        self._results = 0
+        self._started = time.time()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self  # type: ignore[attr-defined]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openfda_url(self) -> str:
+        return self.base_url + OPENFDA_PATH
+
+    @property
+    def rxnorm_url(self) -> str:
+        return self.base_url + RXNAV_PREFIX
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_api: Dict[str, Dict[str, int]] = {}
+            for (api, status), n in sorted(self._statuses.items()):
+                by_api.setdefault(api, {})[str(status)] = n
+            return {
+                "uptime_s": round(time.time() - self._started, 3),
+                "requests": {api: sum(codes.values()) for api, codes in by_api.items()},
+                "status_codes": by_api,
+                "results": self._results,
+                "records": len(self.faers.records),
+                "faults": asdict(self.faults),
+            }
+
+    def _over_budget(self, api: str) -> Optional[float]:
+        limit = self.faults.requests_per_minute
+        if limit <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows[api]
+            while window and window[0] <= now - 60.0:
+                window.popleft()
+            if len(window) >= limit:
+                return window[0] + 60.0 - now
+            window.append(now)
+        return None
+
+    def _inject(self, api: str) -> Optional[Response]:
+        wait = self._over_budget(api)
+        if wait is not None:
+            body = {"error": {"code": "OVER_RATE_LIMIT", "message": "Rate limit exceeded"}}
+            return (429, body, {"Retry-After": str(math.ceil(wait))})
+        faults = self.faults
+        with self._lock:
+            jitter = self._rng.uniform(0, faults.jitter_ms) if faults.jitter_ms else 0.0
+            roll = self._rng.random()
+            error_status = self._rng.choice(ERROR_STATUSES)
+        if faults.latency_ms or jitter:
+            time.sleep((faults.latency_ms + jitter) / 1000.0)
+        if roll < faults.rate_429:
+            headers = {} if faults.retry_after is None else {"Retry-After": f"{faults.retry_after:g}"}
+            return (429, {"error": {"code": "OVER_RATE_LIMIT", "message": "Injected rate limit"}}, headers)
+        if roll < faults.rate_429 + faults.rate_5xx:
+            return _error(error_status, "SERVER_ERROR", "Injected server error")
+        return None
+
+    def handle(self, path: str, query: Dict[str, str]) -> Response:
+        if path == "/_stats":
+            return (200, self.stats(), {})
+        if path == OPENFDA_PATH:
+            api = "openfda"
+        elif path.startswith(RXNAV_PREFIX + "/"):
+            api = "rxnav"
+        else:
+            return _error(404, "NOT_FOUND", f"No such endpoint: {path}")
+        response = self._inject(api)
+        if response is None:
+            response = self._openfda(query) if api == "openfda" else self._rxnav(path[len(RXNAV_PREFIX) :], query)
+        with self._lock:
+            self._statuses[(api, response[0])] += 1
+            if api == "openfda" and response[0] == 200:
+                self._results += len(response[1]["results"])
+        return response
+
+    def _openfda(self, query: Dict[str, str]) -> Response:
+        try:
+            limit = int(query.get("limit", "1"))
+            skip = int(query.get("skip", "0"))
+        except ValueError:
+            return _error(400, "BAD_REQUEST", "limit and skip must be integers")
+        if limit > MAX_LIMIT:
+            return _error(400, "BAD_REQUEST", f"Limit cannot exceed {MAX_LIMIT} results for search requests.")
+        if skip > self.faults.skip_ceiling:
+            return _error(400, "BAD_REQUEST", f"Skip value must {self.faults.skip_ceiling} or less.")
+        try:
+            matches = self.faers.search(query.get("search", ""))
+        except QueryError as exc:
+            return _error(400, "BAD_REQUEST", str(exc))
+        if not matches:
+            return _error(404, "NOT_FOUND", "No matches found!")
+        meta = {
+            "disclaimer": "Local stand-in for openFDA; records are synthetic or recorded.",
+            "last_updated": self.faers.last_updated,
+            "results": {"skip": skip, "limit": limit, "total": len(matches)},
+        }
+        results = [self.faers.records[i] for i in matches[skip : skip + limit]]
+        return (200, {"meta": meta, "results": results}, {})
+
+    def _rxnav(self, path: str, query: Dict[str, str]) -> Response:
+        if path == "/rxcui.json":
+            name = query.get("name", "")
+            rxcui = self.rxnav.rxcui(name) if name else None
+            id_group: Dict[str, Any] = {"name": name}
+            if rxcui:
+                id_group["rxnormId"] = [rxcui]
+            return (200, {"idGroup": id_group}, {})
+        match = _RELATED.match(path)
+        if match is None:
+            return _error(404, "NOT_FOUND", f"No such endpoint: {RXNAV_PREFIX}{path}")
+        rxcui = match.group(1)
+        ttys = query.get("tty", "").replace("+", " ").split()
+        groups = []
+        if "IN" in ttys:
+            group: Dict[str, Any] = {"tty": "IN"}
+            ingredient = self.rxnav.ingredient(rxcui)
+            if ingredient is not None:
+                ing_rxcui, ing_name = ingredient
+                concept = {"rxcui": ing_rxcui, "name": ing_name, "synonym": "", "tty": "IN", "language": "ENG"}
+                group["conceptProperties"] = [dict(concept, suppress="N", umlscui="")]
+            groups.append(group)
+        return (200, {"relatedGroup": {"rxcui": rxcui, "termType": ttys, "conceptGroup": groups}}, {})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive, so pooled clients see the connection reuse they get
+    # from the real APIs.
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        mock: MockServer = self.server.mock  # type: ignore[attr-defined]
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        status, body, headers = mock.handle(parts.path, query)
+        data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.mock.verbose:  # type: ignore[attr-defined]
+            super().log_message(format, *args)
@@ -0,0 +1,138 @@
+import json
+import re
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.common.config import PRODUCTS
+
+# canonical ingredient -> surface terms (ingredient and brand names) that identify it
+DEFAULT_PRODUCTS: Dict[str, List[str]] = {
+    "semaglutide": ["semaglutide", "ozempic", "wegovy", "rybelsus"],
+    "tirzepatide": ["tirzepatide", "mounjaro", "zepbound"],
+}
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+@dataclass(frozen=True)
+class ProductMatch:
+    canonical: str
+    term: str
+    confidence: float
+
+
+def load_product_dictionary(path: Optional[str] = None) -> Dict[str, List[str]]:
+    path = path or PRODUCTS.dictionary_file
+    if not path:
+        return DEFAULT_PRODUCTS
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return {str(canonical).lower(): [str(t).lower() for t in terms] for canonical, terms in raw.items()}
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class _AhoCorasick:
+    def __init__(self, terms: List[str]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        for idx, term in enumerate(terms):
+            node = 0
+            for ch in term:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append(idx)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self, text: str) -> List[int]:
+        found: List[int] = []
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                found.extend(self.out[node])
+        return found
+
+
+class ProductMatcher:
+    def __init__(
+        self,
+        products: Optional[Dict[str, List[str]]] = None,
+        min_confidence: Optional[float] = None,
+        min_token_length: int = 4,
+    ) -> None:
+        products = products if products is not None else load_product_dictionary()
+        self.min_confidence = PRODUCTS.min_confidence if min_confidence is None else min_confidence
+        self.min_token_length = min_token_length
+        self.terms: List[str] = []
+        self.canonical: List[str] = []
+        for canonical, terms in products.items():
+            for term in sorted(set(terms) | {canonical}):
+                self.terms.append(term)
+                self.canonical.append(canonical)
+        self._automaton = _AhoCorasick(self.terms)
+        self._grams = [_trigrams(term) for term in self.terms]
+        self._gram_index: Dict[str, List[int]] = defaultdict(list)
+        for idx, grams in enumerate(self._grams):
+            for gram in grams:
+                self._gram_index[gram].append(idx)
+        self._memo: Dict[str, Optional[ProductMatch]] = {}
+
+    def _exact(self, text: str) -> Optional[ProductMatch]:
+        hits = self._automaton.search(text)
+        if not hits:
+            return None
+        idx = min(hits, key=lambda i: (-len(self.terms[i]), i))
+        return ProductMatch(self.canonical[idx], self.terms[idx], 1.0)
+
+    def _approximate(self, text: str) -> Optional[ProductMatch]:
+        best: Optional[Tuple[float, int]] = None
+        for token in _TOKEN_RE.findall(text):
+            if len(token) < self.min_token_length:
+                continue
+            grams = _trigrams(token)
+            shared: Dict[int, int] = defaultdict(int)
+            for gram in grams:
+                for idx in self._gram_index.get(gram, ()):
+                    shared[idx] += 1
+            for idx, count in shared.items():
+                score = 2.0 * count / (len(grams) + len(self._grams[idx]))
+                if best is None or score > best[0]:
+                    best = (score, idx)
+        if best is None or best[0] < self.min_confidence:
+            return None
+        return ProductMatch(self.canonical[best[1]], self.terms[best[1]], round(best[0], 3))
+
+    def match(self, name: str) -> Optional[ProductMatch]:
+        if not name:
+            return None
+        text = name.lower()
+        if text in self._memo:
+            return self._memo[text]
+        result = self._exact(text) or self._approximate(text)
+        if len(self._memo) >= 100000:
+            self._memo.clear()
+        self._memo[text] = result
+        return result
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from src.common import metrics
+from src.common.config import RXNORM
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class RxNormCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_days: Optional[float] = None,
+        version: Optional[str] = None,
+        flush_every: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        legacy_json: Optional[str] = None,
+    ) -> None:
+        self.path = path or RXNORM.cache_db
+        self.ttl_seconds = (RXNORM.cache_ttl_days if ttl_days is None else ttl_days) * 86400.0
+        self.version = version or RXNORM.cache_version
+        self.flush_every = flush_every or RXNORM.cache_flush_every
+        self.flush_interval = RXNORM.cache_flush_interval if flush_interval is None else flush_interval
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._memo: Dict[str, Optional[Dict[str, str]]] = {}
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._last_flush = time.monotonic()
+        self._migrate_json(legacy_json or RXNORM.cache_file)
+
+    def _migrate_json(self, json_path: str) -> None:
+        if not os.path.exists(json_path):
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'migrated_json'").fetchone()
+            if row is not None:
+                return
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    legacy = json.load(f)
+            except Exception:
+                legacy = {}
+            # The JSON file has no per-entry fetch times, and its mtime may already be past the TTL;
+            # the entries start their TTL now instead of expiring on import.
+            fetched_at = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO entries (key, value, version, fetched_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (key, json.dumps(value, ensure_ascii=False), self.version, fetched_at)
+                        for key, value in legacy.items()
+                        if isinstance(value, dict)
+                    ],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated_json', ?)", (json_path,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        value = self._get(key)
+        metrics.count("rxnorm_cache.hit" if value is not None else "rxnorm_cache.miss")
+        return value
+
+    def _get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            if key in self._memo:
+                return self._memo[key]
+            row = self._conn.execute(
+                "SELECT value, version, fetched_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            value = None
+            if row is not None and row[1] == self.version and time.time() - row[2] <= self.ttl_seconds:
+                value = json.loads(row[0])
+            self._memo[key] = value
+            return value
+
+    def put(self, key: str, value: Dict[str, str]) -> None:
+        with self._lock:
+            self._pending[key] = value
+            self._memo.pop(key, None)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            if len(self._pending) >= self.flush_every or due:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        now = time.time()
+        rows = [
+            (key, json.dumps(value, ensure_ascii=False), self.version, now) for key, value in self._pending.items()
+        ]
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, version, fetched_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._memo.update(self._pending)
+        self._pending = {}
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush_locked()
+            self._conn.close()
+            self._conn = None
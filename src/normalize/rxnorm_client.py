@@ -1,101 +1,186 @@
-import json
-import os
-import time
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 import requests
 
 from src.common.config import RXNORM, ensure_directories
+from src.common.http import HttpTransport
+from src.normalize.rxnorm_cache import RxNormCache
+from src.normalize.rxnorm_index import RxNormIndex
+
+Ingredient = Tuple[Optional[str], Optional[str]]
+
+
+def _name_key(name: str) -> str:
+    return name.strip().lower()
+
+
+def _parse_rxcui(data: Dict[str, Any]) -> Optional[str]:
+    id_group = data.get("idGroup", {})
+    ids = id_group.get("rxnormId", [])
+    if isinstance(ids, list) and ids:
+        return ids[0]
+    return None
+
+
+def _parse_ingredient(data: Dict[str, Any]) -> Ingredient:
+    ing_rxcui = None
+    ing_name = None
+    related_group = data.get("relatedGroup", {})
+    concept_groups = related_group.get("conceptGroup", [])
+    for cg in concept_groups:
+        if cg.get("tty") == "IN":
+            props = cg.get("conceptProperties", [])
+            if props:
+                ing_rxcui = props[0].get("rxcui")
+                ing_name = props[0].get("name")
+            break
+    return (ing_rxcui, ing_name)
+
+
+def _ingredient_from_entry(entry: Dict[str, str]) -> Ingredient:
+    return (entry.get("ingredient_rxcui") or None, entry.get("ingredient_name") or None)
+
+
+class RxNormMapping:
+    # Pre-resolved lookup tables with the same interface as RxNormClient, so curation can
+    # normalize drug names without touching the network or the cache. failed counts lookups that
+    # errored and were left unresolved rather than cached.
+    def __init__(
+        self, rxcuis: Dict[str, Optional[str]], ingredients: Dict[str, Ingredient], failed: int = 0
+    ) -> None:
+        self.rxcuis = rxcuis
+        self.ingredients = ingredients
+        self.failed = failed
+
+    def get_rxcui(self, name: str) -> Optional[str]:
+        return self.rxcuis.get(_name_key(name))
+
+    def get_ingredient(self, rxcui: str) -> Ingredient:
+        if not rxcui:
+            return (None, None)
+        return self.ingredients.get(rxcui, (None, None))
 
 
 class RxNormClient:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        transport: Optional[HttpTransport] = None,
+        cache: Optional[RxNormCache] = None,
+        index: Optional[RxNormIndex] = None,
+    ) -> None:
         ensure_directories()
-        self.cache: Dict[str, Dict[str, str]] = {}
-        self._load_cache()
-
-    def _load_cache(self) -> None:
-        if os.path.exists(RXNORM.cache_file):
-            try:
-                with open(RXNORM.cache_file, "r", encoding="utf-8") as f:
-                    self.cache = json.load(f)
-            except Exception:
-                self.cache = {}
-
-    def _save_cache(self) -> None:
-        tmp = RXNORM.cache_file + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, RXNORM.cache_file)
-
-    def _throttle(self) -> None:
-        time.sleep(60.0 / max(1, RXNORM.requests_per_minute))
+        if index is None and RXNORM.offline_index:
+            index = RxNormIndex(RXNORM.offline_index)
+        self.index = index
+        self.cache = None if index is not None else cache or RxNormCache()
+        self.transport = transport or HttpTransport(RXNORM.requests_per_minute, timeout=20)
+
+    def close(self) -> None:
+        if self.cache is not None:
+            self.cache.close()
+        if self.index is not None:
+            self.index.close()
 
     def get_rxcui(self, name: str) -> Optional[str]:
-        key = name.strip().lower()
+        key = _name_key(name)
         if not key:
             return None
-        if key in self.cache and "rxcui" in self.cache[key]:
-            return self.cache[key].get("rxcui") or None
+        if self.index is not None:
+            return self.index.get_rxcui(name)
+        entry = self.cache.get(key)
+        if entry is not None and "rxcui" in entry:
+            return entry.get("rxcui") or None
 
         url = f"{RXNORM.base_url}/rxcui.json"
         params = {"name": name}
-        resp = requests.get(url, params=params, timeout=20)
+        resp = self.transport.get(url, params=params)
         if resp.status_code != 200:
-            self._throttle()
             return None
-        data = resp.json()
-        rxcui = None
-        id_group = data.get("idGroup", {})
-        ids = id_group.get("rxnormId", [])
-        if isinstance(ids, list) and ids:
-            rxcui = ids[0]
-        if key not in self.cache:
-            self.cache[key] = {}
-        self.cache[key]["rxcui"] = rxcui or ""
-        self._save_cache()
-        self._throttle()
+        rxcui = _parse_rxcui(resp.json())
+        self.cache.put(key, {"rxcui": rxcui or ""})
         return rxcui
 
-    def get_ingredient(self, rxcui: str) -> Tuple[Optional[str], Optional[str]]:
-
+    def get_ingredient(self, rxcui: str) -> Ingredient:
         if not rxcui:
             return (None, None)
+        if self.index is not None:
+            return self.index.get_ingredient(rxcui)
         cache_key = f"_ing_{rxcui}"
-        if cache_key in self.cache:
-            entry = self.cache[cache_key]
-            ing_rxcui = entry.get("ingredient_rxcui") or None
-            ing_name = entry.get("ingredient_name") or None
-            return (ing_rxcui, ing_name)
+        entry = self.cache.get(cache_key)
+        if entry is not None:
+            return _ingredient_from_entry(entry)
 
         url = f"{RXNORM.base_url}/rxcui/{rxcui}/related.json"
         params = {"tty": "IN"}
         try:
-            resp = requests.get(url, params=params, timeout=20)
-        except Exception:
-            self._throttle()
+            resp = self.transport.get(url, params=params)
+        except requests.RequestException:
             return (None, None)
         if resp.status_code != 200:
-            self._throttle()
             return (None, None)
 
-        data = resp.json()
-        ing_rxcui = None
-        ing_name = None
-        related_group = data.get("relatedGroup", {})
-        concept_groups = related_group.get("conceptGroup", [])
-        for cg in concept_groups:
-            if cg.get("tty") == "IN":
-                props = cg.get("conceptProperties", [])
-                if props:
-                    ing_rxcui = props[0].get("rxcui")
-                    ing_name = props[0].get("name")
-                break
-
-        self.cache[cache_key] = {
-            "ingredient_rxcui": ing_rxcui or "",
-            "ingredient_name": ing_name or "",
-        }
-        self._save_cache()
-        self._throttle()
+        ing_rxcui, ing_name = _parse_ingredient(resp.json())
+        self.cache.put(cache_key, {"ingredient_rxcui": ing_rxcui or "", "ingredient_name": ing_name or ""})
         return (ing_rxcui, ing_name)
+
+    def resolve_many(self, names: Iterable[str]) -> RxNormMapping:
+        spellings: Dict[str, str] = {}
+        for name in names:
+            key = _name_key(name)
+            if key and key not in spellings:
+                spellings[key] = name.strip()
+        if self.index is not None:
+            return self._resolve_offline(spellings)
+
+        rxcuis: Dict[str, Optional[str]] = {}
+        misses = []
+        for key in spellings:
+            entry = self.cache.get(key)
+            if entry is not None and "rxcui" in entry:
+                rxcuis[key] = entry.get("rxcui") or None
+            else:
+                misses.append(key)
+        responses = self.transport.get_many(
+            [(f"{RXNORM.base_url}/rxcui.json", {"name": spellings[key]}) for key in misses]
+        )
+        failed = 0
+        for key, resp in zip(misses, responses):
+            if isinstance(resp, BaseException) or resp.status_code != 200:
+                rxcuis[key] = None
+                failed += 1
+                continue
+            rxcuis[key] = _parse_rxcui(resp.json())
+            self.cache.put(key, {"rxcui": rxcuis[key] or ""})
+
+        ingredients: Dict[str, Ingredient] = {}
+        pending = []
+        for rxcui in sorted({r for r in rxcuis.values() if r}):
+            entry = self.cache.get(f"_ing_{rxcui}")
+            if entry is not None:
+                ingredients[rxcui] = _ingredient_from_entry(entry)
+            else:
+                pending.append(rxcui)
+        responses = self.transport.get_many(
+            [(f"{RXNORM.base_url}/rxcui/{rxcui}/related.json", {"tty": "IN"}) for rxcui in pending]
+        )
+        for rxcui, resp in zip(pending, responses):
+            if isinstance(resp, BaseException) or resp.status_code != 200:
+                ingredients[rxcui] = (None, None)
+                failed += 1
+                continue
+            ingredients[rxcui] = _parse_ingredient(resp.json())
+            ing_rxcui, ing_name = ingredients[rxcui]
+            self.cache.put(f"_ing_{rxcui}", {"ingredient_rxcui": ing_rxcui or "", "ingredient_name": ing_name or ""})
+        self.cache.flush()
+
+        print(
+            f"Resolved {len(spellings)} distinct product names "
+            f"({len(misses)} name and {len(pending)} ingredient lookups sent to RxNav, {failed} failed)"
+        )
+        return RxNormMapping(rxcuis, ingredients, failed)
+
+    def _resolve_offline(self, spellings: Dict[str, str]) -> RxNormMapping:
+        rxcuis = {key: self.index.get_rxcui(name) for key, name in spellings.items()}
+        ingredients = {rxcui: self.index.get_ingredient(rxcui) for rxcui in set(rxcuis.values()) if rxcui}
+        print(f"Resolved {len(spellings)} distinct product names from offline RxNorm index {self.index.release}")
+        return RxNormMapping(rxcuis, ingredients)
@@ -0,0 +1,203 @@
+import datetime
+import glob
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE names (name TEXT PRIMARY KEY, rxcui INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE ingredients (rxcui INTEGER PRIMARY KEY, ingredient_rxcui INTEGER NOT NULL);
+CREATE TABLE concepts (rxcui INTEGER PRIMARY KEY, name TEXT NOT NULL);
+"""
+
+# Preference when one normalized string maps to several concepts: ingredients first, then
+# brand names, then clinical/branded drugs.
+TTY_ORDER = [
+    "IN", "PIN", "MIN", "BN", "SCD", "SBD", "GPCK", "BPCK",
+    "SCDC", "SBDC", "SCDF", "SBDF", "SCDG", "SBDG", "SY", "TMSY", "PSN",
+]  # fmt: skip
+TTY_RANK = {tty: rank for rank, tty in enumerate(TTY_ORDER)}
+# Relationships walked from a product concept to its IN ingredient (e.g. SBD -> SCD -> SCDC -> IN).
+INGREDIENT_RELAS = {
+    "has_ingredient",
+    "ingredient_of",
+    "has_tradename",
+    "tradename_of",
+    "consists_of",
+    "constitutes",
+    "has_precise_ingredient",
+    "precise_ingredient_of",
+    "has_part",
+    "part_of",
+    "contains",
+    "contained_in",
+}
+MAX_INGREDIENT_HOPS = 3
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _iter_rrf(path: str) -> Iterator[List[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n").split("|")
+
+
+def _find_rrf(rrf_dir: str, name: str) -> str:
+    for candidate in (os.path.join(rrf_dir, name), os.path.join(rrf_dir, "rrf", name)):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"{name} not found under {rrf_dir}")
+
+
+def _release_from_path(rrf_dir: str) -> Optional[str]:
+    # RxNorm release folders are named like RxNorm_full_10072024 (MMDDYYYY).
+    match = re.search(r"(\d{2})(\d{2})(\d{4})", os.path.basename(os.path.abspath(rrf_dir)))
+    if not match:
+        return None
+    month, day, year = match.groups()
+    try:
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+
+def _nearest_ingredient(start: int, tty: Dict[int, str], edges: Dict[int, Set[int]]) -> Optional[int]:
+    if tty.get(start) == "IN":
+        return start
+    seen = {start}
+    frontier = deque([(start, 0)])
+    found: List[int] = []
+    found_depth = None
+    while frontier:
+        node, depth = frontier.popleft()
+        if found_depth is not None and depth >= found_depth:
+            break
+        if depth >= MAX_INGREDIENT_HOPS:
+            continue
+        for nxt in edges.get(node, ()):
+            if nxt in seen:
+                continue
+            seen.add(nxt)
+            if tty.get(nxt) == "IN":
+                found.append(nxt)
+                found_depth = depth + 1
+            else:
+                frontier.append((nxt, depth + 1))
+    return min(found) if found else None
+
+
+def build_index(rrf_dir: str, out_dir: str, release: Optional[str] = None) -> str:
+    release = release or _release_from_path(rrf_dir) or datetime.date.today().isoformat()
+    conso_path = _find_rrf(rrf_dir, "RXNCONSO.RRF")
+    rel_path = _find_rrf(rrf_dir, "RXNREL.RRF")
+
+    best: Dict[str, Tuple[int, int]] = {}
+    tty: Dict[int, str] = {}
+    ingredient_names: Dict[int, str] = {}
+    for row in _iter_rrf(conso_path):
+        if len(row) < 17 or row[11] != "RXNORM" or row[16] in ("O", "Y"):
+            continue
+        rxcui = int(row[0])
+        term_type = row[12]
+        rank = TTY_RANK.get(term_type, len(TTY_RANK))
+        if rank < TTY_RANK.get(tty.get(rxcui, ""), len(TTY_RANK) + 1):
+            tty[rxcui] = term_type
+        if term_type == "IN":
+            ingredient_names.setdefault(rxcui, row[14])
+        key = normalize_name(row[14])
+        if key and (key not in best or (rank, rxcui) < best[key]):
+            best[key] = (rank, rxcui)
+
+    edges: Dict[int, Set[int]] = defaultdict(set)
+    for row in _iter_rrf(rel_path):
+        if len(row) < 11 or row[10] != "RXNORM" or row[7] not in INGREDIENT_RELAS:
+            continue
+        if not row[0] or not row[4]:
+            continue
+        a, b = int(row[0]), int(row[4])
+        edges[a].add(b)
+        edges[b].add(a)
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"rxnorm_index_{release}.sqlite")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO names VALUES (?, ?)", ((k, v[1]) for k, v in sorted(best.items())))
+        conn.executemany(
+            "INSERT INTO ingredients VALUES (?, ?)",
+            (
+                (rxcui, ing)
+                for rxcui in sorted(tty)
+                for ing in [_nearest_ingredient(rxcui, tty, edges)]
+                if ing is not None
+            ),
+        )
+        conn.executemany("INSERT INTO concepts VALUES (?, ?)", sorted(ingredient_names.items()))
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("release", release),
+                ("source", os.path.abspath(rrf_dir)),
+                ("built_at", datetime.datetime.now(datetime.timezone.utc).isoformat()),
+                ("names", str(len(best))),
+            ],
+        )
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+    return path
+
+
+def latest_index(path: str) -> str:
+    if os.path.isfile(path):
+        return path
+    candidates = sorted(glob.glob(os.path.join(path, "rxnorm_index_*.sqlite")))
+    if not candidates:
+        raise FileNotFoundError(f"No RxNorm index found in {path}; build one with 'cli.py rxnorm-index'")
+    return candidates[-1]
+
+
+class RxNormIndex:
+    def __init__(self, path: str) -> None:
+        self.path = latest_index(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={os.path.getsize(self.path)}")
+        self.release = self._conn.execute("SELECT value FROM meta WHERE name = 'release'").fetchone()[0]
+
+    def get_rxcui(self, name: str) -> Optional[str]:
+        key = normalize_name(name)
+        if not key:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT rxcui FROM names WHERE name = ?", (key,)).fetchone()
+        return str(row[0]) if row else None
+
+    def get_ingredient(self, rxcui: str) -> Tuple[Optional[str], Optional[str]]:
+        if not rxcui or not str(rxcui).isdigit():
+            return (None, None)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT i.ingredient_rxcui, c.name FROM ingredients i "
+                "LEFT JOIN concepts c ON c.rxcui = i.ingredient_rxcui WHERE i.rxcui = ?",
+                (int(rxcui),),
+            ).fetchone()
+        if not row:
+            return (None, None)
+        return (str(row[0]), row[1])
+
+    def close(self) -> None:
+        self._conn.close()
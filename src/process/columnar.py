@@ -0,0 +1,161 @@
+import datetime
+import math
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.common.utils import sha256_file
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+DATE_PRECISIONS = {10: "day", 7: "month", 4: "year"}
+
+# Logical column types. "category" columns are dictionary-encoded; anything not listed is
+# left to pyarrow's inference.
+COLUMN_TYPES = {
+    "safetyreportid": "string",
+    "received_date": "date",
+    "event_date": "date",
+    "patient_age_years": "float",
+    "age_unit_raw": "category",
+    "patient_sex": "category",
+    "reporter_type": "category",
+    "reporter_type_raw": "category",
+    "country": "category",
+    "country_raw": "category",
+    "death": "bool",
+    "hospitalization": "bool",
+    "life_threatening": "bool",
+    "disability": "bool",
+    "congenital_anomaly": "bool",
+    "intervention": "bool",
+    "other": "bool",
+    "drug_role": "category",
+    "drug_name_original": "category",
+    "rxcui": "category",
+    "ingredient_rxcui": "category",
+    "ingredient_name": "category",
+    "brand_name": "category",
+    "reaction_term_text": "category",
+    "match_confidence": "float",
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise RuntimeError("columnar output requires the 'pyarrow' package") from exc
+    return pyarrow
+
+
+def check_columnar_format(fmt: str) -> Any:
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar format: {fmt}")
+    return _pyarrow()
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value))
+
+
+def _as_strings(series: pd.Series) -> List[Any]:
+    return [None if _is_missing(v) else str(v) for v in series]
+
+
+def _received_month(date: Any) -> str:
+    if isinstance(date, str) and len(date) >= 7:
+        return date[:7]
+    return "unknown"
+
+
+def _column(pa: Any, series: pd.Series) -> Any:
+    # Safety_surveillance carries the per-report drug and reaction columns as lists.
+    if series.map(lambda v: isinstance(v, list)).any():
+        return pa.array(
+            [None if not isinstance(v, list) else [None if _is_missing(x) else str(x) for x in v] for v in series],
+            pa.list_(pa.string()),
+        )
+    kind = COLUMN_TYPES.get(series.name)
+    if kind == "string":
+        return pa.array(_as_strings(series), pa.string())
+    if kind == "category":
+        return pa.array(_as_strings(series), pa.string()).dictionary_encode()
+    if kind == "float":
+        return pa.array(pd.to_numeric(series, errors="coerce"), pa.float64(), from_pandas=True)
+    if kind == "bool":
+        return pa.array([None if _is_missing(v) else bool(v) for v in series], pa.bool_())
+    return pa.array(series, from_pandas=True)
+
+
+def _date_columns(pa: Any, series: pd.Series) -> Tuple[Any, Any]:
+    # FAERS dates may be partial ("2024", "2024-03"); keep the first day of the period as a
+    # date32 and record the precision next to it so no information is lost.
+    days: List[Optional[datetime.date]] = []
+    precision: List[Optional[str]] = []
+    for value in _as_strings(series):
+        if value is None or len(value) not in DATE_PRECISIONS:
+            days.append(None)
+            precision.append(None)
+            continue
+        padded = value + "-01-01"[len(value) - 4 :]
+        days.append(datetime.date.fromisoformat(padded))
+        precision.append(DATE_PRECISIONS[len(value)])
+    return (pa.array(days, pa.date32()), pa.array(precision, pa.string()).dictionary_encode())
+
+
+def _to_table(pa: Any, df: pd.DataFrame) -> Any:
+    columns: Dict[str, Any] = {}
+    for name in df.columns:
+        if COLUMN_TYPES.get(name) == "date":
+            columns[name], columns[f"{name}_precision"] = _date_columns(pa, df[name])
+        else:
+            columns[name] = _column(pa, df[name])
+    return pa.table(columns)
+
+
+class ColumnarWriter:
+    def __init__(self, out_dir: str, fmt: str = "parquet") -> None:
+        self.pa = check_columnar_format(fmt)
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.root = os.path.join(out_dir, "columnar")
+        # Partitions from an earlier run would otherwise be picked up by dataset readers.
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.row_counts: Dict[str, int] = {}
+        self.checksums: Dict[str, str] = {}
+        self._part = 0
+
+    def _write_file(self, table: Any, path: str) -> None:
+        pa = self.pa
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.fmt == "parquet":
+            pa.parquet.write_table(table, path, compression="zstd", use_dictionary=True)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            with pa.ipc.new_file(path, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+    def write(self, tables: Dict[str, pd.DataFrame]) -> None:
+        reports = tables["Reports"]
+        month_by_id = dict(zip(reports["safetyreportid"], reports["received_date"].map(_received_month)))
+        for name, df in tables.items():
+            if df.empty:
+                continue
+            if "received_date" in df.columns:
+                months = df["received_date"].map(_received_month)
+            else:
+                months = df["safetyreportid"].map(month_by_id).fillna("unknown")
+            for month, part in df.groupby(months.to_numpy(), sort=True):
+                rel = os.path.join(
+                    "columnar", name, f"received_month={month}", f"part-{self._part:05d}{COLUMNAR_FORMATS[self.fmt]}"
+                )
+                path = os.path.join(self.out_dir, rel)
+                self._write_file(_to_table(self.pa, part.reset_index(drop=True)), path)
+                self.row_counts[rel] = len(part)
+                self.checksums[rel] = sha256_file(path)
+        self._part += 1
@@ -1,14 +1,36 @@
+import hashlib
+import heapq
 import json
 import os
-from collections import defaultdict
-from typing import Any, Dict, List, Optional, Tuple
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from importlib import metadata
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
 
 import pandas as pd
 from tqdm import tqdm
 
-from src.common.config import PATHS, ensure_directories
+from src.analyze.cube import build_cube, combine_cubes, cube_path, write_cube
+from src.common import metrics
+from src.common.config import PATHS, RXNORM, STAGE_CACHE, ensure_directories
+from src.common.rawstore import iter_raw_records, iter_selected_records, read_manifest, segment_paths
+from src.common.stage_cache import StageCache, source_fingerprint, stage_key
 from src.common.utils import parse_faers_date, sha256_file
-from src.normalize.rxnorm_client import RxNormClient
+from src.normalize.matcher import ProductMatcher, load_product_dictionary
+from src.normalize.rxnorm_client import RxNormClient, RxNormMapping
+from src.normalize.rxnorm_index import RxNormIndex, latest_index
+from src.process.columnar import ColumnarWriter, check_columnar_format
+from src.process.dedup import ExternalDeduper, external_sort
+from src.process.fields import REPORT_COLUMNS
+from src.process.surveillance import SurveillanceBuilder, check_list_encoding
+from src.query.store import STORE_FILENAME, StoreWriter, store_path
+from src.process.vectorized import report_frame
 
 
 def _safe_get(d: Dict[str, Any], path: List[str]) -> Any:
@@ -21,250 +43,167 @@ def _safe_get(d: Dict[str, Any], path: List[str]) -> Any:
     return cur
 
 
-def _standardize_gender(sex: Optional[str]) -> str:
-    if not sex:
-        return "U"
-    s = str(sex).strip().upper()
-    if s in ("F", "FEMALE"):
-        return "F"
-    if s in ("M", "MALE"):
-        return "M"
-    return "U"
-
-
-def _standardize_reporter(rep: Optional[str]) -> Tuple[str, str]:
-    if not rep:
-        return ("OTHER", "")
-    raw = str(rep)
-    s = raw.strip().upper()
-    if "PHYSICIAN" in s:
-        return ("PHYSICIAN", raw)
-    if "PHARMACIST" in s:
-        return ("PHARMACIST", raw)
-    if "CONSUMER" in s or "LAWYER" in s:
-        return ("CONSUMER", raw)
-    return ("OTHER", raw)
-
-
-def _standardize_country(country: Optional[str]) -> Tuple[str, str]:
-    if not country:
-        return ("", "")
-    raw = str(country)
-    return (raw.strip().upper(), raw)
-
-
-def _age_to_years(age_val: Optional[str], age_unit: Optional[str]) -> Tuple[Optional[float], str]:
-    if age_val is None:
-        return (None, age_unit or "")
-    try:
-        val = float(age_val)
-    except Exception:
-        return (None, age_unit or "")
-    unit = (age_unit or "").strip().upper()
-    if unit in ("YR", "YEAR", "YEARS"):
-        return (val, unit)
-    if unit in ("MON", "MONTH", "MONTHS"):
-        return (val / 12.0, unit)
-    if unit in ("WK", "WEEK", "WEEKS"):
-        return (val / 52.0, unit)
-    if unit in ("DY", "DAY", "DAYS"):
-        return (val / 365.0, unit)
-    if unit in ("HR", "HOUR", "HOURS"):
-        return (val / (365.0 * 24.0), unit)
-    return (val, unit)
-
-
-def curate_tables(raw_json_path: str, out_dir: str) -> Dict[str, str]:
-    ensure_directories()
-    os.makedirs(out_dir, exist_ok=True)
-    rx = RxNormClient()
-
-    reports_rows: List[Dict[str, Any]] = []
-    drugs_rows: List[Dict[str, Any]] = []
-    reactions_rows: List[Dict[str, Any]] = []
-
-    best_record: Dict[str, Dict[str, Any]] = {}
-    completeness: Dict[str, int] = {}
-
-    print("Loading raw JSON file...")
-    with open(raw_json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    print(f"Loaded {len(data)} records")
-
-    if not isinstance(data, list):
-        data = []
-
-    def validate_record(rec: Any) -> Tuple[bool, str]:
-        if not isinstance(rec, dict):
-            return (False, "not_a_object")
-        rep_id = rec.get("safetyreportid")
-        if rep_id is None or str(rep_id).strip() == "":
-            return (False, "missing_safetyreportid")
-        patient = rec.get("patient")
-        if not isinstance(patient, dict):
-            return (False, "invalid_patient")
-        drugs_list = patient.get("drug")
-        reactions_list = patient.get("reaction")
-        if (not isinstance(drugs_list, list) or len(drugs_list) == 0) and (
-            not isinstance(reactions_list, list) or len(reactions_list) == 0
-        ):
-            return (False, "no_drug_no_reaction")
-        return (True, "")
-
-    rejected_reasons: Dict[str, int] = defaultdict(int)
-    valid_records: List[Dict[str, Any]] = []
-    print("Validating records...")
-    for rec in tqdm(data, desc="Validating"):
-        ok, reason = validate_record(rec)
-        if ok:
-            valid_records.append(rec)
-        else:
-            rejected_reasons[reason] += 1
+DRUG_COLUMNS = [
+    "safetyreportid",
+    "drug_role",
+    "drug_name_original",
+    "rxcui",
+    "ingredient_rxcui",
+    "ingredient_name",
+    "brand_name",
+    "match_confidence",
+]
+REACTION_COLUMNS = ["safetyreportid", "reaction_term_text"]
+COMPLETENESS_FIELDS = ["received_date", "patient_sex", "patient_age_years", "country"]
+TABLE_FILES = ["Reports.csv", "Drugs.csv", "Reactions.csv", "Safety_surveillance.csv"]
+QA_FILE = "QA_SUMMARY.md"
+# Modules each cached stage runs. Keys chain validate -> dedup -> normalize -> outputs, so an
+# edit invalidates its own stage and every stage after it.
+STAGE_SOURCES = {
+    "validate": ["src/process/curate.py", "src/common/rawstore.py"],
+    "dedup": ["src/process/curate.py", "src/common/utils.py"],
+    "normalize": [
+        "src/process/curate.py",
+        "src/process/fields.py",
+        "src/process/vectorized.py",
+        "src/process/surveillance.py",
+        "src/normalize/matcher.py",
+        "src/normalize/rxnorm_client.py",
+        "src/normalize/rxnorm_index.py",
+        "src/common/utils.py",
+    ],
+    "write": ["src/process/curate.py"],
+    "cube": ["src/analyze/cube.py"],
+    "columnar": ["src/process/columnar.py"],
+    "query_store": ["src/query/store.py"],
+}
+
+
+@dataclass
+class _Tables:
+    reports: pd.DataFrame
+    drugs: pd.DataFrame
+    reactions: pd.DataFrame
+    surveillance: pd.DataFrame
+    surveillance_lists: Optional[pd.DataFrame]
+    total_input: int
+    total_valid: int
+    rejected_reasons: Dict[str, int]
+    # RxNav lookups that failed; their drugs are unresolved, so these tables are not cached.
+    rxnorm_failed: int = 0
+
+
+def _validate_record(rec: Any) -> Tuple[bool, str]:
+    if not isinstance(rec, dict):
+        return (False, "not_a_object")
+    rep_id = rec.get("safetyreportid")
+    if rep_id is None or str(rep_id).strip() == "":
+        return (False, "missing_safetyreportid")
+    patient = rec.get("patient")
+    if not isinstance(patient, dict):
+        return (False, "invalid_patient")
+    drugs_list = patient.get("drug")
+    reactions_list = patient.get("reaction")
+    if (not isinstance(drugs_list, list) or len(drugs_list) == 0) and (
+        not isinstance(reactions_list, list) or len(reactions_list) == 0
+    ):
+        return (False, "no_drug_no_reaction")
+    return (True, "")
+
+
+def _completeness_score(rec: Dict[str, Any]) -> int:
+    return sum(1 for k, v in rec.items() if v not in (None, "", [], {}))
+
+
+def _target_product_names(rec: Any, matcher: ProductMatcher) -> List[str]:
+    if not isinstance(rec, dict) or not isinstance(rec.get("patient"), dict):
+        return []
+    names = []
+    for d in rec["patient"].get("drug") or []:
+        if isinstance(d, dict):
+            original = d.get("medicinalproduct") or ""
+            match = matcher.match(original) if original else None
+            if match is not None:
+                # Only the dictionary term is looked up, so every spelling of a product costs one lookup.
+                names.append(match.term)
+    return names
 
-    total_input = len(data)
-    total_valid = len(valid_records)
-    total_rejected = total_input - total_valid
 
-    print("Deduplicating records...")
-    for rec in valid_records:
-        rep_id = rec.get("safetyreportid")
-        if not rep_id:
+def _resolve_products(names: Set[str], rxnorm_index: Optional[str] = None) -> RxNormMapping:
+    rx = RxNormClient(index=RxNormIndex(rxnorm_index) if rxnorm_index else None)
+    try:
+        with metrics.stage("rxnorm") as stage:
+            stage.records = len(names)
+            return rx.resolve_many(sorted(names))
+    finally:
+        rx.close()
+
+
+def _drug_rows(
+    rep_id: Any, rec: Dict[str, Any], rx: RxNormMapping, matcher: ProductMatcher
+) -> List[Dict[str, Any]]:
+    rows = []
+    for d in (rec.get("patient", {}).get("drug") or []):
+        if not isinstance(d, dict):
             continue
-        non_missing = sum(1 for k, v in rec.items() if v not in (None, "", [], {}))
-        prev = completeness.get(rep_id, -1)
-        if non_missing > prev:
-            best_record[rep_id] = rec
-            completeness[rep_id] = non_missing
-        elif non_missing == prev:
-            prev_date = parse_faers_date(best_record[rep_id].get("receivedate"))
-            cur_date = parse_faers_date(rec.get("receivedate"))
-            if (cur_date or "") > (prev_date or ""):
-                best_record[rep_id] = rec
-                completeness[rep_id] = non_missing
-    print(f"Deduplicated to {len(best_record)} unique reports")
-
-    print(f"Processing {len(best_record)} reports (with RxNorm lookups)...")
-    for rep_id, rec in tqdm(best_record.items(), desc="Processing"):
-        received_date = parse_faers_date(rec.get("receivedate"))
-        event_date = parse_faers_date(rec.get("receiptdate"))
-
-        patient = rec.get("patient", {})
-        sex = _standardize_gender(patient.get("sex") if isinstance(patient.get("sex"), str) else str(patient.get("sex")))
-        age_val = None
-        age_unit = None
-        if isinstance(patient.get("patientonsetage"), (str, int, float)):
-            age_val = str(patient.get("patientonsetage"))
-        if isinstance(patient.get("patientonsetageunit"), (str, int, float)):
-            age_unit = str(patient.get("patientonsetageunit"))
-        age_years, age_unit_raw = _age_to_years(age_val, age_unit)
-
-        occupation = patient.get("patientreporter") or rec.get("fulfillexpeditecriteria")
-        reporter_type, reporter_type_raw = _standardize_reporter(str(occupation) if occupation is not None else None)
-        country, country_raw = _standardize_country(rec.get("occurcountry"))
-
-        death = bool(rec.get("seriousnessdeath"))
-        hospitalization = bool(rec.get("seriousnesshospitalization"))
-        life_threatening = bool(rec.get("seriousnesslifethreatening"))
-        disability = bool(rec.get("seriousnessdisabling"))
-        congenital_anomaly = bool(rec.get("seriousnesscongenitalanomali"))
-        intervention = bool(rec.get("seriousnessother"))
-        other = bool(rec.get("seriousnessother"))
-
-        reports_rows.append(
+        original = d.get("medicinalproduct") or ""
+        role = (d.get("drugcharacterization") or "").strip().upper()
+        if role in ("1", "PRIMARY"):
+            role_std = "PRIMARY"
+        elif role in ("2", "SECONDARY"):
+            role_std = "SECONDARY"
+        else:
+            role_std = "ASSOCIATED"
+
+        match = matcher.match(original) if original else None
+        rxcui, ing_rxcui, ing_name = None, None, None
+        if match is not None:
+            rxcui = rx.get_rxcui(match.term)
+            ing_rxcui, ing_name = rx.get_ingredient(rxcui) if rxcui else (None, None)
+        rows.append(
             {
                 "safetyreportid": rep_id,
-                "received_date": received_date,
-                "event_date": event_date,
-                "patient_age_years": age_years,
-                "age_unit_raw": age_unit_raw,
-                "patient_sex": sex,
-                "reporter_type": reporter_type,
-                "reporter_type_raw": reporter_type_raw,
-                "country": country,
-                "country_raw": country_raw,
-                "death": death,
-                "hospitalization": hospitalization,
-                "life_threatening": life_threatening,
-                "disability": disability,
-                "congenital_anomaly": congenital_anomaly,
-                "intervention": intervention,
-                "other": other,
+                "drug_role": role_std,
+                "drug_name_original": original,
+                "rxcui": rxcui,
+                "ingredient_rxcui": ing_rxcui,
+                "ingredient_name": ing_name,
+                "brand_name": None,
+                "match_confidence": match.confidence if match is not None else None,
             }
         )
+    return rows
 
-        for d in (patient.get("drug") or []):
-            if not isinstance(d, dict):
-                continue
-            original = d.get("medicinalproduct") or ""
-            role = (d.get("drugcharacterization") or "").strip().upper()
-            if role in ("1", "PRIMARY"):
-                role_std = "PRIMARY"
-            elif role in ("2", "SECONDARY"):
-                role_std = "SECONDARY"
-            else:
-                role_std = "ASSOCIATED"
-
-
-            target_drugs = ["semaglutide", "tirzepatide", "ozempic", "mounjaro", "wegovy", "rybelsus", "zepbound"]
-            if original and any(t in original.lower() for t in target_drugs):
-                rxcui = rx.get_rxcui(original)
-                ing_rxcui, ing_name = rx.get_ingredient(rxcui) if rxcui else (None, None)
-            else:
-                rxcui, ing_rxcui, ing_name = None, None, None
-            drugs_rows.append(
-                {
-                    "safetyreportid": rep_id,
-                    "drug_role": role_std,
-                    "drug_name_original": original,
-                    "rxcui": rxcui,
-                    "ingredient_rxcui": ing_rxcui,
-                    "ingredient_name": ing_name,
-                    "brand_name": None,
-                }
-            )
 
-        for r in (patient.get("reaction") or []):
-            if not isinstance(r, dict):
-                continue
-            term = r.get("reactionmeddrapt")
-            if isinstance(term, str):
-                reactions_rows.append({"safetyreportid": rep_id, "reaction_term_text": " ".join(term.split())})
-
-    df_reports = pd.DataFrame(reports_rows)
-    df_drugs = pd.DataFrame(drugs_rows)
-    df_reactions = pd.DataFrame(reactions_rows)
-
-    reports_csv = os.path.join(out_dir, "Reports.csv")
-    drugs_csv = os.path.join(out_dir, "Drugs.csv")
-    reactions_csv = os.path.join(out_dir, "Reactions.csv")
-    df_reports.to_csv(reports_csv, index=False)
-    df_drugs.to_csv(drugs_csv, index=False)
-    df_reactions.to_csv(reactions_csv, index=False)
-
-    agg = (
-        df_reports.merge(df_drugs.groupby("safetyreportid").agg(list).reset_index(), on="safetyreportid", how="left")
-        .merge(df_reactions.groupby("safetyreportid").agg(list).reset_index(), on="safetyreportid", how="left")
-    )
-    agg_csv = os.path.join(out_dir, "Safety_surveillance.csv")
-    agg.to_csv(agg_csv, index=False)
+def _reaction_rows(rep_id: Any, rec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = []
+    for r in (rec.get("patient", {}).get("reaction") or []):
+        if not isinstance(r, dict):
+            continue
+        term = r.get("reactionmeddrapt")
+        if isinstance(term, str):
+            rows.append({"safetyreportid": rep_id, "reaction_term_text": " ".join(term.split())})
+    return rows
 
-    def pct_non_null(series: pd.Series) -> float:
-        if len(series) == 0:
-            return 0.0
-        return float(series.notna().mean() * 100.0)
 
-    completeness_rows = [
-        ("received_date", pct_non_null(df_reports.get("received_date"))),
-        ("patient_sex", pct_non_null(df_reports.get("patient_sex"))),
-        ("patient_age_years", pct_non_null(df_reports.get("patient_age_years"))),
-        ("country", pct_non_null(df_reports.get("country"))),
-    ]
+def _surveillance_builder(list_encoding: str, columnar: Optional[str]) -> SurveillanceBuilder:
+    # Columnar output keeps real list<string> columns, so the raw lists are only retained then.
+    return SurveillanceBuilder(DRUG_COLUMNS[1:], REACTION_COLUMNS[1:], list_encoding, keep_lists=bool(columnar))
+
 
+def _write_qa_summary(
+    out_dir: str,
+    raw_json_path: str,
+    total_input: int,
+    total_valid: int,
+    rejected_reasons: Dict[str, int],
+    completeness_rows: List[Tuple[str, float]],
+) -> str:
     qa_lines = []
     qa_lines.append(f"Raw file: {raw_json_path}")
     qa_lines.append(f"Total input records: {total_input}")
     qa_lines.append(f"Valid records (pre-dedup): {total_valid}")
-    qa_lines.append(f"Rejected records: {total_rejected}")
+    qa_lines.append(f"Rejected records: {total_input - total_valid}")
     qa_lines.append("Rejection reasons:")
     if rejected_reasons:
         for reason, count in sorted(rejected_reasons.items()):
@@ -279,33 +218,784 @@ def curate_tables(raw_json_path: str, out_dir: str) -> Dict[str, str]:
     qa_path = os.path.join(out_dir, "QA_SUMMARY.md")
     with open(qa_path, "w", encoding="utf-8") as qf:
         qf.write("\n".join(qa_lines) + "\n")
+    return qa_path
 
 
+def _write_manifest(out_dir: str, row_counts: Dict[str, int], checksums: Dict[str, str]) -> str:
     manifest_lines = []
     manifest_lines.append("MANIFEST")
     manifest_lines.append("========")
     manifest_lines.append("")
     manifest_lines.append("Row counts:")
-    manifest_lines.append(f"- Reports.csv: {len(df_reports)} rows")
-    manifest_lines.append(f"- Drugs.csv: {len(df_drugs)} rows")
-    manifest_lines.append(f"- Reactions.csv: {len(df_reactions)} rows")
-    manifest_lines.append(f"- Safety_surveillance.csv: {len(agg)} rows")
+    for name, count in row_counts.items():
+        manifest_lines.append(f"- {name}: {count} rows")
     manifest_lines.append("")
     manifest_lines.append("SHA-256 checksums:")
-    manifest_lines.append(f"- Reports.csv: {sha256_file(reports_csv)}")
-    manifest_lines.append(f"- Drugs.csv: {sha256_file(drugs_csv)}")
-    manifest_lines.append(f"- Reactions.csv: {sha256_file(reactions_csv)}")
-    manifest_lines.append(f"- Safety_surveillance.csv: {sha256_file(agg_csv)}")
+    for name, checksum in checksums.items():
+        manifest_lines.append(f"- {name}: {checksum}")
 
     manifest_path = os.path.join(out_dir, "MANIFEST.txt")
     with open(manifest_path, "w", encoding="utf-8") as mf:
         mf.write("\n".join(manifest_lines) + "\n")
-
-    return {
-        "reports": reports_csv,
-        "drugs": drugs_csv,
-        "reactions": reactions_csv,
-        "aggregated": agg_csv,
+    return manifest_path
+
+
+def _add_columnar_entries(row_counts: Dict[str, int], checksums: Dict[str, str], writer: ColumnarWriter) -> None:
+    for rel in sorted(writer.row_counts):
+        row_counts[rel] = writer.row_counts[rel]
+        checksums[rel] = writer.checksums[rel]
+
+
+class _ChunkedCsvWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rows = 0
+        self._hasher = hashlib.sha256()
+        self._f = open(path, "w", encoding="utf-8", newline="")
+        self._header = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty and not self._header:
+            return
+        text = df.to_csv(index=False, header=self._header)
+        self._header = False
+        data = text.encode("utf-8")
+        self._f.write(text)
+        self._hasher.update(data)
+        self.rows += len(df)
+
+    def close(self) -> str:
+        self._f.close()
+        return self._hasher.hexdigest()
+
+
+def _first_seen_order(
+    raw_json_path: str, winners: Iterator[Tuple[int, int]], buffer_size: int, tmp_dir: str
+) -> Iterator[Dict[str, Any]]:
+    # Winning records are read in raw-file order and re-sorted by the position of each report's
+    # first valid record, which is the order the in-memory modes write reports in.
+    pending: Deque[Tuple[int, int]] = deque()
+
+    def ordinals() -> Iterator[int]:
+        for ordinal, first in winners:
+            pending.append((ordinal, first))
+            yield ordinal
+
+    def keyed() -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for ordinal, rec in iter_selected_records(raw_json_path, ordinals()):
+            while pending[0][0] != ordinal:
+                pending.popleft()
+            yield (pending.popleft()[1], rec)
+
+    return external_sort(keyed(), buffer_size, tmp_dir)
+
+
+def _curate_streaming(
+    raw_json_path: str,
+    out_dir: str,
+    chunk_size: int,
+    dedup_memory: int,
+    matcher: ProductMatcher,
+    columnar: Optional[str] = None,
+    rxnorm_index: Optional[str] = None,
+    list_encoding: str = "json",
+    query_store: bool = True,
+    cube: bool = True,
+    cache: Optional[StageCache] = None,
+    keys: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    rejected_reasons: Dict[str, int] = defaultdict(int)
+    columnar_writer = ColumnarWriter(out_dir, columnar) if columnar else None
+    store_writer = StoreWriter(out_dir) if query_store else None
+    deduper = ExternalDeduper(memory_budget=dedup_memory, tmp_dir=out_dir)
+    product_names: Set[str] = set()
+    total_input = 0
+    total_valid = 0
+
+    print("Indexing records (validate + dedup)...")
+    with metrics.stage("validate_dedup") as stage:
+        for ordinal, rec in enumerate(tqdm(iter_raw_records(raw_json_path), desc="Indexing")):
+            total_input += 1
+            ok, reason = _validate_record(rec)
+            if not ok:
+                rejected_reasons[reason] += 1
+                continue
+            total_valid += 1
+            rep_id = rec.get("safetyreportid")
+            if not rep_id:
+                continue
+            deduper.add(rep_id, _completeness_score(rec), parse_faers_date(rec.get("receivedate")) or "", ordinal)
+            product_names.update(_target_product_names(rec, matcher))
+        n_unique, winners = deduper.winners()
+        stage.records = total_input
+    if deduper.spilled_runs:
+        print(f"Dedup index spilled {deduper.spilled_runs} sorted runs to disk")
+    print(f"Deduplicated to {n_unique} unique reports")
+    rx = _resolve_products(product_names, rxnorm_index)
+    del product_names
+
+    writers = {
+        "Reports.csv": _ChunkedCsvWriter(os.path.join(out_dir, "Reports.csv")),
+        "Drugs.csv": _ChunkedCsvWriter(os.path.join(out_dir, "Drugs.csv")),
+        "Reactions.csv": _ChunkedCsvWriter(os.path.join(out_dir, "Reactions.csv")),
+        "Safety_surveillance.csv": _ChunkedCsvWriter(os.path.join(out_dir, "Safety_surveillance.csv")),
+    }
+    non_null = {name: 0 for name in COMPLETENESS_FIELDS}
+    report_items: List[Tuple[Any, Dict[str, Any]]] = []
+    drugs_rows: List[Dict[str, Any]] = []
+    reactions_rows: List[Dict[str, Any]] = []
+    surveillance = _surveillance_builder(list_encoding, columnar)
+    cubes: List[pd.DataFrame] = []
+
+    def flush() -> None:
+        df_reports = report_frame(report_items)
+        df_drugs = pd.DataFrame(drugs_rows, columns=DRUG_COLUMNS)
+        df_reactions = pd.DataFrame(reactions_rows, columns=REACTION_COLUMNS)
+        for name in COMPLETENESS_FIELDS:
+            non_null[name] += int(df_reports[name].notna().sum())
+        writers["Reports.csv"].write(df_reports)
+        writers["Drugs.csv"].write(df_drugs)
+        writers["Reactions.csv"].write(df_reactions)
+        df_agg, df_agg_lists = surveillance.frames(df_reports)
+        writers["Safety_surveillance.csv"].write(df_agg)
+        if columnar_writer is not None:
+            columnar_writer.write(
+                {
+                    "Reports": df_reports,
+                    "Drugs": df_drugs,
+                    "Reactions": df_reactions,
+                    "Safety_surveillance": df_agg_lists,
+                }
+            )
+        if store_writer is not None:
+            store_writer.write({"Reports": df_reports, "Drugs": df_drugs, "Reactions": df_reactions})
+        if cube:
+            # Chunks hold disjoint reports, so their cubes are summed as they arrive.
+            cubes[:] = [combine_cubes(cubes + [build_cube(df_reports, df_drugs, df_reactions)])]
+        report_items.clear()
+        drugs_rows.clear()
+        reactions_rows.clear()
+
+    # Chunks are normalized and written in one pass, so this stage covers both; the CSV
+    # checksums are hashed as the chunks are written.
+    print(f"Processing {n_unique} reports in chunks of {chunk_size}...")
+    pbar = tqdm(total=n_unique, desc="Processing")
+    with metrics.stage("normalize_write") as stage:
+        for rec in _first_seen_order(raw_json_path, winners, chunk_size, out_dir):
+            rep_id = rec.get("safetyreportid")
+            report_items.append((rep_id, rec))
+            drugs = _drug_rows(rep_id, rec, rx, matcher)
+            reactions = _reaction_rows(rep_id, rec)
+            surveillance.add(drugs, reactions)
+            drugs_rows.extend(drugs)
+            reactions_rows.extend(reactions)
+            pbar.update(1)
+            if len(report_items) >= chunk_size:
+                flush()
+        flush()
+        stage.records = n_unique
+    pbar.close()
+    deduper.close()
+
+    checksums = {name: w.close() for name, w in writers.items()}
+    row_counts = {name: w.rows for name, w in writers.items()}
+    if cube:
+        with metrics.stage("cube"):
+            df_cube = combine_cubes(cubes)
+            cube_csv = write_cube(df_cube, cube_path(out_dir))
+        row_counts["cube.csv"] = len(df_cube)
+        with metrics.stage("checksum"):
+            checksums["cube.csv"] = sha256_file(cube_csv)
+    n_reports = row_counts["Reports.csv"]
+    if columnar_writer is not None:
+        _add_columnar_entries(row_counts, checksums, columnar_writer)
+    completeness_rows = [
+        (name, (non_null[name] / n_reports * 100.0) if n_reports else 0.0) for name in COMPLETENESS_FIELDS
+    ]
+    qa_path = _write_qa_summary(out_dir, raw_json_path, total_input, total_valid, rejected_reasons, completeness_rows)
+    manifest_path = _write_manifest(out_dir, row_counts, checksums)
+
+    result = {
+        "reports": writers["Reports.csv"].path,
+        "drugs": writers["Drugs.csv"].path,
+        "reactions": writers["Reactions.csv"].path,
+        "aggregated": writers["Safety_surveillance.csv"].path,
         "qa_summary": qa_path,
         "manifest": manifest_path,
     }
+    if cube:
+        result["cube"] = cube_csv
+    if store_writer is not None:
+        with metrics.stage("query_store"):
+            result["query_store"] = store_writer.close({"raw_file": raw_json_path})
+    outputs = {
+        "write": TABLE_FILES + [QA_FILE],
+        "cube": ["cube.csv"],
+        "columnar": sorted(columnar_writer.row_counts) if columnar_writer is not None else [],
+        "query_store": [STORE_FILENAME],
+    }
+    for stage in _output_stages(columnar, query_store, cube):
+        _store_stage(_storing(cache, rx.failed), keys or {}, stage, out_dir, outputs[stage], row_counts, checksums)
+    return result
+
+
+def _input_hash(raw_json_path: str) -> str:
+    # Acquired manifests already carry each segment's SHA-256; other inputs are hashed in full.
+    name = os.path.basename(raw_json_path)
+    manifest = None if ".ndjson" in name or ".jsonl" in name else read_manifest(raw_json_path)
+    if manifest is not None and manifest.get("segments"):
+        h = hashlib.sha256()
+        for seg, path in zip(manifest["segments"], segment_paths(raw_json_path, manifest)):
+            h.update(f"{seg['sha256']} {os.path.getsize(path)}\n".encode("utf-8"))
+        return h.hexdigest()
+    if manifest is not None:
+        return sha256_file(manifest["raw_file"])
+    return sha256_file(raw_json_path)
+
+
+def _rxnorm_source(rxnorm_index: Optional[str]) -> str:
+    path = rxnorm_index or RXNORM.offline_index
+    if path:
+        index = latest_index(path)
+        st = os.stat(index)
+        return f"index:{os.path.basename(index)}:{st.st_size}:{int(st.st_mtime)}"
+    # RxNav answers can change, but within a cache entry's lifetime they are reused like the
+    # RxNorm cache's; clearing the stage cache picks up new ones.
+    return f"rxnav:{RXNORM.base_url}:{RXNORM.cache_version}"
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _stage_keys(
+    raw_json_path: str,
+    products: Dict[str, List[str]],
+    rxnorm_index: Optional[str],
+    list_encoding: str,
+    columnar: Optional[str],
+    chunk_size: Optional[int],
+) -> Dict[str, str]:
+    code = {stage: source_fingerprint(paths) for stage, paths in STAGE_SOURCES.items()}
+    keys = {"validate": stage_key("validate", _input_hash(raw_json_path), code["validate"], {})}
+    keys["dedup"] = stage_key("dedup", keys["validate"], code["dedup"], {})
+    normalize_config = {
+        "products": products,
+        "rxnorm": _rxnorm_source(rxnorm_index),
+        "list_encoding": list_encoding,
+        "keep_lists": bool(columnar),
+        "pandas": pd.__version__,
+    }
+    keys["normalize"] = stage_key("normalize", keys["dedup"], code["normalize"], normalize_config)
+    # CSVs and the cube are byte-identical in every mode. Streaming writes columnar files and
+    # store pages per chunk, so the chunk size (None otherwise) is part of those keys, and the QA
+    # summary and query store record the raw file path.
+    output_config = {
+        "write": {"raw_file": raw_json_path, "pandas": pd.__version__},
+        "cube": {"pandas": pd.__version__},
+        "columnar": {"format": columnar, "chunk_size": chunk_size, "pyarrow": _package_version("pyarrow")},
+        "query_store": {"raw_file": raw_json_path, "chunk_size": chunk_size, "sqlite": sqlite3.sqlite_version},
+    }
+    for stage, config in output_config.items():
+        keys[stage] = stage_key(stage, keys["normalize"], code[stage], config)
+    return keys
+
+
+def _output_stages(columnar: Optional[str], query_store: bool, cube: bool) -> List[str]:
+    return ["write"] + ["cube"] * cube + ["columnar"] * bool(columnar) + ["query_store"] * query_store
+
+
+def _restore_stage(
+    cache: Optional[StageCache],
+    keys: Dict[str, str],
+    stage: str,
+    out_dir: str,
+    row_counts: Dict[str, int],
+    checksums: Dict[str, str],
+) -> bool:
+    if cache is None:
+        return False
+    if stage == "columnar":
+        shutil.rmtree(os.path.join(out_dir, "columnar"), ignore_errors=True)
+    meta = cache.restore(stage, keys[stage], out_dir)
+    if meta is None:
+        return False
+    print(f"Reused cached {stage} output")
+    row_counts.update(meta["row_counts"])
+    checksums.update(meta["checksums"])
+    return True
+
+
+def _storing(cache: Optional[StageCache], rxnorm_failed: int) -> Optional[StageCache]:
+    # Failed RxNav lookups are left out of the RxNorm cache so a later run retries them; outputs
+    # built without them must not outlive this run either, or the stage key would pin the gaps.
+    if cache is None or not rxnorm_failed:
+        return cache
+    print(f"Not caching normalize and later stages: {rxnorm_failed} RxNav lookups failed")
+    return None
+
+
+def _store_stage(
+    cache: Optional[StageCache],
+    keys: Dict[str, str],
+    stage: str,
+    out_dir: str,
+    files: List[str],
+    row_counts: Dict[str, int],
+    checksums: Dict[str, str],
+) -> None:
+    if cache is None:
+        return
+    meta = {
+        "row_counts": {rel: row_counts[rel] for rel in files if rel in row_counts},
+        "checksums": {rel: checksums[rel] for rel in files if rel in checksums},
+    }
+    cache.put(stage, keys[stage], files={rel: os.path.join(out_dir, rel) for rel in files}, meta=meta)
+
+
+def _result_paths(out_dir: str, cube: bool, query_store: bool) -> Dict[str, str]:
+    result = {
+        "reports": os.path.join(out_dir, "Reports.csv"),
+        "drugs": os.path.join(out_dir, "Drugs.csv"),
+        "reactions": os.path.join(out_dir, "Reactions.csv"),
+        "aggregated": os.path.join(out_dir, "Safety_surveillance.csv"),
+        "qa_summary": os.path.join(out_dir, QA_FILE),
+        "manifest": os.path.join(out_dir, "MANIFEST.txt"),
+    }
+    if cube:
+        result["cube"] = cube_path(out_dir)
+    if query_store:
+        result["query_store"] = store_path(out_dir)
+    return result
+
+
+def _restore_outputs(
+    cache: StageCache, keys: Dict[str, str], out_dir: str, columnar: Optional[str], query_store: bool, cube: bool
+) -> Optional[Dict[str, str]]:
+    # Every output comes from the cache, so nothing upstream has to be recomputed.
+    stages = _output_stages(columnar, query_store, cube)
+    if not all(cache.contains(keys[stage]) for stage in stages):
+        return None
+    row_counts: Dict[str, int] = {}
+    checksums: Dict[str, str] = {}
+    for stage in stages:
+        if not _restore_stage(cache, keys, stage, out_dir, row_counts, checksums):
+            return None
+    _write_manifest(out_dir, row_counts, checksums)
+    return _result_paths(out_dir, cube, query_store)
+
+
+def _write_tables(
+    out_dir: str,
+    raw_json_path: str,
+    tables: _Tables,
+    columnar: Optional[str] = None,
+    query_store: bool = True,
+    cube: bool = True,
+    cache: Optional[StageCache] = None,
+    keys: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    keys = keys or {}
+    store = _storing(cache, tables.rxnorm_failed)
+    row_counts: Dict[str, int] = {}
+    checksums: Dict[str, str] = {}
+    if not _restore_stage(cache, keys, "write", out_dir, row_counts, checksums):
+        with metrics.stage("write") as stage:
+            tables.reports.to_csv(os.path.join(out_dir, "Reports.csv"), index=False)
+            tables.drugs.to_csv(os.path.join(out_dir, "Drugs.csv"), index=False)
+            tables.reactions.to_csv(os.path.join(out_dir, "Reactions.csv"), index=False)
+            tables.surveillance.to_csv(os.path.join(out_dir, "Safety_surveillance.csv"), index=False)
+            stage.records = len(tables.reports) + len(tables.drugs) + len(tables.reactions) + len(tables.surveillance)
+
+        def pct_non_null(series: pd.Series) -> float:
+            if len(series) == 0:
+                return 0.0
+            return float(series.notna().mean() * 100.0)
+
+        completeness_rows = [(name, pct_non_null(tables.reports.get(name))) for name in COMPLETENESS_FIELDS]
+        _write_qa_summary(
+            out_dir, raw_json_path, tables.total_input, tables.total_valid, tables.rejected_reasons, completeness_rows
+        )
+        frames = [tables.reports, tables.drugs, tables.reactions, tables.surveillance]
+        row_counts.update({name: len(df) for name, df in zip(TABLE_FILES, frames)})
+        with metrics.stage("checksum"):
+            checksums.update({name: sha256_file(os.path.join(out_dir, name)) for name in TABLE_FILES})
+        _store_stage(store, keys, "write", out_dir, TABLE_FILES + [QA_FILE], row_counts, checksums)
+    if cube and not _restore_stage(cache, keys, "cube", out_dir, row_counts, checksums):
+        with metrics.stage("cube"):
+            df_cube = build_cube(tables.reports, tables.drugs, tables.reactions)
+            cube_csv = write_cube(df_cube, cube_path(out_dir))
+        row_counts["cube.csv"] = len(df_cube)
+        with metrics.stage("checksum"):
+            checksums["cube.csv"] = sha256_file(cube_csv)
+        _store_stage(store, keys, "cube", out_dir, ["cube.csv"], row_counts, checksums)
+    if columnar and not _restore_stage(cache, keys, "columnar", out_dir, row_counts, checksums):
+        with metrics.stage("columnar"):
+            columnar_writer = ColumnarWriter(out_dir, columnar)
+            columnar_writer.write(
+                {
+                    "Reports": tables.reports,
+                    "Drugs": tables.drugs,
+                    "Reactions": tables.reactions,
+                    "Safety_surveillance": tables.surveillance_lists,
+                }
+            )
+        _add_columnar_entries(row_counts, checksums, columnar_writer)
+        _store_stage(store, keys, "columnar", out_dir, sorted(columnar_writer.row_counts), row_counts, checksums)
+    _write_manifest(out_dir, row_counts, checksums)
+
+    if query_store and not _restore_stage(cache, keys, "query_store", out_dir, row_counts, checksums):
+        with metrics.stage("query_store"):
+            store_writer = StoreWriter(out_dir)
+            store_writer.write({"Reports": tables.reports, "Drugs": tables.drugs, "Reactions": tables.reactions})
+            store_writer.close({"raw_file": raw_json_path})
+        _store_stage(store, keys, "query_store", out_dir, [STORE_FILENAME], row_counts, checksums)
+    return _result_paths(out_dir, cube, query_store)
+
+
+def _shard_of(rec: Any, ordinal: int, n_shards: int) -> int:
+    rep_id = rec.get("safetyreportid") if isinstance(rec, dict) else None
+    if rep_id is None:
+        return ordinal % n_shards
+    return zlib.crc32(str(rep_id).encode("utf-8")) % n_shards
+
+
+def _process_shard(shard_path: str, out_path: str, rx: RxNormMapping, matcher: ProductMatcher) -> Dict[str, Any]:
+    rejected_reasons: Dict[str, int] = defaultdict(int)
+    best: Dict[Any, List[Any]] = {}
+    total_input = 0
+    total_valid = 0
+    with open(shard_path, "r", encoding="utf-8") as f:
+        for line in f:
+            ordinal_text, payload = line.split("\t", 1)
+            rec = json.loads(payload)
+            total_input += 1
+            ok, reason = _validate_record(rec)
+            if not ok:
+                rejected_reasons[reason] += 1
+                continue
+            total_valid += 1
+            rep_id = rec.get("safetyreportid")
+            if not rep_id:
+                continue
+            non_missing = _completeness_score(rec)
+            cur_date = parse_faers_date(rec.get("receivedate")) or ""
+            entry = best.get(rep_id)
+            if entry is None:
+                best[rep_id] = [int(ordinal_text), non_missing, cur_date, rec]
+            elif non_missing > entry[1] or (non_missing == entry[1] and cur_date > entry[2]):
+                entry[1:] = [non_missing, cur_date, rec]
+
+    reports = report_frame([(rep_id, entry[3]) for rep_id, entry in best.items()]).to_dict("records")
+    results = []
+    for report, (rep_id, (first_ordinal, _, _, rec)) in zip(reports, best.items()):
+        results.append(
+            (
+                first_ordinal,
+                report,
+                _drug_rows(rep_id, rec, rx, matcher),
+                _reaction_rows(rep_id, rec),
+            )
+        )
+    results.sort(key=lambda item: item[0])
+    with open(out_path, "wb") as f:
+        pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        "path": out_path,
+        "total_input": total_input,
+        "total_valid": total_valid,
+        "rejected_reasons": dict(rejected_reasons),
+    }
+
+
+def _curate_parallel(
+    raw_json_path: str,
+    out_dir: str,
+    workers: int,
+    matcher: ProductMatcher,
+    columnar: Optional[str] = None,
+    rxnorm_index: Optional[str] = None,
+    list_encoding: str = "json",
+    query_store: bool = True,
+    cube: bool = True,
+    cache: Optional[StageCache] = None,
+    keys: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    with tempfile.TemporaryDirectory(prefix="curate_shards_", dir=out_dir) as tmp:
+        shard_paths = [os.path.join(tmp, f"shard_{i:03d}.tsv") for i in range(workers)]
+        shard_files = [open(path, "w", encoding="utf-8") for path in shard_paths]
+        product_names: Set[str] = set()
+        print(f"Partitioning raw records into {workers} shards...")
+        with metrics.stage("partition") as stage:
+            try:
+                for ordinal, rec in enumerate(tqdm(iter_raw_records(raw_json_path), desc="Partitioning")):
+                    product_names.update(_target_product_names(rec, matcher))
+                    shard = _shard_of(rec, ordinal, workers)
+                    shard_files[shard].write(f"{ordinal}\t{json.dumps(rec, ensure_ascii=False)}\n")
+                    stage.records = ordinal + 1
+            finally:
+                for f in shard_files:
+                    f.close()
+
+        rx = _resolve_products(product_names, rxnorm_index)
+        print(f"Validating, deduplicating and normalizing shards on {workers} processes...")
+        # Worker CPU time is reported as children_cpu_s on this stage.
+        with metrics.stage("validate_dedup_normalize") as stage:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_process_shard, path, os.path.join(tmp, f"rows_{i:03d}.pkl"), rx, matcher)
+                    for i, path in enumerate(shard_paths)
+                ]
+                shard_results = [fut.result() for fut in futures]
+            stage.records = sum(r["total_input"] for r in shard_results)
+
+        total_input = sum(r["total_input"] for r in shard_results)
+        total_valid = sum(r["total_valid"] for r in shard_results)
+        rejected_reasons: Dict[str, int] = defaultdict(int)
+        for r in shard_results:
+            for reason, count in r["rejected_reasons"].items():
+                rejected_reasons[reason] += count
+
+        shard_rows = []
+        for r in shard_results:
+            with open(r["path"], "rb") as f:
+                shard_rows.append(pickle.load(f))
+
+    reports_rows: List[Dict[str, Any]] = []
+    drugs_rows: List[Dict[str, Any]] = []
+    reactions_rows: List[Dict[str, Any]] = []
+    surveillance = _surveillance_builder(list_encoding, columnar)
+    with metrics.stage("merge") as stage:
+        for _, report, drugs, reactions in heapq.merge(*shard_rows, key=lambda item: item[0]):
+            reports_rows.append(report)
+            surveillance.add(drugs, reactions)
+            drugs_rows.extend(drugs)
+            reactions_rows.extend(reactions)
+        stage.records = len(reports_rows)
+        df_reports = pd.DataFrame(reports_rows, columns=REPORT_COLUMNS)
+        agg, agg_lists = surveillance.frames(df_reports)
+    print(f"Merged {len(reports_rows)} unique reports from {workers} shards")
+
+    tables = _Tables(
+        df_reports,
+        pd.DataFrame(drugs_rows),
+        pd.DataFrame(reactions_rows),
+        agg,
+        agg_lists,
+        total_input,
+        total_valid,
+        dict(rejected_reasons),
+        rx.failed,
+    )
+    return _write_tables(out_dir, raw_json_path, tables, columnar, query_store, cube, cache, keys)
+
+
+def curate_tables(
+    raw_json_path: str,
+    out_dir: str,
+    streaming: bool = False,
+    chunk_size: int = 10000,
+    workers: int = 1,
+    dedup_memory: int = 2_000_000,
+    columnar: Optional[str] = None,
+    rxnorm_index: Optional[str] = None,
+    product_dictionary: Optional[str] = None,
+    list_encoding: str = "json",
+    query_store: bool = True,
+    cube: bool = True,
+    stage_cache: Optional[bool] = None,
+) -> Dict[str, str]:
+    ensure_directories()
+    os.makedirs(out_dir, exist_ok=True)
+    if streaming and workers > 1:
+        raise ValueError("streaming and multi-process curation cannot be combined")
+    if columnar:
+        check_columnar_format(columnar)
+    check_list_encoding(list_encoding)
+    products = load_product_dictionary(product_dictionary)
+    matcher = ProductMatcher(products)
+    use_cache = STAGE_CACHE.enabled if stage_cache is None else stage_cache
+    cache = StageCache() if use_cache else None
+    keys: Dict[str, str] = {}
+    if cache is not None:
+        keys = _stage_keys(
+            raw_json_path, products, rxnorm_index, list_encoding, columnar, chunk_size if streaming else None
+        )
+        restored = _restore_outputs(cache, keys, out_dir, columnar, query_store, cube)
+        if restored is not None:
+            return restored
+    if workers > 1:
+        return _curate_parallel(
+            raw_json_path,
+            out_dir,
+            workers,
+            matcher,
+            columnar,
+            rxnorm_index,
+            list_encoding,
+            query_store,
+            cube,
+            cache,
+            keys,
+        )
+    if streaming:
+        return _curate_streaming(
+            raw_json_path,
+            out_dir,
+            chunk_size,
+            dedup_memory,
+            matcher,
+            columnar,
+            rxnorm_index,
+            list_encoding,
+            query_store,
+            cube,
+            cache,
+            keys,
+        )
+
+    tables = cache.load("normalize", keys["normalize"]) if cache is not None else None
+    if tables is not None:
+        print(f"Reused cached normalize output ({len(tables.reports)} reports)")
+    else:
+        tables = _curate_in_memory(raw_json_path, matcher, rxnorm_index, list_encoding, columnar, cache, keys)
+    return _write_tables(out_dir, raw_json_path, tables, columnar, query_store, cube, cache, keys)
+
+
+def _load_selected(raw_json_path: str, ordinals: List[int]) -> Dict[int, Any]:
+    with metrics.stage("load") as stage:
+        records = dict(iter_selected_records(raw_json_path, iter(sorted(ordinals))))
+        stage.records = len(records)
+    return records
+
+
+def _curate_in_memory(
+    raw_json_path: str,
+    matcher: ProductMatcher,
+    rxnorm_index: Optional[str],
+    list_encoding: str,
+    columnar: Optional[str],
+    cache: Optional[StageCache],
+    keys: Dict[str, str],
+) -> _Tables:
+    # Validate and dedup outputs are cached as record ordinals, so a hit re-reads only the
+    # records it needs and skips the stage itself.
+    deduped = cache.load("dedup", keys["dedup"]) if cache is not None else None
+    validated = cache.load("validate", keys["validate"]) if cache is not None and deduped is None else None
+    best_record: Dict[str, Dict[str, Any]] = {}
+
+    if deduped is not None:
+        print("Reused cached validate and dedup output")
+        records = _load_selected(raw_json_path, [ordinal for _, ordinal in deduped["order"]])
+        best_record = {rep_id: records[ordinal] for rep_id, ordinal in deduped["order"]}
+        total_input = deduped["total_input"]
+        total_valid = deduped["total_valid"]
+        rejected_reasons = deduped["rejected_reasons"]
+    else:
+        valid_records: List[Tuple[int, Dict[str, Any]]] = []
+        if validated is not None:
+            print("Reused cached validate output")
+            records = _load_selected(raw_json_path, validated["valid"])
+            valid_records = [(ordinal, records[ordinal]) for ordinal in validated["valid"]]
+            total_input = validated["total_input"]
+            rejected_reasons = validated["rejected_reasons"]
+        else:
+            print("Loading raw records...")
+            with metrics.stage("load") as stage:
+                data = list(iter_raw_records(raw_json_path))
+                stage.records = len(data)
+            print(f"Loaded {len(data)} records")
+
+            reasons: Dict[str, int] = defaultdict(int)
+            print("Validating records...")
+            with metrics.stage("validate") as stage:
+                for ordinal, rec in enumerate(tqdm(data, desc="Validating")):
+                    ok, reason = _validate_record(rec)
+                    if ok:
+                        valid_records.append((ordinal, rec))
+                    else:
+                        reasons[reason] += 1
+                stage.records = len(data)
+            total_input = len(data)
+            rejected_reasons = dict(reasons)
+            del data
+            if cache is not None:
+                valid = {"valid": [ordinal for ordinal, _ in valid_records], "total_input": total_input}
+                cache.put("validate", keys["validate"], dict(valid, rejected_reasons=rejected_reasons))
+
+        total_valid = len(valid_records)
+        completeness: Dict[str, int] = {}
+        best_date: Dict[str, str] = {}
+        best_ordinal: Dict[str, int] = {}
+
+        print("Deduplicating records...")
+        with metrics.stage("dedup") as stage:
+            for ordinal, rec in valid_records:
+                rep_id = rec.get("safetyreportid")
+                if not rep_id:
+                    continue
+                non_missing = _completeness_score(rec)
+                prev = completeness.get(rep_id, -1)
+                if non_missing > prev:
+                    best_record[rep_id] = rec
+                    best_ordinal[rep_id] = ordinal
+                    completeness[rep_id] = non_missing
+                    best_date.pop(rep_id, None)
+                elif non_missing == prev:
+                    prev_date = best_date.get(rep_id)
+                    if prev_date is None:
+                        prev_date = best_date[rep_id] = parse_faers_date(best_record[rep_id].get("receivedate")) or ""
+                    cur_date = parse_faers_date(rec.get("receivedate")) or ""
+                    if cur_date > prev_date:
+                        best_record[rep_id] = rec
+                        best_ordinal[rep_id] = ordinal
+                        best_date[rep_id] = cur_date
+            stage.records = total_valid
+        del valid_records
+        if cache is not None:
+            deduped = {
+                "order": [(rep_id, best_ordinal[rep_id]) for rep_id in best_record],
+                "total_input": total_input,
+                "total_valid": total_valid,
+                "rejected_reasons": rejected_reasons,
+            }
+            cache.put("dedup", keys["dedup"], deduped)
+    print(f"Deduplicated to {len(best_record)} unique reports")
+
+    rx = _resolve_products(
+        {name for rec in best_record.values() for name in _target_product_names(rec, matcher)}, rxnorm_index
+    )
+    drugs_rows: List[Dict[str, Any]] = []
+    reactions_rows: List[Dict[str, Any]] = []
+    surveillance = _surveillance_builder(list_encoding, columnar)
+    print(f"Processing {len(best_record)} reports...")
+    with metrics.stage("normalize") as stage:
+        df_reports = report_frame(list(best_record.items()))
+        for rep_id, rec in tqdm(best_record.items(), desc="Processing"):
+            drugs = _drug_rows(rep_id, rec, rx, matcher)
+            reactions = _reaction_rows(rep_id, rec)
+            surveillance.add(drugs, reactions)
+            drugs_rows.extend(drugs)
+            reactions_rows.extend(reactions)
+        agg, agg_lists = surveillance.frames(df_reports)
+        stage.records = len(best_record)
+
+    tables = _Tables(
+        df_reports,
+        pd.DataFrame(drugs_rows),
+        pd.DataFrame(reactions_rows),
+        agg,
+        agg_lists,
+        total_input,
+        total_valid,
+        rejected_reasons,
+        rx.failed,
+    )
+    store = _storing(cache, rx.failed)
+    if store is not None:
+        store.put("normalize", keys["normalize"], tables)
+    return tables
+
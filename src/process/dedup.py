@@ -0,0 +1,129 @@
+import heapq
+import json
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (score, receivedate, -ordinal): the record with the largest tuple wins, which matches the
+# sequential rule in curate_tables (replace only on a higher score, or an equal score with a
+# later receivedate; earliest record wins exact ties).
+Entry = Tuple[int, str, int]
+# (best entry, ordinal of the report's first valid record): reports are written in first-seen
+# order, like the in-memory modes.
+Slot = Tuple[Entry, int]
+
+
+def _better(a: Entry, b: Entry) -> Entry:
+    return a if a > b else b
+
+
+def _merge_slots(a: Slot, b: Slot) -> Slot:
+    return (_better(a[0], b[0]), min(a[1], b[1]))
+
+
+def _write_run(path: str, items: Iterator[Any], batch_size: int = 10000) -> None:
+    with open(path, "wb") as f:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                batch = []
+        if batch:
+            pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(path: str) -> Iterator[Any]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+class ExternalDeduper:
+    def __init__(self, memory_budget: int = 2_000_000, tmp_dir: Optional[str] = None) -> None:
+        self.memory_budget = max(1, memory_budget)
+        self._tmp = tempfile.TemporaryDirectory(prefix="dedup_", dir=tmp_dir)
+        self._index: Dict[str, Slot] = {}
+        self._runs: List[str] = []
+        self.records = 0
+
+    def add(self, rep_id: Any, score: int, receivedate: str, ordinal: int) -> None:
+        key = json.dumps(rep_id)
+        slot = ((score, receivedate, -ordinal), ordinal)
+        prev = self._index.get(key)
+        self._index[key] = slot if prev is None else _merge_slots(prev, slot)
+        self.records += 1
+        if len(self._index) >= self.memory_budget:
+            self._spill()
+
+    def _spill(self) -> None:
+        path = os.path.join(self._tmp.name, f"run_{len(self._runs):05d}.pkl")
+        _write_run(path, iter(sorted(self._index.items())))
+        self._runs.append(path)
+        self._index = {}
+
+    def _merged(self) -> Iterator[Tuple[str, Slot]]:
+        sources = [_read_run(path) for path in self._runs]
+        sources.append(iter(sorted(self._index.items())))
+        key: Optional[str] = None
+        best: Optional[Slot] = None
+        for cur_key, slot in heapq.merge(*sources, key=lambda item: item[0]):
+            if cur_key != key:
+                if key is not None:
+                    yield (key, best)
+                key, best = cur_key, slot
+            else:
+                best = _merge_slots(best, slot)
+        if key is not None:
+            yield (key, best)
+
+    def winners(self) -> Tuple[int, Iterator[Tuple[int, int]]]:
+        # (winning ordinal, first-seen ordinal) pairs come back ascending by winning ordinal, so
+        # the caller can fetch them in one forward pass.
+        runs: List[str] = []
+        batch: List[Tuple[int, int]] = []
+        unique = 0
+        for _, (entry, first) in self._merged():
+            unique += 1
+            batch.append((-entry[2], first))
+            if len(batch) >= self.memory_budget:
+                path = os.path.join(self._tmp.name, f"winners_{len(runs):05d}.pkl")
+                _write_run(path, iter(sorted(batch)))
+                runs.append(path)
+                batch = []
+        self._index = {}
+        sources = [_read_run(path) for path in runs] + [iter(sorted(batch))]
+        return (unique, heapq.merge(*sources))
+
+    @property
+    def spilled_runs(self) -> int:
+        return len(self._runs)
+
+    def close(self) -> None:
+        self._tmp.cleanup()
+
+
+def external_sort(items: Iterator[Tuple[int, Any]], buffer_size: int, tmp_dir: Optional[str] = None) -> Iterator[Any]:
+    # Yields the values of (key, value) pairs in key order while holding at most buffer_size
+    # pairs in memory: full buffers are spilled as sorted runs and merged, each run read back in
+    # small batches so the merge itself stays small.
+    with tempfile.TemporaryDirectory(prefix="order_", dir=tmp_dir) as tmp:
+        runs: List[str] = []
+        buffer: List[Tuple[int, Any]] = []
+        for item in items:
+            buffer.append(item)
+            if len(buffer) >= buffer_size:
+                buffer.sort(key=lambda pair: pair[0])
+                path = os.path.join(tmp, f"run_{len(runs):05d}.pkl")
+                _write_run(path, iter(buffer), batch_size=256)
+                runs.append(path)
+                buffer = []
+        buffer.sort(key=lambda pair: pair[0])
+        sources = [_read_run(path) for path in runs] + [iter(buffer)]
+        for _, value in heapq.merge(*sources, key=lambda pair: pair[0]):
+            yield value
@@ -0,0 +1,123 @@
+from typing import Any, Dict, Optional, Tuple
+
+from src.common.utils import parse_faers_date
+
+REPORT_COLUMNS = [
+    "safetyreportid",
+    "received_date",
+    "event_date",
+    "patient_age_years",
+    "age_unit_raw",
+    "patient_sex",
+    "reporter_type",
+    "reporter_type_raw",
+    "country",
+    "country_raw",
+    "death",
+    "hospitalization",
+    "life_threatening",
+    "disability",
+    "congenital_anomaly",
+    "intervention",
+    "other",
+]
+
+
+def _standardize_gender(sex: Optional[str]) -> str:
+    if not sex:
+        return "U"
+    s = str(sex).strip().upper()
+    if s in ("F", "FEMALE"):
+        return "F"
+    if s in ("M", "MALE"):
+        return "M"
+    return "U"
+
+
+def _standardize_reporter(rep: Optional[str]) -> Tuple[str, str]:
+    if not rep:
+        return ("OTHER", "")
+    raw = str(rep)
+    s = raw.strip().upper()
+    if "PHYSICIAN" in s:
+        return ("PHYSICIAN", raw)
+    if "PHARMACIST" in s:
+        return ("PHARMACIST", raw)
+    if "CONSUMER" in s or "LAWYER" in s:
+        return ("CONSUMER", raw)
+    return ("OTHER", raw)
+
+
+def _standardize_country(country: Optional[str]) -> Tuple[str, str]:
+    if not country:
+        return ("", "")
+    raw = str(country)
+    return (raw.strip().upper(), raw)
+
+
+def _age_to_years(age_val: Optional[str], age_unit: Optional[str]) -> Tuple[Optional[float], str]:
+    if age_val is None:
+        return (None, age_unit or "")
+    try:
+        val = float(age_val)
+    except Exception:
+        return (None, age_unit or "")
+    unit = (age_unit or "").strip().upper()
+    if unit in ("YR", "YEAR", "YEARS"):
+        return (val, unit)
+    if unit in ("MON", "MONTH", "MONTHS"):
+        return (val / 12.0, unit)
+    if unit in ("WK", "WEEK", "WEEKS"):
+        return (val / 52.0, unit)
+    if unit in ("DY", "DAY", "DAYS"):
+        return (val / 365.0, unit)
+    if unit in ("HR", "HOUR", "HOURS"):
+        return (val / (365.0 * 24.0), unit)
+    return (val, unit)
+
+
+def _report_row(rep_id: Any, rec: Dict[str, Any]) -> Dict[str, Any]:
+    received_date = parse_faers_date(rec.get("receivedate"))
+    event_date = parse_faers_date(rec.get("receiptdate"))
+
+    patient = rec.get("patient", {})
+    sex = _standardize_gender(patient.get("sex") if isinstance(patient.get("sex"), str) else str(patient.get("sex")))
+    age_val = None
+    age_unit = None
+    if isinstance(patient.get("patientonsetage"), (str, int, float)):
+        age_val = str(patient.get("patientonsetage"))
+    if isinstance(patient.get("patientonsetageunit"), (str, int, float)):
+        age_unit = str(patient.get("patientonsetageunit"))
+    age_years, age_unit_raw = _age_to_years(age_val, age_unit)
+
+    occupation = patient.get("patientreporter") or rec.get("fulfillexpeditecriteria")
+    reporter_type, reporter_type_raw = _standardize_reporter(str(occupation) if occupation is not None else None)
+    country, country_raw = _standardize_country(rec.get("occurcountry"))
+
+    death = bool(rec.get("seriousnessdeath"))
+    hospitalization = bool(rec.get("seriousnesshospitalization"))
+    life_threatening = bool(rec.get("seriousnesslifethreatening"))
+    disability = bool(rec.get("seriousnessdisabling"))
+    congenital_anomaly = bool(rec.get("seriousnesscongenitalanomali"))
+    intervention = bool(rec.get("seriousnessother"))
+    other = bool(rec.get("seriousnessother"))
+
+    return {
+        "safetyreportid": rep_id,
+        "received_date": received_date,
+        "event_date": event_date,
+        "patient_age_years": age_years,
+        "age_unit_raw": age_unit_raw,
+        "patient_sex": sex,
+        "reporter_type": reporter_type,
+        "reporter_type_raw": reporter_type_raw,
+        "country": country,
+        "country_raw": country_raw,
+        "death": death,
+        "hospitalization": hospitalization,
+        "life_threatening": life_threatening,
+        "disability": disability,
+        "congenital_anomaly": congenital_anomaly,
+        "intervention": intervention,
+        "other": other,
+    }
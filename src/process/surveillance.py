@@ -0,0 +1,67 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+LIST_ENCODINGS = ("json", "delimited")
+LIST_DELIMITER = "|"
+
+
+def check_list_encoding(encoding: str) -> None:
+    if encoding not in LIST_ENCODINGS:
+        raise ValueError(f"Unknown list encoding: {encoding}")
+
+
+def encode_list(values: List[Any], encoding: str) -> str:
+    if encoding == "json":
+        return json.dumps(values, ensure_ascii=False)
+    return LIST_DELIMITER.join("" if v is None else str(v) for v in values)
+
+
+class SurveillanceBuilder:
+    # Collects the per-report drug and reaction lists while the child rows are emitted, so
+    # Safety_surveillance is assembled positionally against the Reports frame instead of
+    # through groupby(...).agg(list) and two merges. Reports without drugs or reactions get
+    # empty lists rather than NaN.
+    def __init__(
+        self,
+        drug_columns: Sequence[str],
+        reaction_columns: Sequence[str],
+        encoding: str = "json",
+        keep_lists: bool = False,
+    ) -> None:
+        check_list_encoding(encoding)
+        self.drug_columns = list(drug_columns)
+        self.reaction_columns = list(reaction_columns)
+        self.encoding = encoding
+        self.keep_lists = keep_lists
+        self._encoded: Dict[str, List[str]] = {}
+        self._lists: Dict[str, List[List[Any]]] = {}
+        self._reports = 0
+        self.clear()
+
+    def clear(self) -> None:
+        self._encoded = {name: [] for name in self.drug_columns + self.reaction_columns}
+        self._lists = {name: [] for name in self._encoded} if self.keep_lists else {}
+        self._reports = 0
+
+    def _append(self, name: str, values: List[Any]) -> None:
+        self._encoded[name].append(encode_list(values, self.encoding))
+        if self.keep_lists:
+            self._lists[name].append(values)
+
+    def add(self, drugs: List[Dict[str, Any]], reactions: List[Dict[str, Any]]) -> None:
+        for name in self.drug_columns:
+            self._append(name, [row[name] for row in drugs])
+        for name in self.reaction_columns:
+            self._append(name, [row[name] for row in reactions])
+        self._reports += 1
+
+    def frames(self, df_reports: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+        # Rows must have been added in the same order as df_reports.
+        if self._reports != len(df_reports):
+            raise ValueError(f"{self._reports} surveillance rows for {len(df_reports)} reports")
+        encoded = df_reports.assign(**self._encoded)
+        lists = df_reports.assign(**self._lists) if self.keep_lists else None
+        self.clear()
+        return (encoded, lists)
@@ -0,0 +1,142 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.common.utils import parse_faers_date
+from src.process.fields import REPORT_COLUMNS, _standardize_country, _standardize_gender, _standardize_reporter
+
+# Mirrors the unit branches of _age_to_years; any other unit keeps the value as-is.
+AGE_UNIT_DIVISORS = {
+    "YR": 1.0,
+    "YEAR": 1.0,
+    "YEARS": 1.0,
+    "MON": 12.0,
+    "MONTH": 12.0,
+    "MONTHS": 12.0,
+    "WK": 52.0,
+    "WEEK": 52.0,
+    "WEEKS": 52.0,
+    "DY": 365.0,
+    "DAY": 365.0,
+    "DAYS": 365.0,
+    "HR": 365.0 * 24.0,
+    "HOUR": 365.0 * 24.0,
+    "HOURS": 365.0 * 24.0,
+}
+FLAG_FIELDS = [
+    ("death", "seriousnessdeath"),
+    ("hospitalization", "seriousnesshospitalization"),
+    ("life_threatening", "seriousnesslifethreatening"),
+    ("disability", "seriousnessdisabling"),
+    ("congenital_anomaly", "seriousnesscongenitalanomali"),
+    ("intervention", "seriousnessother"),
+    ("other", "seriousnessother"),
+]
+
+
+def _lookup(values: List[Optional[str]], func: Callable[[Optional[str]], Any]) -> np.ndarray:
+    # FAERS code fields have few distinct values: apply the scalar function once per distinct
+    # value and broadcast the results back through the factorized codes (None maps to -1,
+    # which picks the trailing func(None) entry).
+    codes, uniques = pd.factorize(np.array(values, dtype=object))
+    table = np.empty(len(uniques) + 1, dtype=object)
+    for i, u in enumerate(uniques):
+        table[i] = func(u)
+    table[-1] = func(None)
+    return table[codes]
+
+
+def _split(pairs: np.ndarray) -> Tuple[List[Any], List[Any]]:
+    return ([p[0] for p in pairs], [p[1] for p in pairs])
+
+
+def _float_or_nan(value: Optional[str]) -> float:
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except Exception:
+        return np.nan
+
+
+def _is_number(value: Optional[str]) -> bool:
+    if value is None:
+        return False
+    try:
+        float(value)
+    except Exception:
+        return False
+    return True
+
+
+def _dates(raw: List[Any]) -> List[Optional[str]]:
+    keys: List[Optional[str]] = []
+    overrides: Dict[int, Optional[str]] = {}
+    for i, value in enumerate(raw):
+        if value is None or isinstance(value, str):
+            keys.append(value)
+        else:
+            # Non-string dates are rare; keep the scalar behaviour (including its errors).
+            overrides[i] = parse_faers_date(value)
+            keys.append(None)
+    out = _lookup(keys, parse_faers_date).tolist()
+    for i, value in overrides.items():
+        out[i] = value
+    return out
+
+
+def _str_or_none(value: Any) -> Optional[str]:
+    return str(value) if isinstance(value, (str, int, float)) else None
+
+
+def report_frame(items: Sequence[Tuple[Any, Dict[str, Any]]]) -> pd.DataFrame:
+    # Flatten field by field, converting values exactly as _report_row does before the scalar
+    # normalizers see them.
+    recs = [rec for _, rec in items]
+    patients = [rec.get("patient", {}) for rec in recs]
+    sex = [s if isinstance(s, str) else str(s) for s in [p.get("sex") for p in patients]]
+    age_val = [_str_or_none(p.get("patientonsetage")) for p in patients]
+    age_unit = [_str_or_none(p.get("patientonsetageunit")) for p in patients]
+    occupation = [
+        None if occ is None else str(occ)
+        for occ in [p.get("patientreporter") or r.get("fulfillexpeditecriteria") for p, r in zip(patients, recs)]
+    ]
+    country = [
+        c if c is None or isinstance(c, str) else (str(c) if c else None) for c in [r.get("occurcountry") for r in recs]
+    ]
+    flag_values = {
+        field: np.array([not not r.get(field) for r in recs], dtype=bool) for field in {f for _, f in FLAG_FIELDS}
+    }
+
+    age_codes, age_uniques = pd.factorize(np.array(age_val, dtype=object))
+    value_table = np.append(np.array([_float_or_nan(v) for v in age_uniques], dtype=float), np.nan)
+    valid_table = np.append(np.array([_is_number(v) for v in age_uniques], dtype=bool), False)
+    unit_codes, unit_uniques = pd.factorize(np.array(age_unit, dtype=object))
+    norm_units = [u.strip().upper() for u in unit_uniques]
+    divisor_table = np.append(np.array([AGE_UNIT_DIVISORS.get(u, 1.0) for u in norm_units], dtype=float), 1.0)
+    norm_table = np.array(norm_units + [""], dtype=object)
+    raw_table = np.array(list(unit_uniques) + [""], dtype=object)
+
+    valid = valid_table[age_codes]
+    years = np.where(valid, value_table[age_codes] / divisor_table[unit_codes], np.nan)
+    unit_raw = np.where(valid, norm_table[unit_codes], raw_table[unit_codes])
+
+    reporter_type, reporter_raw = _split(_lookup(occupation, _standardize_reporter))
+    country_std, country_raw = _split(_lookup(country, _standardize_country))
+
+    columns = {
+        "safetyreportid": [rep_id for rep_id, _ in items],
+        "received_date": _dates([r.get("receivedate") for r in recs]),
+        "event_date": _dates([r.get("receiptdate") for r in recs]),
+        "patient_age_years": years,
+        "age_unit_raw": unit_raw.tolist(),
+        "patient_sex": _lookup(sex, _standardize_gender).tolist(),
+        "reporter_type": reporter_type,
+        "reporter_type_raw": reporter_raw,
+        "country": country_std,
+        "country_raw": country_raw,
+    }
+    for name, field in FLAG_FIELDS:
+        columns[name] = flag_values[field]
+    return pd.DataFrame(columns, columns=REPORT_COLUMNS)
@@ -0,0 +1,225 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+STORE_FILENAME = "curated.sqlite"
+
+SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE reports (
+    safetyreportid TEXT PRIMARY KEY,
+    received_date TEXT,
+    event_date TEXT,
+    patient_age_years REAL,
+    age_unit_raw TEXT,
+    patient_sex TEXT,
+    reporter_type TEXT,
+    reporter_type_raw TEXT,
+    country TEXT,
+    country_raw TEXT,
+    death INTEGER,
+    hospitalization INTEGER,
+    life_threatening INTEGER,
+    disability INTEGER,
+    congenital_anomaly INTEGER,
+    intervention INTEGER,
+    other INTEGER
+);
+CREATE TABLE drugs (
+    safetyreportid TEXT NOT NULL,
+    drug_role TEXT,
+    drug_name_original TEXT,
+    rxcui TEXT,
+    ingredient_rxcui TEXT,
+    ingredient_name TEXT,
+    brand_name TEXT,
+    match_confidence REAL
+);
+CREATE TABLE reactions (
+    safetyreportid TEXT NOT NULL,
+    reaction_term_text TEXT
+);
+"""
+
+# Created after the bulk load; building them on a filled table is much faster than
+# maintaining them row by row.
+INDEXES = """
+CREATE INDEX reports_received_date ON reports (received_date);
+CREATE INDEX drugs_report ON drugs (safetyreportid);
+CREATE INDEX drugs_role_ingredient ON drugs (drug_role, ingredient_rxcui);
+CREATE INDEX drugs_ingredient_name ON drugs (ingredient_name COLLATE NOCASE);
+CREATE INDEX reactions_report ON reactions (safetyreportid);
+CREATE INDEX reactions_term ON reactions (reaction_term_text COLLATE NOCASE);
+ANALYZE;
+"""
+
+TABLES = {"Reports": "reports", "Drugs": "drugs", "Reactions": "reactions"}
+SERIOUS_FLAGS = [
+    "death",
+    "hospitalization",
+    "life_threatening",
+    "disability",
+    "congenital_anomaly",
+    "intervention",
+    "other",
+]
+GROUPINGS = {
+    "reactions": ("x.reaction_term_text", "JOIN reactions x ON x.safetyreportid = r.safetyreportid"),
+    "ingredients": ("d.ingredient_name", "JOIN drugs d ON d.safetyreportid = r.safetyreportid"),
+    "roles": ("d.drug_role", "JOIN drugs d ON d.safetyreportid = r.safetyreportid"),
+    "countries": ("r.country", ""),
+    "sexes": ("r.patient_sex", ""),
+    "months": ("substr(r.received_date, 1, 7)", ""),
+}
+# Last day of a received date's period: partial dates are padded to the end of their year or month.
+PERIOD_END = (
+    "CASE length(r.received_date) WHEN 4 THEN r.received_date || '-12-31' "
+    "WHEN 7 THEN r.received_date || '-31' ELSE r.received_date END"
+)
+
+
+def store_path(out_dir: str) -> str:
+    return os.path.join(out_dir, STORE_FILENAME)
+
+
+def _rows(df: pd.DataFrame, columns: List[str]) -> Iterator[Tuple[Any, ...]]:
+    values = df[columns].astype(object)
+    return values.where(values.notna(), None).itertuples(index=False, name=None)
+
+
+class StoreWriter:
+    # Builds the store next to the CSVs while curation writes them; the file only replaces an
+    # existing store once every chunk has been loaded and indexed.
+    def __init__(self, out_dir: str) -> None:
+        self.path = store_path(out_dir)
+        self._tmp = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+        self._conn = sqlite3.connect(self._tmp)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(SCHEMA)
+        self._columns = {
+            table: [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")] for table in TABLES.values()
+        }
+
+    def write(self, tables: Dict[str, pd.DataFrame]) -> None:
+        with self._conn:
+            for name, table in TABLES.items():
+                df = tables[name]
+                if df.empty:
+                    continue
+                columns = self._columns[table]
+                placeholders = ", ".join("?" for _ in columns)
+                self._conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", _rows(df, columns))
+
+    def close(self, meta: Optional[Dict[str, str]] = None) -> str:
+        with self._conn:
+            self._conn.executemany("INSERT INTO meta VALUES (?, ?)", sorted((meta or {}).items()))
+        self._conn.executescript(INDEXES)
+        self._conn.close()
+        os.replace(self._tmp, self.path)
+        return self.path
+
+
+@dataclass
+class ReportFilter:
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    role: Optional[str] = None
+    ingredient: Optional[str] = None
+    reaction: Optional[str] = None
+    country: Optional[str] = None
+    sex: Optional[str] = None
+    serious: Optional[str] = None
+    # Only drugs matched to the product dictionary (they are the ones with an RxNorm ingredient).
+    target: bool = False
+
+    def where(self) -> Tuple[str, List[Any]]:
+        # Dates are compared as ISO strings. A partial FAERS date ("2024-07", "2024") is kept when
+        # its period overlaps the range: its end is compared with date_from and its start (the
+        # string itself, which sorts before every day in the period) with date_to.
+        clauses: List[str] = []
+        params: List[Any] = []
+        if self.date_from:
+            clauses.append(f"{PERIOD_END} >= ?")
+            params.append(self.date_from)
+        if self.date_to:
+            clauses.append("r.received_date <= ?")
+            params.append(self.date_to)
+        if self.country:
+            clauses.append("r.country = ?")
+            params.append(self.country.upper())
+        if self.sex:
+            clauses.append("r.patient_sex = ?")
+            params.append(self.sex.upper())
+        if self.serious:
+            if self.serious not in SERIOUS_FLAGS:
+                raise ValueError(f"Unknown seriousness flag: {self.serious}")
+            clauses.append(f"r.{self.serious} = 1")
+        if self.role or self.ingredient or self.target:
+            drug = ["d.safetyreportid = r.safetyreportid"]
+            if self.target:
+                drug.append("d.ingredient_rxcui IS NOT NULL")
+            if self.role:
+                drug.append("d.drug_role = ?")
+                params.append(self.role.upper())
+            if self.ingredient and self.ingredient.isdigit():
+                drug.append("d.ingredient_rxcui = ?")
+                params.append(self.ingredient)
+            elif self.ingredient:
+                drug.append("d.ingredient_name = ? COLLATE NOCASE")
+                params.append(self.ingredient)
+            clauses.append(f"EXISTS (SELECT 1 FROM drugs d WHERE {' AND '.join(drug)})")
+        if self.reaction:
+            clauses.append(
+                "EXISTS (SELECT 1 FROM reactions x WHERE x.safetyreportid = r.safetyreportid "
+                "AND x.reaction_term_text = ? COLLATE NOCASE)"
+            )
+            params.append(self.reaction)
+        return (" AND ".join(clauses) or "1", params)
+
+
+class QueryStore:
+    def __init__(self, path: str) -> None:
+        if os.path.isdir(path):
+            path = store_path(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No query store at {path}; run 'cli.py process' first")
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def sql(self, query: str, params: Sequence[Any] = ()) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        cur = self._conn.execute(query, params)
+        return ([c[0] for c in cur.description or []], cur.fetchall())
+
+    def count_reports(self, flt: ReportFilter) -> int:
+        where, params = flt.where()
+        return self._conn.execute(f"SELECT COUNT(*) FROM reports r WHERE {where}", params).fetchone()[0]
+
+    def counts(self, flt: ReportFilter, by: str, limit: Optional[int] = 20) -> List[Tuple[Any, int]]:
+        # Number of distinct matching reports per value of `by`, most frequent first.
+        if by not in GROUPINGS:
+            raise ValueError(f"Unknown grouping: {by}")
+        expr, join = GROUPINGS[by]
+        where, params = flt.where()
+        query = (
+            f"SELECT {expr} AS value, COUNT(DISTINCT r.safetyreportid) AS reports FROM reports r {join} "
+            f"WHERE {where} GROUP BY value ORDER BY reports DESC, value"
+        )
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return self._conn.execute(query, params).fetchall()
+
+    def reports(self, flt: ReportFilter, limit: Optional[int] = 20) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        where, params = flt.where()
+        query = f"SELECT r.* FROM reports r WHERE {where} ORDER BY r.received_date, r.safetyreportid"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return self.sql(query, params)
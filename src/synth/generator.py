@@ -0,0 +1,308 @@
+import math
+import os
+import random
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.common.logging_utils import new_run_id
+from src.common.rawstore import SegmentWriter, combined_sha256
+from src.common.utils import write_json
+from src.synth.vocabulary import CONCOMITANT_INGREDIENTS, TARGET_INGREDIENTS, reaction_terms
+
+REPORT_ID_BASE = 30_000_000
+INVALID_KINDS = ["not_a_object", "missing_safetyreportid", "invalid_patient", "no_drug_no_reaction"]
+# openFDA seriousness fields and how often each is set.
+SERIOUSNESS = {
+    "seriousnessdeath": 0.03,
+    "seriousnesshospitalization": 0.2,
+    "seriousnesslifethreatening": 0.03,
+    "seriousnessdisabling": 0.02,
+    "seriousnesscongenitalanomali": 0.001,
+    "seriousnessother": 0.4,
+}
+STRENGTHS = ["0.25 MG", "0.5 MG", "1 MG", "2 MG", "2.4 MG", "2.5 MG/0.5 ML", "5 MG", "7.5 MG", "10 MG", "15 MG"]
+ROUTES = ["058", "048", "065", "042"]
+INDICATIONS = ["TYPE 2 DIABETES MELLITUS", "WEIGHT CONTROL", "OBESITY", "PRODUCT USED FOR UNKNOWN INDICATION"]
+
+
+@dataclass
+class SynthConfig:
+    records: int = 25_100
+    seed: int = 0
+    # Share of records that are another version of an already emitted report.
+    duplicate_rate: float = 0.05
+    # Share of records validate_record rejects, spread over its rejection reasons.
+    invalid_rate: float = 0.01
+    # Mean Drugs and Reactions rows per curated report in deliverables/MANIFEST.txt
+    # (136581 / 25100 and 65341 / 25100).
+    drugs_per_report: float = 136581 / 25100
+    reactions_per_report: float = 65341 / 25100
+    start_date: str = "2024-01-01"
+    end_date: str = "2024-12-31"
+    country: str = "US"
+
+
+class _Picker:
+    # Weighted choice without random.choices' per-call list building; generation speed is what
+    # lets the benchmarks run at millions of records.
+    def __init__(self, values: List[Any], weights: Optional[List[float]] = None) -> None:
+        self.values = values
+        self.cum_weights = list(accumulate(weights or [1.0] * len(values)))
+        self.total = self.cum_weights[-1]
+
+    def __call__(self, rng: random.Random) -> Any:
+        return self.values[bisect_right(self.cum_weights, rng.random() * self.total)]
+
+
+def _choice(rng: random.Random, values: Any) -> Any:
+    return values[int(rng.random() * len(values))]
+
+
+def _count(rng: random.Random, mean: float) -> int:
+    # 1 + geometric, which matches the long right tail of drugs and reactions per report.
+    if mean <= 1:
+        return 1
+    p = 1.0 / mean
+    return 1 + int(math.log(1.0 - rng.random()) / math.log(1.0 - p))
+
+
+def _misspell(rng: random.Random, name: str) -> str:
+    i = rng.randrange(1, len(name) - 1)
+    if rng.random() < 0.5:
+        return name[:i] + name[i + 1 :]
+    return name[:i] + name[i] + name[i:]
+
+
+def _surface_name(rng: random.Random, name: str) -> str:
+    # FAERS spellings: mostly upper case, often with a strength or device suffix, sometimes
+    # misspelled or padded with whitespace.
+    u = rng.random()
+    text = name.upper() if u < 0.7 else name if u < 0.85 else name.lower()
+    u = rng.random()
+    if u < 0.25:
+        text = f"{text} {_choice(rng, STRENGTHS)}"
+    elif u < 0.3:
+        text = f"{text} PEN"
+    elif u < 0.32:
+        text = f"{text} (COMPOUNDED)"
+    if rng.random() < 0.03 and len(name) > 5:
+        text = _misspell(rng, text)
+    if rng.random() < 0.01:
+        text = f" {text}  "
+    return text
+
+
+class RecordGenerator:
+    # Each block is an independent stream seeded from (seed, block) with its own report id
+    # range, so blocks can be generated in parallel and the output does not depend on how many
+    # workers produced it. Duplicate versions refer back to reports of the same block.
+    def __init__(self, config: SynthConfig, block: int = 0, records: Optional[int] = None, block_size: int = 0) -> None:
+        self.config = config
+        self.records = config.records if records is None else records
+        self.rng = random.Random(f"{config.seed}:{block}")
+        start = date.fromisoformat(config.start_date)
+        self.days = max(1, (date.fromisoformat(config.end_date) - start).days + 1)
+        # YYYYMMDD strings for the window plus the follow-up days used by receipt and
+        # transmission dates; strftime per record is a measurable share of generation time.
+        self.dates = [(start + timedelta(days=i)).strftime("%Y%m%d") for i in range(self.days + 120)]
+        self.target = _Picker([(ing, name) for ing, brands in TARGET_INGREDIENTS.items() for name in [ing] + brands])
+        products = [(ing, name) for ing, brands in CONCOMITANT_INGREDIENTS.items() for name in [ing] + brands]
+        self.concomitant = _Picker(products, [1.0 / (rank + 1) ** 0.7 for rank in range(len(products))])
+        self.reaction = _Picker(*reaction_terms())
+        self.first_id = REPORT_ID_BASE + block * block_size
+        self.next_id = self.first_id
+
+    def __iter__(self) -> Iterator[Any]:
+        cfg = self.config
+        for _ in range(self.records):
+            u = self.rng.random()
+            if u < cfg.invalid_rate:
+                yield self._invalid(_choice(self.rng, INVALID_KINDS))
+            elif u < cfg.invalid_rate + cfg.duplicate_rate and self.next_id > self.first_id:
+                yield self._report(str(self.rng.randrange(self.first_id, self.next_id)), self.rng.randint(2, 4))
+            else:
+                self.next_id += 1
+                yield self._report(str(self.next_id - 1), 1)
+
+    def _day(self) -> int:
+        return int(self.rng.random() * self.days)
+
+    def _partial_date(self, day: int) -> Optional[str]:
+        u = self.rng.random()
+        if u < 0.75:
+            return self.dates[day]
+        if u < 0.85:
+            return self.dates[day][:6]
+        if u < 0.9:
+            return self.dates[day][:4]
+        return None if u < 0.97 else ""
+
+    def _drug(self, product: Tuple[str, str], role: str) -> Dict[str, Any]:
+        rng = self.rng
+        ingredient, name = product
+        drug: Dict[str, Any] = {
+            "drugcharacterization": role,
+            "medicinalproduct": _surface_name(rng, name),
+            "activesubstance": {"activesubstancename": ingredient.upper()},
+        }
+        if rng.random() < 0.6:
+            drug["drugadministrationroute"] = _choice(rng, ROUTES)
+            drug["drugindication"] = _choice(rng, INDICATIONS)
+        if rng.random() < 0.5:
+            drug["openfda"] = {"generic_name": [ingredient.upper()], "brand_name": [name.upper()]}
+        return drug
+
+    def _drugs(self) -> List[Any]:
+        rng = self.rng
+        drugs = [self._drug(self.target(rng), "1" if rng.random() < 0.85 else "2")]
+        for _ in range(_count(rng, self.config.drugs_per_report) - 1):
+            if rng.random() < 0.06:
+                drugs.append(self._drug(self.target(rng), _choice(rng, ["1", "2"])))
+            else:
+                drugs.append(self._drug(self.concomitant(rng), "2" if rng.random() < 0.9 else "3"))
+        if rng.random() < 0.002:
+            drugs.append("UNKNOWN")
+        return drugs
+
+    def _reactions(self) -> List[Dict[str, Any]]:
+        rng = self.rng
+        if rng.random() < 0.005:
+            return []
+        # Terms are distinct within a report, so draw until the sampled count is reached.
+        wanted = _count(rng, self.config.reactions_per_report)
+        terms: Dict[str, None] = {}
+        for _ in range(4 * wanted):
+            terms[self.reaction(rng)] = None
+            if len(terms) >= wanted:
+                break
+        out = []
+        for term in terms:
+            if rng.random() < 0.01:
+                term = f"{term}  "
+            out.append({"reactionmeddrapt": term, "reactionmeddraversionpt": "27.0", "reactionoutcome": _choice(rng, "123456")})
+        return out
+
+    def _patient(self) -> Dict[str, Any]:
+        rng = self.rng
+        patient: Dict[str, Any] = {"patientsex": _choice(rng, ["1", "2", "2", "2", "0"])}
+        if rng.random() < 0.64:
+            u = rng.random()
+            if u < 0.97:
+                patient["patientonsetage"] = str(min(95, max(12, int(rng.gauss(55, 13)))))
+                patient["patientonsetageunit"] = "801"
+            elif u < 0.985:
+                patient["patientonsetage"] = str(rng.randint(2, 11))
+                patient["patientonsetageunit"] = "800"
+            else:
+                patient["patientonsetage"] = str(rng.randint(1, 600))
+                patient["patientonsetageunit"] = _choice(rng, ["802", "803", "804"])
+        if rng.random() < 0.3:
+            patient["patientweight"] = f"{rng.uniform(55, 160):.1f}"
+        patient["drug"] = self._drugs()
+        patient["reaction"] = self._reactions()
+        return patient
+
+    def _report(self, rep_id: str, version: int) -> Dict[str, Any]:
+        rng = self.rng
+        received = self._day()
+        rec: Dict[str, Any] = {
+            "safetyreportid": rep_id,
+            "safetyreportversion": str(version),
+            "receivedate": self.dates[received],
+            "receivedateformat": "102",
+            "receiptdate": self._partial_date(received + int(rng.random() * 60)),
+            "transmissiondate": self.dates[received + 1 + int(rng.random() * 119)],
+            "serious": "1",
+            "fulfillexpeditecriteria": _choice(rng, ["1", "2"]),
+            "occurcountry": self.config.country if rng.random() < 0.98 else self.config.country.lower(),
+            "primarysource": {"reportercountry": self.config.country, "qualification": _choice(rng, "12355")},
+            "companynumb": f"US-SYN-{rng.randrange(10**9):09d}",
+            "patient": self._patient(),
+        }
+        for field, rate in SERIOUSNESS.items():
+            if rng.random() < rate:
+                rec[field] = "1"
+        if version > 1 and rng.random() < 0.5:
+            rec["reportduplicate"] = {"duplicatesource": "SYNTH", "duplicatenumb": rec["companynumb"]}
+        return rec
+
+    def _invalid(self, kind: str) -> Any:
+        if kind == "not_a_object":
+            return _choice(self.rng, [["not", "a", "report"], "truncated record", 42, None])
+        rep_id = str(REPORT_ID_BASE - 1 - self.rng.randrange(10**6))
+        if kind == "missing_safetyreportid":
+            rec = self._report(rep_id, 1)
+            rec["safetyreportid"] = _choice(self.rng, [None, "", "  "])
+            return rec
+        if kind == "invalid_patient":
+            return {"safetyreportid": rep_id, "receivedate": self.dates[self._day()], "patient": "UNKNOWN"}
+        rec = self._report(rep_id, 1)
+        rec["patient"]["drug"] = []
+        rec["patient"]["reaction"] = []
+        return rec
+
+
+def generate_records(config: SynthConfig, block_records: int = 50000) -> Iterator[Any]:
+    for block in range(math.ceil(config.records / block_records)):
+        records = min(block_records, config.records - block * block_records)
+        yield from RecordGenerator(config, block, records, block_records)
+
+
+def _write_block(
+    out_dir: str, run_id: str, config: SynthConfig, block: int, block_records: int, compression: str
+) -> Dict[str, Any]:
+    records = min(block_records, config.records - block * block_records)
+    writer = SegmentWriter(out_dir, run_id, compression, block_records, start_index=block)
+    batch: List[Any] = []
+    for rec in RecordGenerator(config, block, records, block_records):
+        batch.append(rec)
+        # One frame per batch, like one acquired page.
+        if len(batch) >= 1000:
+            writer.append(batch, sync=False)
+            batch = []
+    writer.append(batch, sync=False)
+    return writer.close()[0]
+
+
+def write_synthetic(
+    out_dir: str,
+    config: SynthConfig,
+    run_id: Optional[str] = None,
+    compression: str = "none",
+    segment_records: int = 50000,
+    workers: int = 1,
+) -> str:
+    # Writes segments and a manifest in the same layout as 'cli.py acquire', so the output
+    # feeds straight into 'cli.py process --raw-file'. Each segment is one generator block.
+    run_id = run_id or f"synth_{new_run_id()}"
+    os.makedirs(out_dir, exist_ok=True)
+    blocks = range(max(1, math.ceil(config.records / segment_records)))
+    args = [(out_dir, run_id, config, block, segment_records, compression) for block in blocks]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            segments = list(pool.map(_write_block, *zip(*args)))
+    else:
+        segments = [_write_block(*a) for a in args]
+    manifest_path = os.path.join(out_dir, f"manifest_{run_id}.json")
+    write_json(
+        manifest_path,
+        {
+            "run_id": run_id,
+            "format": "ndjson",
+            "compression": compression,
+            "status": "complete",
+            "records": sum(seg["records"] for seg in segments),
+            "duplicates_dropped": 0,
+            "sha256": combined_sha256(segments),
+            "segments": segments,
+            "requests": 0,
+            "truncated": False,
+            "shards": [],
+            "synthetic": asdict(config),
+        },
+    )
+    return manifest_path
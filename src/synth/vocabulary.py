@@ -0,0 +1,166 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.normalize.rxnorm_index import normalize_name
+
+# Ingredient -> brand names. The first two are the surveillance targets from the built-in
+# product dictionary; the rest are the concomitant medications that make up most Drugs rows.
+TARGET_INGREDIENTS: Dict[str, List[str]] = {
+    "semaglutide": ["Ozempic", "Wegovy", "Rybelsus"],
+    "tirzepatide": ["Mounjaro", "Zepbound"],
+}
+CONCOMITANT_INGREDIENTS: Dict[str, List[str]] = {
+    "metformin": ["Glucophage"],
+    "insulin glargine": ["Lantus", "Toujeo"],
+    "insulin lispro": ["Humalog"],
+    "empagliflozin": ["Jardiance"],
+    "dapagliflozin": ["Farxiga"],
+    "sitagliptin": ["Januvia"],
+    "glipizide": [],
+    "dulaglutide": ["Trulicity"],
+    "liraglutide": ["Victoza", "Saxenda"],
+    "atorvastatin": ["Lipitor"],
+    "rosuvastatin": ["Crestor"],
+    "lisinopril": ["Zestril"],
+    "losartan": ["Cozaar"],
+    "amlodipine": ["Norvasc"],
+    "hydrochlorothiazide": [],
+    "metoprolol": ["Lopressor"],
+    "levothyroxine": ["Synthroid"],
+    "omeprazole": ["Prilosec"],
+    "pantoprazole": ["Protonix"],
+    "sertraline": ["Zoloft"],
+    "bupropion": ["Wellbutrin"],
+    "gabapentin": ["Neurontin"],
+    "phentermine": ["Adipex"],
+    "aspirin": [],
+    "ibuprofen": ["Advil"],
+    "acetaminophen": ["Tylenol"],
+    "cholecalciferol": [],
+    "ondansetron": ["Zofran"],
+    "furosemide": ["Lasix"],
+    "apixaban": ["Eliquis"],
+}
+
+# Counts of the most frequent preferred terms in the curated 2024 extract; rarer terms are
+# filled in from TAIL_SITES x TAIL_FINDINGS with Zipf-like weights.
+REACTION_COUNTS: Dict[str, int] = {
+    "Incorrect dose administered": 3735,
+    "Nausea": 2973,
+    "Off label use": 2416,
+    "Injection site pain": 2323,
+    "Diarrhoea": 1656,
+    "Vomiting": 1515,
+    "Extra dose administered": 1395,
+    "Constipation": 1269,
+    "Blood glucose increased": 1098,
+    "Decreased appetite": 969,
+    "Weight decreased": 884,
+    "Injection site haemorrhage": 841,
+    "Injection site erythema": 768,
+    "Abdominal pain upper": 748,
+    "Fatigue": 746,
+    "Weight increased": 691,
+    "Wrong technique in product usage process": 690,
+    "Headache": 690,
+    "Accidental underdose": 642,
+    "Impaired gastric emptying": 623,
+    "Illness": 622,
+    "Product dose omission issue": 586,
+    "Drug ineffective": 579,
+    "Product use in unapproved indication": 560,
+    "Dizziness": 532,
+    "Injection site bruising": 528,
+    "Dyspepsia": 478,
+    "Inappropriate schedule of product administration": 453,
+    "Abdominal discomfort": 452,
+    "Dehydration": 428,
+    "Abdominal pain": 419,
+    "Eructation": 385,
+    "Injection site pruritus": 374,
+    "Accidental overdose": 373,
+    "Pain": 355,
+    "Alopecia": 355,
+    "Asthenia": 353,
+    "Blood glucose decreased": 347,
+    "Injection site mass": 342,
+    "Abdominal distension": 338,
+}
+TAIL_SITES = [
+    "Abdominal", "Hepatic", "Renal", "Cardiac", "Gastric", "Pancreatic", "Skin", "Eye", "Muscle", "Joint",
+    "Thyroid", "Gallbladder", "Oesophageal", "Intestinal", "Respiratory", "Vascular", "Nerve", "Bone",
+    "Breast", "Ear", "Bladder", "Biliary", "Dental", "Lymph node", "Spinal",
+]  # fmt: skip
+TAIL_FINDINGS = [
+    "disorder", "pain", "infection", "haemorrhage", "neoplasm", "inflammation", "injury", "oedema",
+    "mass", "discomfort", "swelling", "fibrosis", "necrosis", "cyst", "obstruction",
+]  # fmt: skip
+
+# Synthetic RxCUIs, kept clear of the real RxNorm range.
+RXCUI_BASE = 90_000_000
+
+
+@dataclass(frozen=True)
+class Concept:
+    rxcui: str
+    name: str
+    tty: str
+    ingredient_rxcui: str
+    ingredient_name: str
+
+
+def concepts() -> List[Concept]:
+    out: List[Concept] = []
+    ingredients = {**TARGET_INGREDIENTS, **CONCOMITANT_INGREDIENTS}
+    for i, (ingredient, brands) in enumerate(ingredients.items()):
+        ing_rxcui = str(RXCUI_BASE + 100 * i)
+        out.append(Concept(ing_rxcui, ingredient, "IN", ing_rxcui, ingredient))
+        for j, brand in enumerate(brands, start=1):
+            out.append(Concept(str(RXCUI_BASE + 100 * i + j), brand, "BN", ing_rxcui, ingredient))
+    return out
+
+
+def reaction_terms() -> Tuple[List[str], List[float]]:
+    terms = list(REACTION_COUNTS)
+    weights = [float(n) for n in REACTION_COUNTS.values()]
+    floor = weights[-1]
+    tail = [f"{site} {finding}" for finding in TAIL_FINDINGS for site in TAIL_SITES]
+    for rank, term in enumerate(tail, start=2):
+        terms.append(term)
+        weights.append(floor / rank**0.9)
+    return (terms, weights)
+
+
+class Vocabulary:
+    # Name and ingredient lookups over the synthetic concepts, answering the same questions as
+    # RxNav's rxcui.json and related.json.
+    def __init__(self) -> None:
+        self.concepts = concepts()
+        self._by_name = {normalize_name(c.name): c for c in self.concepts}
+        self._by_rxcui = {c.rxcui: c for c in self.concepts}
+
+    def rxcui(self, name: str) -> Optional[str]:
+        concept = self._by_name.get(normalize_name(name))
+        return concept.rxcui if concept else None
+
+    def ingredient(self, rxcui: str) -> Optional[Concept]:
+        concept = self._by_rxcui.get(str(rxcui))
+        return self._by_rxcui[concept.ingredient_rxcui] if concept else None
+
+
+def write_rrf(out_dir: str) -> str:
+    # Minimal RXNCONSO/RXNREL files for the synthetic concepts, so 'cli.py rxnorm-index' can
+    # build an offline index that resolves generated drug names without RxNav.
+    rrf_dir = os.path.join(out_dir, "rrf")
+    os.makedirs(rrf_dir, exist_ok=True)
+    items = concepts()
+    with open(os.path.join(rrf_dir, "RXNCONSO.RRF"), "w", encoding="utf-8") as f:
+        for c in items:
+            f.write(f"{c.rxcui}|ENG||||||A{c.rxcui}||||RXNORM|{c.tty}|{c.rxcui}|{c.name}||N|4096|\n")
+    with open(os.path.join(rrf_dir, "RXNREL.RRF"), "w", encoding="utf-8") as f:
+        for c in items:
+            if c.tty == "BN":
+                f.write(f"{c.ingredient_rxcui}||CUI|RO|{c.rxcui}||CUI|tradename_of|||RXNORM||||N||\n")
+                f.write(f"{c.rxcui}||CUI|RO|{c.ingredient_rxcui}||CUI|has_tradename|||RXNORM||||N||\n")
+    return out_dir
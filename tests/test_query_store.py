@@ -0,0 +1,38 @@
+from typing import Any, List, Optional
+
+import pandas as pd
+
+from src.process.fields import REPORT_COLUMNS
+from src.query.store import QueryStore, ReportFilter, StoreWriter
+
+DATES = {"full": "2024-07-15", "month": "2024-07", "year": "2024", "before": "2024-06-30", "after": "2025-01"}
+
+
+def _store(out_dir: str) -> QueryStore:
+    reports = pd.DataFrame([{"safetyreportid": rep_id, "received_date": d} for rep_id, d in DATES.items()])
+    writer = StoreWriter(out_dir)
+    writer.write(
+        {
+            "Reports": reports.reindex(columns=REPORT_COLUMNS),
+            "Drugs": pd.DataFrame(),
+            "Reactions": pd.DataFrame(),
+        }
+    )
+    return QueryStore(writer.close())
+
+
+def _matching(store: QueryStore, date_from: Optional[str], date_to: Optional[str]) -> List[str]:
+    _, rows = store.reports(ReportFilter(date_from=date_from, date_to=date_to), limit=None)
+    return sorted(row[0] for row in rows)
+
+
+def test_partial_dates_match_ranges_overlapping_their_period(tmp_path: Any) -> None:
+    store = _store(str(tmp_path))
+    try:
+        assert _matching(store, "2024-07-01", "2024-07-31") == ["full", "month", "year"]
+        assert _matching(store, "2024-07-20", None) == ["after", "month", "year"]
+        assert _matching(store, None, "2024-07-01") == ["before", "month", "year"]
+        assert _matching(store, "2024-08-01", "2024-12-31") == ["year"]
+        assert _matching(store, "2025-01-31", "2025-02-28") == ["after"]
+    finally:
+        store.close()
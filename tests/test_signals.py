@@ -0,0 +1,58 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+from src.analyze.signals import DEFAULT_PRIOR, _gamma_cdf, ebgm, fit_gps_prior
+
+
+def _pairs(
+    rng: np.random.Generator, lam: np.ndarray, expected: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    a = rng.poisson(lam * expected)
+    keep = a >= 1
+    return (a[keep], expected[keep], lam[keep])
+
+
+def test_gamma_cdf_matches_exponential_at_shape_one() -> None:
+    x = np.array([0.0, 1e-4, 0.01, 0.5, 1.0, 2.0, 5.0, 30.0])
+    for rate in (0.1, 1.0, 7.5):
+        expected = 1.0 - np.exp(-rate * x)
+        actual = _gamma_cdf(x, np.ones_like(x), np.full_like(x, rate))
+        np.testing.assert_allclose(actual, expected, rtol=1e-10, atol=1e-14)
+
+
+def test_gamma_cdf_closed_forms_on_both_branches() -> None:
+    # P(1/2, x) = erf(sqrt(x)) and P(3, x) = 1 - e^-x (1 + x + x^2 / 2), either side of shape + 1.
+    x = np.array([0.05, 0.3, 1.2, 4.0, 12.0])
+    half = _gamma_cdf(x, np.full_like(x, 0.5), np.ones_like(x))
+    np.testing.assert_allclose(half, [math.erf(math.sqrt(v)) for v in x], rtol=1e-10)
+    three = _gamma_cdf(x, np.full_like(x, 3.0), np.ones_like(x))
+    np.testing.assert_allclose(three, 1.0 - np.exp(-x) * (1.0 + x + x * x / 2.0), rtol=1e-10)
+
+
+def test_gps_prior_fit_recovers_a_spread_of_ebgm() -> None:
+    rng = np.random.default_rng(3)
+    expected = np.exp(rng.uniform(math.log(0.2), math.log(50.0), 5000))
+    # 80% of pairs near lambda = 1, 20% with a mean relative reporting rate of 4.
+    lam = np.where(rng.random(5000) < 0.8, rng.gamma(20.0, 1.0 / 20.0, 5000), rng.gamma(2.0, 2.0, 5000))
+    a, expected, lam = _pairs(rng, lam, expected)
+    prior = fit_gps_prior(a, expected)
+    assert prior != DEFAULT_PRIOR
+    assert all(1e-3 <= v <= 1e3 for v in prior[:4]) and 0.0 < prior[4] < 1.0
+    gm, eb05, eb95 = ebgm(a, expected, prior)
+    assert gm.max() / gm.min() > 10.0
+    assert np.corrcoef(np.log(gm), np.log(lam))[0, 1] > 0.8
+    assert (eb05 <= gm).all() and (gm <= eb95).all()
+
+
+def test_gps_prior_falls_back_when_the_fit_degenerates() -> None:
+    # With no disproportionality the likelihood is maximized by a point mass at lambda = 1, which
+    # would shrink every EBGM to 1.
+    rng = np.random.default_rng(5)
+    expected = np.exp(rng.uniform(math.log(0.5), math.log(50.0), 3000))
+    a, expected, _ = _pairs(rng, np.ones_like(expected), expected)
+    prior = fit_gps_prior(a, expected)
+    assert prior == DEFAULT_PRIOR
+    gm, _, _ = ebgm(a, expected, prior)
+    assert gm.std() > 0.05
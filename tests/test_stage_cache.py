@@ -0,0 +1,68 @@
+import json
+import os
+from typing import Any, Dict, List
+
+import pandas as pd
+import pytest
+
+from src.common.config import RXNORM, STAGE_CACHE
+from src.common.http import HttpTransport
+from src.common.stage_cache import StageCache
+from src.mock.server import MockServer, RxNavData
+from src.process.curate import curate_tables
+from src.synth.generator import SynthConfig, generate_records
+
+
+def _write_raw(path: str, records: int) -> None:
+    config = SynthConfig(records=records, seed=11, invalid_rate=0.0)
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in generate_records(config):
+            f.write(json.dumps(rec) + "\n")
+
+
+def _stages(root: str) -> List[str]:
+    return sorted(e["stage"] for e in StageCache(root).entries())
+
+
+@pytest.fixture
+def rxnav(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> Any:
+    with MockServer(rxnav=RxNavData()) as server:
+        monkeypatch.setattr(RXNORM, "base_url", server.rxnorm_url)
+        monkeypatch.setattr(RXNORM, "offline_index", "")
+        monkeypatch.setattr(RXNORM, "cache_db", str(tmp_path / "rxnorm_cache.sqlite"))
+        monkeypatch.setattr(RXNORM, "cache_file", str(tmp_path / "rxnorm_cache.json"))
+        monkeypatch.setattr(STAGE_CACHE, "cache_dir", str(tmp_path / "stages"))
+        yield server
+
+
+@pytest.mark.parametrize("mode", [{}, {"streaming": True}, {"workers": 2}], ids=["memory", "streaming", "parallel"])
+def test_failed_rxnav_lookup_is_not_cached(
+    tmp_path: Any, monkeypatch: pytest.MonkeyPatch, rxnav: Any, mode: Dict[str, Any]
+) -> None:
+    raw = str(tmp_path / "faers.ndjson")
+    _write_raw(raw, 300)
+    get_many = HttpTransport.get_many
+    failures: Dict[str, int] = {"left": 1}
+
+    def flaky(self: HttpTransport, calls: Any, on_response: Any = None) -> List[Any]:
+        responses = get_many(self, calls, on_response)
+        if failures["left"] and responses:
+            failures["left"] -= 1
+            responses[0] = ConnectionError("RxNav unreachable")
+        return responses
+
+    monkeypatch.setattr(HttpTransport, "get_many", flaky)
+    first = curate_tables(raw, str(tmp_path / "first"), stage_cache=True, query_store=False, **mode)
+    assert failures["left"] == 0
+    assert not {"normalize", "write", "cube"} & set(_stages(STAGE_CACHE.cache_dir))
+
+    second = curate_tables(raw, str(tmp_path / "second"), stage_cache=True, query_store=False, **mode)
+    assert {"write", "cube"} <= set(_stages(STAGE_CACHE.cache_dir))
+    unresolved = [pd.read_csv(out["drugs"])["rxcui"].isna().sum() for out in (first, second)]
+    assert unresolved[0] > unresolved[1]
+
+    third = curate_tables(raw, str(tmp_path / "third"), stage_cache=True, query_store=False, **mode)
+    for name in ("Drugs.csv", "Reports.csv"):
+        with open(os.path.join(os.path.dirname(second["drugs"]), name), "rb") as a:
+            with open(os.path.join(os.path.dirname(third["drugs"]), name), "rb") as b:
+                assert a.read() == b.read()
@@ -0,0 +1,115 @@
+import math
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from src.process.fields import REPORT_COLUMNS, _report_row
+from src.process.vectorized import report_frame
+from src.synth.generator import SynthConfig, generate_records
+
+
+def _record(**fields: Any) -> Dict[str, Any]:
+    rec: Dict[str, Any] = {
+        "receivedate": "20240315",
+        "receiptdate": "20240320",
+        "occurcountry": "US",
+        "patient": {"sex": "2", "patientonsetage": "45", "patientonsetageunit": "801"},
+    }
+    patient = fields.pop("patient", {})
+    rec.update(fields)
+    rec["patient"] = dict(rec["patient"], **patient)
+    return rec
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    if a is None and isinstance(b, float) and math.isnan(b):
+        # Missing ages are None per row and NaN in the float column.
+        return True
+    return a == b
+
+
+def _assert_parity(items: List[Tuple[Any, Dict[str, Any]]]) -> None:
+    frame = report_frame(items)
+    assert list(frame.columns) == REPORT_COLUMNS
+    assert len(frame) == len(items)
+    for i, (rep_id, rec) in enumerate(items):
+        expected = _report_row(rep_id, rec)
+        actual = frame.iloc[i].to_dict()
+        for column in REPORT_COLUMNS:
+            assert _same(expected[column], actual[column]), (rep_id, column, expected[column], actual[column])
+
+
+AGE_CASES = [
+    # FAERS age unit codes: 800 decade, 801 year, 802 month, 803 week, 804 day, 805 hour.
+    {"patientonsetage": "45", "patientonsetageunit": "801"},
+    {"patientonsetage": "18", "patientonsetageunit": "802"},
+    {"patientonsetage": "30", "patientonsetageunit": "803"},
+    {"patientonsetage": "200", "patientonsetageunit": "804"},
+    {"patientonsetage": "12", "patientonsetageunit": "805"},
+    {"patientonsetage": "5", "patientonsetageunit": "806"},
+    {"patientonsetage": 45, "patientonsetageunit": 801},
+    {"patientonsetage": 3.5, "patientonsetageunit": " years "},
+    {"patientonsetage": "18", "patientonsetageunit": "Mon"},
+    {"patientonsetage": "2", "patientonsetageunit": "wk"},
+    {"patientonsetage": "10", "patientonsetageunit": "DY"},
+    {"patientonsetage": "36", "patientonsetageunit": "hours"},
+    {"patientonsetage": None, "patientonsetageunit": "801"},
+    {"patientonsetage": "abc", "patientonsetageunit": "801"},
+    {"patientonsetage": "", "patientonsetageunit": ""},
+    {"patientonsetage": "60", "patientonsetageunit": None},
+    {"patientonsetage": ["60"], "patientonsetageunit": {"code": "801"}},
+]
+DATE_CASES = ["20240315", "202403", "2024", "2024-03", "2024-03-15", "", "  ", None, "2024131", "20241301"]
+SEX_CASES = ["1", "2", "0", "F", "male", " m ", 1, 2, None, "", "X", "UNK"]
+REPORTER_CASES = ["1", "2", "3", "4", "5", 5, "Physician", "consumer/non-health professional", "LAWYER", "", None]
+COUNTRY_CASES = ["US", "us", " gb ", "", None, 0, "ZZ"]
+FLAG_CASES = [
+    {},
+    {"seriousnessdeath": "1"},
+    {"seriousnesshospitalization": "2", "seriousnessother": "1"},
+    {"seriousnesslifethreatening": "", "seriousnessdisabling": None},
+    {"seriousnesscongenitalanomali": "1", "seriousnessdeath": 0},
+]
+
+
+def _cases() -> List[Tuple[str, Dict[str, Any]]]:
+    cases = [(f"age{i}", _record(patient=p)) for i, p in enumerate(AGE_CASES)]
+    cases += [(f"recv{i}", _record(receivedate=d)) for i, d in enumerate(DATE_CASES)]
+    cases += [(f"rcpt{i}", _record(receiptdate=d)) for i, d in enumerate(DATE_CASES)]
+    cases += [(f"sex{i}", _record(patient={"sex": s})) for i, s in enumerate(SEX_CASES)]
+    cases += [(f"rep{i}", _record(patient={"patientreporter": r})) for i, r in enumerate(REPORTER_CASES)]
+    cases += [(f"fec{i}", _record(fulfillexpeditecriteria=r)) for i, r in enumerate(REPORTER_CASES)]
+    cases += [(f"cty{i}", _record(occurcountry=c)) for i, c in enumerate(COUNTRY_CASES)]
+    cases += [(f"flag{i}", _record(**f)) for i, f in enumerate(FLAG_CASES)]
+    missing = {"receivedate": None, "receiptdate": None, "occurcountry": None}
+    cases.append(("bare", {"safetyreportid": "bare"}))
+    cases.append(("empty_patient", dict(missing, patient={})))
+    return cases
+
+
+CASES = _cases()
+
+
+@pytest.mark.parametrize("rep_id,rec", CASES, ids=[rep_id for rep_id, _ in CASES])
+def test_single_record_matches_row_rules(rep_id: str, rec: Dict[str, Any]) -> None:
+    _assert_parity([(rep_id, rec)])
+
+
+def test_shared_codes_broadcast_to_every_report() -> None:
+    # Distinct values are normalized once and broadcast, so mixing all cases in one frame checks
+    # that every report gets its own value back.
+    _assert_parity(CASES + CASES[::-1])
+
+
+def test_synthetic_records_match_row_rules() -> None:
+    config = SynthConfig(records=2000, seed=7, invalid_rate=0.0)
+    recs = [rec for rec in generate_records(config) if isinstance(rec, dict)]
+    _assert_parity([(rec.get("safetyreportid"), rec) for rec in recs])
+
+
+def test_empty_input() -> None:
+    frame = report_frame([])
+    assert list(frame.columns) == REPORT_COLUMNS
+    assert len(frame) == 0